@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from loguru import logger
+
+from secondary_functions import load_config
+from retry_policy import classify_error, RESET, TIMEOUT, SERVER_ERROR
+
+
+# Классы ошибок, которые считаются признаком перегрузки эндпоинта
+OVERLOAD_ERRORS = {RESET, TIMEOUT, SERVER_ERROR}
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Адаптивный ограничитель параллельных вызовов по схеме AIMD.
+
+    Пока задержки и доля ошибок в окне остаются в норме, лимит одновременных вызовов
+    увеличивается на 1 (additive increase). При разрыве соединения, таймауте или ответе 5xx
+    лимит умножается на `decrease_factor` (multiplicative decrease).
+
+    Параметры читаются из секции `[limiter]`: сначала ключ с префиксом имени ограничителя
+    (например, `soap_max_limit`), затем общий ключ (`max_limit`).
+    """
+
+    def __init__(self, name, config_path="config.ini"):
+        """
+        :param name: Имя ограничителя (например, "soap" или "download").
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.name = name
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.min_limit = max(1, self._get_option("min_limit", 1, int))
+        self.max_limit = max(self.min_limit, self._get_option("max_limit", 16, int))
+        self.limit = float(min(self.max_limit, max(self.min_limit, self._get_option("initial_limit", 2, int))))
+        self.latency_target = self._get_option("latency_target", 30.0, float)
+        self.error_rate_threshold = self._get_option("error_rate", 0.05, float)
+        self.decrease_factor = self._get_option("decrease_factor", 0.5, float)
+        self.decrease_cooldown = self._get_option("decrease_cooldown", 5.0, float)
+        self.window = max(1, self._get_option("window", 20, int))
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self._latencies = deque(maxlen=max(self.window, 200))
+        self._window_samples = 0
+        self._window_errors = 0
+        self._last_decrease = 0.0
+
+        self.throttle_events = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def _get_option(self, option, fallback, cast):
+        """
+        Читает параметр с префиксом имени ограничителя, затем общий параметр секции `[limiter]`.
+        """
+        for key in (f"{self.name}_{option}", option):
+            if self.config.has_option("limiter", key):
+                return cast(self.config.get("limiter", key))
+        return fallback
+
+    def acquire(self):
+        """
+        Ожидает свободный слот и занимает его.
+        """
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                self.throttle_events += 1
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, error_kind=None):
+        """
+        Освобождает слот и корректирует лимит по результату вызова.
+
+        :param latency: Длительность вызова в секундах.
+        :param error_kind: Класс ошибки (см. retry_policy) или None при успехе.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            self._window_samples += 1
+
+            if error_kind in OVERLOAD_ERRORS:
+                self._window_errors += 1
+                self._decrease(error_kind)
+            elif self._window_samples >= self.window:
+                self._maybe_increase()
+
+            self._cond.notify_all()
+
+    def _decrease(self, error_kind):
+        now = time.monotonic()
+        # Одновременные ошибки уже выполнявшихся вызовов не должны снижать лимит многократно
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+
+        old_limit = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+        self._window_samples = 0
+        self._window_errors = 0
+        self.decreases += 1
+        logger.warning(f"Лимит {self.name} снижен {old_limit:.1f} -> {self.limit:.1f} из-за ошибки ({error_kind})")
+
+    def _maybe_increase(self):
+        error_rate = self._window_errors / self._window_samples
+        p90 = self._percentile(0.9)
+        self._window_samples = 0
+        self._window_errors = 0
+
+        if error_rate <= self.error_rate_threshold and p90 <= self.latency_target and self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+            self.increases += 1
+            logger.debug(f"Лимит {self.name} увеличен до {self.limit:.0f} (p90 {p90:.2f} с)")
+
+    def _percentile(self, fraction):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    @contextmanager
+    def slot(self):
+        """
+        Контекстный менеджер: занимает слот на время вызова и учитывает его длительность и ошибку.
+        """
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - started, classify_error(e))
+            raise
+        self.release(time.monotonic() - started)
+
+    def get_stats(self):
+        """
+        :return: Словарь с текущим лимитом, числом выполняющихся вызовов, перцентилями задержки
+                 и счётчиками ожиданий, увеличений и снижений лимита.
+        """
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "p50": round(self._percentile(0.5), 3),
+                "p90": round(self._percentile(0.9), 3),
+                "p99": round(self._percentile(0.99), 3),
+                "throttle_events": self.throttle_events,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+    def log_stats(self):
+        """
+        Логирует состояние ограничителя.
+        """
+        stats = self.get_stats()
+        logger.info(
+            f"Лимит {self.name}: {stats['limit']} (выполняется {stats['in_flight']}), "
+            f"задержка p50/p90/p99 {stats['p50']}/{stats['p90']}/{stats['p99']} с, "
+            f"ожиданий слота {stats['throttle_events']}, увеличений {stats['increases']}, "
+            f"снижений {stats['decreases']}")
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, config_path="config.ini"):
+    """
+    Возвращает общий для процесса ограничитель с указанным именем, создавая его при первом обращении.
+
+    :param name: Имя ограничителя (например, "soap" или "download").
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр AdaptiveConcurrencyLimiter.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveConcurrencyLimiter(name, config_path)
+        return _limiters[name]
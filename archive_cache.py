@@ -0,0 +1,344 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import time
+import zipfile
+import requests
+from loguru import logger
+
+from secondary_functions import load_config
+
+
+class CorruptArchiveError(requests.exceptions.ConnectionError):
+    """
+    Скачанный архив не прошёл проверку целостности.
+
+    Повреждённый архив обычно означает оборванную передачу, поэтому повторяется как разрыв соединения.
+    """
+
+
+class ArchiveCache:
+    """
+    Локальный кэш скачанных архивов ЕИС.
+
+    Архивы хранятся по SHA-256 содержимого (`<dir>/<2 символа>/<sha256>.zip`), индекс связывает URL
+    с хэшем и валидаторами ответа (ETag, Last-Modified). Недокачанные передачи лежат в `<dir>/partial`
+    и продолжаются запросом Range. При превышении `max_size_mb` удаляются архивы,
+    которые дольше всех не использовались (LRU).
+
+    Параметры читаются из секции `[cache]`.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.enabled = self.config.getboolean("cache", "enabled", fallback=True)
+        self.directory = os.path.normpath(self.config.get("cache", "dir", fallback="archive_cache"))
+        self.max_size = self.config.getint("cache", "max_size_mb", fallback=10240) * 1048576
+        # Архив без ETag/Last-Modified проверить на сервере нельзя; ссылки ЕИС уникальны для выгрузки,
+        # поэтому по умолчанию такой архив берётся из кэша без запроса
+        self.trust_without_validators = self.config.getboolean("cache", "trust_without_validators", fallback=True)
+
+        self.index_file = os.path.join(self.directory, "index.json")
+        self.partial_dir = os.path.join(self.directory, "partial")
+
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "resumed": 0, "bytes_saved": 0,
+                      "evicted": 0, "corrupt": 0}
+
+        if self.enabled:
+            os.makedirs(self.partial_dir, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        """
+        Загружает индекс кэша.
+
+        :return: Словарь {"urls": {url: {"sha256", "etag", "last_modified"}},
+                          "blobs": {sha256: {"size", "last_used"}}}.
+        """
+        index = {"urls": {}, "blobs": {}}
+        if not self.enabled or not os.path.exists(self.index_file):
+            return index
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as file:
+                index.update(json.load(file))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить индекс кэша архивов {self.index_file}: {e}")
+        return index
+
+    def _save_index(self):
+        """
+        Сохраняет индекс кэша (вызывается под блокировкой).
+        """
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(self.index, file, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.directory, sha256[:2], f"{sha256}.zip")
+
+    def partial_path(self, url):
+        """
+        :return: Путь к файлу недокачанной передачи для URL.
+        """
+        return os.path.join(self.partial_dir, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.part")
+
+    def lookup(self, url):
+        """
+        Ищет архив по URL.
+
+        :return: Запись индекса URL с полями sha256, etag, last_modified, size, path или None,
+                 если архива нет в кэше.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self.index["urls"].get(url)
+            blob = self.index["blobs"].get(entry["sha256"]) if entry else None
+            if not blob:
+                return None
+            path = self._blob_path(entry["sha256"])
+            if not os.path.exists(path):
+                # Архив удалён с диска в обход кэша
+                self.index["blobs"].pop(entry["sha256"], None)
+                return None
+            return dict(entry, size=blob["size"], path=path)
+
+    def conditional_headers(self, entry):
+        """
+        Формирует заголовки условного запроса для архива из кэша.
+
+        :param entry: Запись, полученная из lookup.
+        :return: Словарь заголовков (пустой, если валидаторов нет).
+        """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_fresh_without_request(self, entry):
+        """
+        :return: True, если архив можно взять из кэша без обращения к серверу.
+        """
+        return self.trust_without_validators and not entry.get("etag") and not entry.get("last_modified")
+
+    def resume_headers(self, url):
+        """
+        Формирует заголовки для продолжения недокачанной передачи.
+
+        :return: Кортеж (заголовки, смещение в байтах). Если передачи нет — ({}, 0).
+        """
+        path = self.partial_path(url)
+        if not self.enabled or not os.path.exists(path):
+            return {}, 0
+
+        offset = os.path.getsize(path)
+        if not offset:
+            return {}, 0
+
+        headers = {"Range": f"bytes={offset}-"}
+        meta = self._load_partial_meta(url)
+        # If-Range: если архив на сервере изменился, сервер вернёт его целиком (200), а не хвост
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+        return headers, offset
+
+    def save_partial_meta(self, url, etag, last_modified):
+        """
+        Сохраняет валидаторы ответа рядом с недокачанной передачей (для If-Range при продолжении).
+        """
+        if not self.enabled:
+            return
+        with open(f"{self.partial_path(url)}.json", "w", encoding="utf-8") as file:
+            json.dump({"etag": etag, "last_modified": last_modified}, file)
+
+    def _load_partial_meta(self, url):
+        try:
+            with open(f"{self.partial_path(url)}.json", "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def discard_partial(self, url):
+        """
+        Удаляет недокачанную передачу и её валидаторы.
+        """
+        for path in (self.partial_path(url), f"{self.partial_path(url)}.json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def verify_zip(path):
+        """
+        Проверяет целостность ZIP-архива (центральный каталог и CRC всех файлов).
+
+        :return: True, если архив корректен.
+        """
+        try:
+            with zipfile.ZipFile(path, "r") as zip_ref:
+                return zip_ref.testzip() is None
+        except (zipfile.BadZipFile, OSError):
+            return False
+
+    def store(self, url, path, etag=None, last_modified=None):
+        """
+        Проверяет скачанный архив и переносит его в кэш.
+
+        :param url: URL архива.
+        :param path: Путь к скачанному файлу (после вызова файл перемещается в кэш).
+        :param etag: Заголовок ETag ответа.
+        :param last_modified: Заголовок Last-Modified ответа.
+        :return: Путь к архиву в кэше.
+        :raises CorruptArchiveError: Если архив повреждён (файл удаляется).
+        """
+        if not self.verify_zip(path):
+            os.remove(path)
+            with self._lock:
+                self.stats["corrupt"] += 1
+            raise CorruptArchiveError(f"Архив {url} повреждён")
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1048576), b""):
+                sha256.update(chunk)
+        sha256 = sha256.hexdigest()
+        blob_path = self._blob_path(sha256)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if os.path.exists(blob_path):
+                # Тот же архив уже есть в кэше под другим URL
+                os.remove(path)
+            else:
+                os.replace(path, blob_path)
+
+            self.index["urls"][url] = {"sha256": sha256, "etag": etag, "last_modified": last_modified}
+            self.index["blobs"][sha256] = {"size": size, "last_used": time.time()}
+            self._evict()
+            self._save_index()
+
+        meta_path = f"{self.partial_path(url)}.json"
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        return blob_path
+
+    def record_hit(self, entry, revalidated=False):
+        """
+        Учитывает попадание в кэш и обновляет время использования архива.
+
+        :param entry: Запись, полученная из lookup.
+        :param revalidated: True, если сервер подтвердил актуальность архива (304).
+        """
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["revalidated"] += int(revalidated)
+            self.stats["bytes_saved"] += entry["size"]
+            blob = self.index["blobs"].get(entry["sha256"])
+            if blob:
+                blob["last_used"] = time.time()
+
+    def record_miss(self, resumed_bytes=0):
+        """
+        Учитывает промах кэша.
+
+        :param resumed_bytes: Сколько байт не пришлось скачивать заново благодаря продолжению передачи.
+        """
+        with self._lock:
+            self.stats["misses"] += 1
+            if resumed_bytes:
+                self.stats["resumed"] += 1
+                self.stats["bytes_saved"] += resumed_bytes
+
+    def _evict(self):
+        """
+        Удаляет давно не использованные архивы, пока размер кэша превышает лимит (вызывается под блокировкой).
+        """
+        total = sum(blob["size"] for blob in self.index["blobs"].values())
+        if total <= self.max_size:
+            return
+
+        for sha256, blob in sorted(self.index["blobs"].items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_size:
+                break
+            path = self._blob_path(sha256)
+            if os.path.exists(path):
+                os.remove(path)
+            del self.index["blobs"][sha256]
+            total -= blob["size"]
+            self.stats["evicted"] += 1
+
+        self.index["urls"] = {
+            url: entry for url, entry in self.index["urls"].items() if entry["sha256"] in self.index["blobs"]
+        }
+
+    def save(self):
+        """
+        Сохраняет индекс кэша (время использования архивов).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._save_index()
+
+    @staticmethod
+    def link_or_copy(source, destination):
+        """
+        Создаёт жёсткую ссылку на архив из кэша, а если это невозможно — копирует его.
+        """
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def get_stats(self):
+        """
+        :return: Словарь со статистикой: попадания, промахи, подтверждённые сервером попадания,
+                 продолженные передачи, сэкономленные байты, удалённые и повреждённые архивы, размер кэша.
+        """
+        with self._lock:
+            return dict(self.stats, size=sum(blob["size"] for blob in self.index["blobs"].values()))
+
+    def log_stats(self):
+        """
+        Логирует статистику кэша архивов.
+        """
+        if not self.enabled:
+            return
+        stats = self.get_stats()
+        logger.info(
+            f"Кэш архивов: попаданий {stats['hits']} (подтверждено сервером {stats['revalidated']}), "
+            f"промахов {stats['misses']}, продолжено передач {stats['resumed']}, "
+            f"сэкономлено {stats['bytes_saved'] / 1048576:.1f} МБ, удалено {stats['evicted']}, "
+            f"повреждённых {stats['corrupt']}, размер {stats['size'] / 1048576:.1f} МБ")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_archive_cache(config_path="config.ini"):
+    """
+    Возвращает общий для процесса кэш архивов, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр ArchiveCache.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ArchiveCache(config_path)
+        return _shared_cache
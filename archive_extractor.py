@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 import zipfile
 from loguru import logger
 from secondary_functions import load_config
@@ -18,6 +20,13 @@ class ArchiveExtractor:
             # Если конфигурация не была загружена, выбрасываем исключение
             raise ValueError("Ошибка загрузки конфигурации!")
 
+        # Режим распаковки: "memory" — файлы читаются из архива без записи на диск, "disk" — распаковка в папку
+        self.extract_mode = self.config.get("archive", "extract_mode", fallback="memory")
+        # Файлы больше этого размера при чтении из архива сбрасываются во временный файл
+        self.spool_max_size = self.config.getint("archive", "spool_max_mb", fallback=16) * 1048576
+        # Папка для рабочих каталогов архивов в режиме "disk" (по умолчанию — системная временная папка)
+        self.scratch_dir = self.config.get("archive", "scratch_dir", fallback=None) or None
+
     def unzip_files(self, directory):
         """
         Разархивирует все ZIP-файлы в указанной директории.
@@ -32,19 +41,80 @@ class ArchiveExtractor:
         for file_name in os.listdir(directory):
             # Если файл является ZIP-архивом
             if file_name.endswith('.zip'):
-                zip_path = os.path.join(directory, file_name)
-                try:
-                    # Логируем начало разархивирования
-                    logger.info(f"Разархивирование {zip_path}...")
-                    # Открываем ZIP-архив для чтения
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        # Извлекаем все файлы в указанную директорию
-                        zip_ref.extractall(directory)
-                    # Логируем успешное завершение разархивирования
-                    logger.info(f"Разархивирование завершено для {zip_path}.")
-                except zipfile.BadZipFile:
-                    # Логируем ошибку, если файл не является корректным ZIP-архивом
-                    logger.error(f"Не удалось разархивировать файл: {zip_path}")
-                except Exception as e:
-                    # Логируем любые другие ошибки при разархивировании
-                    logger.error(f"Ошибка при разархивировании файла {zip_path}: {e}")
+                self.extract_archive(os.path.join(directory, file_name), directory)
+
+    def extract_archive(self, zip_path, directory):
+        """
+        Разархивирует один ZIP-архив в указанную директорию.
+
+        :param zip_path: Путь к ZIP-архиву.
+        :param directory: Директория, в которую извлекаются файлы.
+        :return: True, если архив распакован.
+        """
+        try:
+            # Логируем начало разархивирования
+            logger.info(f"Разархивирование {zip_path}...")
+            # Открываем ZIP-архив для чтения
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                # Извлекаем все файлы в указанную директорию
+                zip_ref.extractall(directory)
+            # Логируем успешное завершение разархивирования
+            logger.info(f"Разархивирование завершено для {zip_path}.")
+            return True
+        except zipfile.BadZipFile:
+            # Логируем ошибку, если файл не является корректным ZIP-архивом
+            logger.error(f"Не удалось разархивировать файл: {zip_path}")
+        except Exception as e:
+            # Логируем любые другие ошибки при разархивировании
+            logger.error(f"Ошибка при разархивировании файла {zip_path}: {e}")
+        return False
+
+    def create_work_dir(self, zip_path):
+        """
+        Создаёт отдельный рабочий каталог для одного архива.
+
+        :param zip_path: Путь к ZIP-архиву (используется в имени каталога).
+        :return: Путь к созданному каталогу.
+        """
+        if self.scratch_dir:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+        prefix = f"{os.path.splitext(os.path.basename(zip_path))[0]}_"
+        return tempfile.mkdtemp(prefix=prefix, dir=self.scratch_dir)
+
+    def list_xml_members(self, zip_path):
+        """
+        Возвращает имена XML-файлов архива (по оглавлению архива, без чтения файлов).
+
+        :param zip_path: Путь к ZIP-архиву.
+        :return: Список имён файлов в том же виде, что отдаёт iter_xml_members.
+        :raises zipfile.BadZipFile: Если архив повреждён.
+        """
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            return [
+                os.path.basename(info.filename) for info in zip_ref.infolist()
+                if not info.is_dir() and info.filename.endswith('.xml')
+            ]
+
+    def iter_xml_members(self, zip_path, start=0, stop=None):
+        """
+        Последовательно отдаёт XML-файлы архива без распаковки на диск.
+
+        Каждый файл копируется из архива в SpooledTemporaryFile: файлы до `spool_max_mb` мегабайт остаются
+        в памяти, более крупные сбрасываются во временный файл. Объект файла действителен до получения
+        следующего элемента.
+
+        :param zip_path: Путь к ZIP-архиву.
+        :param start: Номер первого XML-файла (с 0); предыдущие файлы не распаковываются.
+        :param stop: Номер XML-файла, на котором чтение останавливается (None — до конца архива).
+        :return: Генератор кортежей (имя файла, файловый объект в двоичном режиме).
+        :raises zipfile.BadZipFile: Если архив повреждён.
+        """
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            infos = [info for info in zip_ref.infolist()
+                     if not info.is_dir() and info.filename.endswith('.xml')]
+            for info in infos[start:stop]:
+                with tempfile.SpooledTemporaryFile(max_size=self.spool_max_size) as spool:
+                    with zip_ref.open(info) as member:
+                        shutil.copyfileobj(member, spool, 1048576)
+                    spool.seek(0)
+                    yield os.path.basename(info.filename), spool
@@ -0,0 +1,77 @@
+"""
+Построчная вставка ссылок на документацию против многострочной (DatabaseOperations.buffer_insert).
+
+Нужна БД из [db] env_file: строки пишутся во временную таблицу, которая удаляется при завершении сеанса БД.
+Запуск из корня проекта: python -m benchmarks.database_inserts
+"""
+import sys
+import time
+
+from loguru import logger
+
+from database_work.database_operations import DatabaseOperations
+
+ROWS = 3000
+LINKS_PER_NOTICE = 30
+
+
+def main():
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    operations = DatabaseOperations()
+    with operations.db_manager.connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE links_benchmark (
+                id serial PRIMARY KEY, contract_id integer, file_name text, document_links text UNIQUE)
+        """)
+    operations.db_manager.commit()
+
+    entries = [
+        {"contract_id": number // LINKS_PER_NOTICE, "file_name": f"Документация_{number}.pdf",
+         "document_links": f"https://zakupki.gov.ru/44fz/filestore/public/1.0/download/priz/file.html?uid={number}"}
+        for number in range(ROWS)
+    ]
+
+    def clear():
+        with operations.db_manager.connection.cursor() as cursor:
+            cursor.execute("TRUNCATE links_benchmark")
+        operations.db_manager.commit()
+
+    def row_by_row():
+        for entry in entries:
+            operations._insert_data("links_benchmark", dict(entry))
+
+    def batched(rows_per_flush):
+        for number, entry in enumerate(entries, 1):
+            operations.buffer_insert("links_benchmark", entry)
+            if number % rows_per_flush == 0:
+                operations.flush_inserts()
+        operations.flush_inserts()
+
+    def per_notice():
+        # Ссылки одного извещения записываются его единицей работы, как в parse_links_documentation
+        for start in range(0, ROWS, LINKS_PER_NOTICE):
+            with operations.unit_of_work():
+                for entry in entries[start:start + LINKS_PER_NOTICE]:
+                    operations.buffer_insert("links_benchmark", entry)
+
+    cases = [
+        ("Построчно (INSERT и коммит на строку)", row_by_row, True),
+        (f"Многострочно, по {LINKS_PER_NOTICE} строк (единица работы извещения)", per_notice, True),
+        (f"Многострочно, по {operations.insert_batch} строк", lambda: batched(operations.insert_batch), True),
+        ("Многострочно, все строки уже записаны", lambda: batched(operations.insert_batch), False),
+    ]
+    for title, run, truncate in cases:
+        if truncate:
+            clear()
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{title}: {ROWS / elapsed:,.0f} строк/с ({elapsed:.2f} с на {ROWS} строк)")
+
+    operations.db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Извлечение полей: отдельный поиск по дереву на каждое поле против одного обхода (FieldExtractor.index).
+
+Запуск из корня проекта: python -m benchmarks.field_extractor
+"""
+import json
+import time
+import xml.etree.ElementTree as ET
+
+from parsing_xml.field_extractor import FieldExtractor
+from parsing_xml.tag_specs import compile_tag_spec
+from tests.samples import notice_xml, tags_file
+
+REPEATS = 200
+
+
+def main():
+    with open(tags_file("required_tags_44_fz.json"), "r", encoding="utf-8") as file:
+        extractor = FieldExtractor.for_spec(compile_tag_spec(json.load(file)))
+    document = notice_xml()
+    root = ET.fromstring(document)
+
+    def per_field():
+        return {path: root.findall(path) for path in extractor.paths}
+
+    def single_pass():
+        return extractor.index(root)
+
+    print(f"Документ: {len(document.encode('utf-8')) / 1024:.0f} КБ, путей: {len(extractor.paths)}, "
+          f"повторов: {REPEATS}")
+    for name, func in (("поиск по каждому полю", per_field), ("один обход", single_pass)):
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            func()
+        elapsed = (time.perf_counter() - started) / REPEATS
+        print(f"{name}: {elapsed * 1000:.3f} мс на документ")
+
+
+if __name__ == "__main__":
+    main()
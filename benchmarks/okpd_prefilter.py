@@ -0,0 +1,40 @@
+"""
+Стоимость отклонения документа: полный разбор против потокового фильтра ОКПД.
+
+Запуск из корня проекта: python -m benchmarks.okpd_prefilter
+"""
+import time
+import xml.etree.ElementTree as ET
+
+from parsing_xml.okpd_prefilter import prefilter_okpd
+from parsing_xml.tag_specs import compile_path
+from tests.samples import notice_xml
+
+OKPD_CODE_PATH = compile_path("OKPDCode")
+REPEATS = 200
+
+
+def main():
+    document = notice_xml(positions=1, attachments=400, okpd_code="99.99.99.999").encode("utf-8")
+
+    def full_parse():
+        return ET.fromstring(document).find(OKPD_CODE_PATH).text
+
+    def prefilter():
+        return prefilter_okpd(document, all_codes=False)["okpd_code"]
+
+    def prefilter_all_codes():
+        return prefilter_okpd(document)["okpd_codes"][0]
+
+    print(f"Документ: {len(document) / 1024:.0f} КБ, повторов: {REPEATS}")
+    for name, func in (("полный разбор", full_parse), ("потоковый фильтр", prefilter),
+                       ("потоковый фильтр, все позиции", prefilter_all_codes)):
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            func()
+        elapsed = (time.perf_counter() - started) / REPEATS
+        print(f"{name}: {elapsed * 1000:.3f} мс на документ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Сопоставление всех позиций документа со справочником ОКПД2 в префиксном дереве.
+
+Запуск из корня проекта: python -m benchmarks.okpd_trie
+"""
+import random
+import time
+
+from okpd_trie import OKPDTrie
+
+REPEATS = 10000
+
+
+def main():
+    random.seed(1)
+    trie = OKPDTrie()
+    # Справочник: классы, подклассы и группы, как в collection_codes_okpd
+    for okpd_id in range(3000):
+        parts = [f"{random.randint(1, 99):02d}", f"{random.randint(0, 99):02d}"]
+        code = ".".join(parts)[:random.choice((2, 4, 5))]
+        trie.add(code, ("collection_codes_okpd", okpd_id))
+
+    positions = [
+        f"{random.randint(1, 99):02d}.{random.randint(0, 99):02d}.{random.randint(0, 99):02d}."
+        f"{random.randint(0, 999):03d}"
+        for _ in range(20)
+    ]
+
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        matched = [trie.match(code) for code in positions]
+    elapsed = (time.perf_counter() - started) / REPEATS
+    print(f"Записей в дереве: {trie.size}, позиций в документе: {len(positions)}, "
+          f"совпало позиций: {sum(1 for values in matched if values)}")
+    print(f"Сопоставление документа: {elapsed * 1e6:.1f} мкс ({elapsed * 1e6 / len(positions):.2f} мкс на позицию)")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,16 +15,19 @@ class DatabaseCheckManager:
     - Проверки ИНН заказчика и получения его ID из базы данных.
     """
 
-    def __init__(self):
+    def __init__(self, db_manager=None):
         """
         Инициализирует экземпляры классов для работы с базой данных.
 
         Использует `DatabaseManager` для взаимодействия с базой данных и
         `DatabaseIDFetcher` для получения ID заказчика.
+
+        :param db_manager: Общий DatabaseManager (см. runtime.RuntimeContext). Если не передан,
+                           создается собственный экземпляр.
         """
 
-        self.db_manager = DatabaseManager()
-        self.id_fetcher = DatabaseIDFetcher()
+        self.db_manager = db_manager or DatabaseManager()
+        self.id_fetcher = DatabaseIDFetcher(self.db_manager)
 
     def get_db_manager(self):
         """
@@ -36,11 +39,11 @@ class DatabaseCheckManager:
 
     def close(self):
         """
-        Закрывает соединение с базой данных.
+        Возвращает соединение с базой данных в пул.
 
         :return: None
         """
-        self.db_manager.close()
+        self.id_fetcher.close()
 
     def check_contract_number_44_fz(self, contract_number_44_fz):
         """
@@ -58,7 +61,7 @@ class DatabaseCheckManager:
                 WHERE contract_number = %s
             );
             """
-            cursor = self.db_manager.cursor  # Получаем курсор
+            cursor = self.db_manager.connection.cursor()  # Отдельный курсор для проверки
             cursor.execute(query, (contract_number_44_fz,))
             result = cursor.fetchone()
 
@@ -67,12 +70,12 @@ class DatabaseCheckManager:
 
         except Exception as e:
             logger.exception(f"Ошибка при проверке номера контракта 44-ФЗ: {e}")
+            self.db_manager.rollback()
             return False
 
         finally:
             if cursor:
-                cursor.close()  # Закрываем курсор вручную
-            self.db_manager.connection.close()  # Закрываем соединение вручную
+                cursor.close()  # Закрываем курсор вручную (соединение остаётся у менеджера)
 
 
     # Удалить за ненадобностью после проверки
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from loguru import logger
+import psycopg2
+from psycopg2 import extensions, pool
+from dotenv import load_dotenv
+
+from secondary_functions import load_config
+
+
+class PoolTimeoutError(Exception):
+    """
+    Исключение, возникающее, если свободное соединение не появилось за отведённое время.
+    """
+
+
+class ConnectionPool:
+    """
+    Общий пул соединений с PostgreSQL.
+
+    Соединения открываются один раз и переиспользуются (psycopg2.pool.ThreadedConnectionPool): `min_size`
+    открываются заранее, остальные — по требованию, не больше `max_size`. Если все соединения заняты,
+    getconn ждёт освобождения до `acquire_timeout` секунд (ThreadedConnectionPool в этом случае сразу
+    выбрасывает PoolError). Перед выдачей соединения, простоявшего в пуле дольше `health_check_seconds`,
+    выполняется `SELECT 1`; разорванное соединение закрывается и заменяется новым.
+
+    Параметры пула читаются из секции `[db]`, параметры подключения — из файла окружения `env_file`.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.min_size = self.config.getint("db", "pool_min", fallback=1)
+        self.max_size = max(self.min_size, self.config.getint("db", "pool_max", fallback=10))
+        self.acquire_timeout = self.config.getfloat("db", "acquire_timeout", fallback=30)
+        self.health_check_seconds = self.config.getfloat("db", "health_check_seconds", fallback=30)
+        env_file = self.config.get(
+            "db", "env_file",
+            fallback=r'C:\Users\wangr\PycharmProjects\TenderMonitor\database_work\db_credintials.env')
+
+        # Загружаем переменные окружения из файла .env
+        load_dotenv(dotenv_path=env_file)
+        self.connect_params = {
+            "database": os.getenv("DB_DATABASE"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "host": os.getenv("DB_HOST"),
+            "port": os.getenv("DB_PORT"),
+            "connect_timeout": self.config.getint("db", "connect_timeout", fallback=10),
+        }
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        # Время возврата соединений в пул: {id(connection): time.monotonic()}
+        self._returned_at = {}
+        self.stats = {"acquired": 0, "replaced": 0, "wait_time": 0.0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = pool.ThreadedConnectionPool(self.min_size, self.max_size, **self.connect_params)
+                logger.info(f"Пул соединений с БД создан: {self.min_size}–{self.max_size} соединений")
+            return self._pool
+
+    def _is_alive(self, connection):
+        """
+        Проверяет соединение запросом `SELECT 1`, если оно простояло в пуле дольше health_check_seconds.
+        """
+        if connection.closed:
+            return False
+        with self._lock:
+            returned_at = self._returned_at.pop(id(connection), None)
+        if returned_at is not None and time.monotonic() - returned_at < self.health_check_seconds:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Соединение с БД разорвано, заменяем: {e}")
+            return False
+
+    def getconn(self):
+        """
+        Выдаёт проверенное соединение из пула, ожидая освобождения, если все соединения заняты.
+
+        :return: Соединение psycopg2.
+        :raises PoolTimeoutError: Если свободное соединение не появилось за acquire_timeout секунд.
+        :raises psycopg2.OperationalError: Если не удалось открыть новое соединение.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeoutError(f"Нет свободных соединений с БД за {self.acquire_timeout} с "
+                                   f"(максимум {self.max_size})")
+        try:
+            connections = self._get_pool()
+            while True:
+                connection = connections.getconn()
+                if self._is_alive(connection):
+                    break
+                connections.putconn(connection, close=True)
+                with self._lock:
+                    self.stats["replaced"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.stats["acquired"] += 1
+            self.stats["wait_time"] += time.monotonic() - started
+        return connection
+
+    def putconn(self, connection):
+        """
+        Возвращает соединение в пул. Незавершённая транзакция откатывается, разорванное соединение закрывается,
+        режим autocommit выключается.
+
+        :param connection: Соединение, полученное через getconn.
+        """
+        close = bool(connection.closed)
+        if not close and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                close = True
+        if not close and connection.autocommit:
+            try:
+                connection.autocommit = False
+            except psycopg2.Error:
+                close = True
+
+        with self._lock:
+            connections = self._pool
+            if not close:
+                self._returned_at[id(connection)] = time.monotonic()
+        try:
+            if connections is not None:
+                connections.putconn(connection, close=close)
+            elif not connection.closed:
+                # Пул уже закрыт (завершение работы)
+                connection.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Контекстный менеджер: соединение из пула, возвращаемое при выходе.
+        """
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def get_stats(self):
+        """
+        :return: Словарь со статистикой: выдано соединений, заменено разорванных, суммарное время ожидания.
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def log_stats(self):
+        """
+        Логирует статистику пула соединений.
+        """
+        stats = self.get_stats()
+        logger.info(f"Пул соединений с БД: выдано {stats['acquired']}, заменено разорванных {stats['replaced']}, "
+                    f"ожидание {stats['wait_time']:.1f} с")
+
+    def close(self):
+        """
+        Закрывает все соединения пула.
+        """
+        with self._lock:
+            connections, self._pool = self._pool, None
+            self._returned_at.clear()
+        if connections is not None:
+            connections.closeall()
+            logger.debug("Пул соединений с БД закрыт.")
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_connection_pool(config_path="config.ini"):
+    """
+    Возвращает общий для процесса пул соединений, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр ConnectionPool.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ConnectionPool(config_path)
+        return _shared_pool
+
+
+def close_connection_pool():
+    """
+    Закрывает общий пул соединений, если он был создан.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        connections, _shared_pool = _shared_pool, None
+    if connections is not None:
+        connections.log_stats()
+        connections.close()
@@ -1,59 +1,109 @@
 from loguru import logger
-import os
-import psycopg2
-from dotenv import load_dotenv
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from database_work.connection_pool import get_connection_pool
+
+# Статистика коммитов всех DatabaseManager процесса (см. get_commit_stats)
+_commit_stats = {"commits": 0, "deferred": 0, "transactions": 0, "units": 0, "rolled_back": 0}
+_commit_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _commit_stats_lock:
+        _commit_stats[name] += 1
+
+
+def get_commit_stats():
+    """
+    :return: Словарь со статистикой: выполнено коммитов, отложено коммитов операций до завершения единицы работы,
+             зафиксировано транзакций единиц работы, записано и откачено документов (единиц работы),
+             сэкономлено коммитов.
+    """
+    with _commit_stats_lock:
+        stats = dict(_commit_stats)
+    stats["saved"] = max(0, stats["deferred"] - stats["transactions"])
+    return stats
+
+
+def log_commit_stats():
+    """
+    Логирует статистику коммитов.
+    """
+    stats = get_commit_stats()
+    logger.info(f"Транзакции БД: коммитов {stats['commits']}, документов записано {stats['units']}, "
+                f"откачено {stats['rolled_back']}, сэкономлено коммитов {stats['saved']}")
+
+
+class UnitOfWork:
+    """
+    Состояние единицы работы (см. DatabaseManager.unit_of_work).
+
+    Атрибуты:
+        savepoint (str | None): Имя точки сохранения вложенной единицы или None для внешней (транзакции).
+        failed (bool): True, если записи единицы откачены.
+    """
+
+    def __init__(self, depth):
+        self.savepoint = f"unit_{depth}" if depth else None
+        self.failed = False
+
 
 class DatabaseManager:
     """
     Класс для управления подключением и взаимодействием с базой данных.
 
+    Соединение берётся из общего пула (см. connection_pool.get_connection_pool) и возвращается в него
+    методом close или, если close не был вызван, при удалении объекта.
+
+    Вне единицы работы соединение работает в режиме autocommit: запросы на чтение не открывают транзакцию,
+    поэтому соединение, которое поток держит долго, не остаётся в состоянии "idle in transaction"
+    (открытый снимок данных мешает VACUUM). Единица работы (unit_of_work) выключает autocommit на время
+    своей транзакции.
+
     Атрибуты:
         connection (psycopg2.extensions.connection): Объект соединения с базой данных.
         cursor (psycopg2.extensions.cursor): Курсор для выполнения SQL-запросов к базе данных.
-        db_host (str): Хост базы данных.
-        db_name (str): Название базы данных.
-        db_user (str): Имя пользователя базы данных.
-        db_password (str): Пароль пользователя базы данных.
-        db_port (str): Порт подключения к базе данных.
-        zip_directory (str): Директория для хранения ZIP-архивов.
     """
 
     def __init__(self):
         """
         Инициализация объекта DatabaseManager.
 
-        Загружает настройки подключения из файла .env, устанавливает соединение с базой данных и инициализирует курсор.
+        Получает соединение из общего пула и инициализирует курсор.
 
         Исключения:
-            Exception: В случае ошибки подключения к базе данных.
+            Exception: В случае ошибки подключения к базе данных (в том числе PoolTimeoutError, если
+            свободное соединение не появилось в пуле вовремя). Объект без соединения не создаётся.
         """
-
-        # Загружаем переменные окружения из файла .env
-        load_dotenv(dotenv_path=r'C:\Users\wangr\PycharmProjects\TenderMonitor\database_work\db_credintials.env')
-
-        # Получаем данные для подключения к базе данных
-        self.db_host = os.getenv("DB_HOST")
-        self.db_name = os.getenv("DB_DATABASE")
-        self.db_user = os.getenv("DB_USER")
-        self.db_password = os.getenv("DB_PASSWORD")
-        self.db_port = os.getenv("DB_PORT")
+        self.connection = None
+        self.cursor = None
+        self._release = None
+        # Вложенность единиц работы, признак ошибки текущей единицы и действия после коммита
+        self._unit_depth = 0
+        self._unit_failed = False
+        self._after_commit = []
+        self._nested_units = 0
+        self._last_used = time.monotonic()
 
         try:
-            # Устанавливаем соединение с базой данных
-            self.connection = psycopg2.connect(
-                database=self.db_name,
-                user=self.db_user,
-                password=self.db_password,
-                host=self.db_host,
-                port=self.db_port
-            )
+            # Получаем соединение из пула (открывается только при нехватке свободных)
+            connections = get_connection_pool()
+            self.connection = connections.getconn()
+            self._release = weakref.finalize(self, connections.putconn, self.connection)
+            self.connection.autocommit = True
 
             # Инициализируем курсор для выполнения операций с базой данных
             self.cursor = self.connection.cursor()
-            logger.debug('Подключился к базе данных.')
+            logger.debug('Получено соединение с базой данных из пула.')
         except Exception as e:
             # Логируем и выбрасываем исключение в случае ошибки подключения
-            logger.exception(f'Ошибка подключения к базе данных: {e}')
+            logger.error(f'Ошибка подключения к базе данных: {e}')
+            if self._release is not None:
+                self._release()
+            raise
 
     def execute_query(self, query, params=None, fetch=False):
         """
@@ -66,7 +116,7 @@ class DatabaseManager:
         :return: Результат запроса, если `fetch=True`, иначе None.
         """
         self.cursor.execute(query, params)
-        self.connection.commit()
+        self.commit()
         if fetch:  # Только если нужен результат
             return self.cursor.fetchall()
 
@@ -82,18 +132,153 @@ class DatabaseManager:
         result = self.cursor.fetchone()
         return result[0] if result else False  # Вернёт False, если данных нет
 
+    def is_alive(self, max_idle):
+        """
+        Проверяет соединение запросом `SELECT 1`, если оно не использовалось дольше max_idle секунд
+        (как проверка соединений при выдаче из пула, см. ConnectionPool.getconn).
+
+        :param max_idle: Время простоя в секундах, после которого соединение проверяется.
+        :return: False, если соединение закрыто или разорвано.
+        """
+        if self.connection is None or self.connection.closed:
+            return False
+        now = time.monotonic()
+        if self._unit_depth or now - self._last_used < max_idle:
+            self._last_used = now
+            return True
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception as e:
+            logger.warning(f"Соединение с БД разорвано: {e}")
+            return False
+        self._last_used = now
+        return True
+
+    def commit(self):
+        """
+        Фиксирует транзакцию. Внутри единицы работы коммит откладывается до её завершения.
+        """
+        if self._unit_depth:
+            _count("deferred")
+            return
+        self.connection.commit()
+        _count("commits")
+
+    def rollback(self):
+        """
+        Откатывает транзакцию. Внутри единицы работы отмечает её как неудавшуюся: записи единицы
+        откатываются при её завершении.
+        """
+        if self._unit_depth:
+            self._unit_failed = True
+            return
+        self.connection.rollback()
+
+    def after_commit(self, callback):
+        """
+        Выполняет callback после фиксации записей: сразу вне единицы работы или после коммита внешней
+        единицы. При откате единицы callback не выполняется.
+        """
+        if self._unit_depth:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Единица работы: записи внутри блока (имя файла, заказчик, площадка, контракт, ссылки) выполняются
+        в одной транзакции и фиксируются одним коммитом при выходе. Если в блоке возникло исключение или
+        операция завершилась ошибкой (см. rollback), откатываются все записи блока.
+
+        Вложенный блок выполняется в точке сохранения: при ошибке откатываются только его записи, а внешняя
+        транзакция продолжается. Так несколько документов фиксируются одним коммитом, и ошибка одного
+        документа не отменяет остальные.
+
+        :return: Объект UnitOfWork; после выхода из блока его атрибут failed показывает, откачены ли записи.
+        """
+        unit = UnitOfWork(self._unit_depth)
+        if unit.savepoint:
+            self.cursor.execute(f"SAVEPOINT {unit.savepoint}")
+        else:
+            self.connection.autocommit = False
+            self._nested_units = 0
+        outer_failed, self._unit_failed = self._unit_failed, False
+        callbacks = len(self._after_commit)
+        self._unit_depth += 1
+        try:
+            yield unit
+        except GeneratorExit:
+            # Досрочно закрытый генератор группы документов: обработанные документы записываются
+            raise
+        except BaseException:
+            self._unit_failed = True
+            raise
+        finally:
+            self._unit_depth -= 1
+            self._finish_unit(unit, callbacks, outer_failed)
+
+    def _finish_unit(self, unit, callbacks, outer_failed):
+        """
+        Фиксирует или откатывает записи единицы работы.
+        """
+        unit.failed = self._unit_failed
+        try:
+            if unit.savepoint:
+                self.cursor.execute(f"{'ROLLBACK TO' if unit.failed else 'RELEASE'} SAVEPOINT {unit.savepoint}")
+            elif unit.failed:
+                self.connection.rollback()
+            else:
+                self.connection.commit()
+                _count("commits")
+                _count("transactions")
+        except Exception as e:
+            logger.error(f"Ошибка при завершении транзакции: {e}")
+            unit.failed = True
+            if unit.savepoint:
+                # Точку сохранения откатить не удалось, прервана вся внешняя транзакция
+                outer_failed = True
+            else:
+                try:
+                    self.connection.rollback()
+                except Exception:
+                    pass
+
+        if not unit.savepoint:
+            try:
+                self.connection.autocommit = True
+            except Exception as e:
+                logger.error(f"Не удалось включить autocommit: {e}")
+            self._last_used = time.monotonic()
+
+        self._unit_failed = outer_failed if unit.savepoint else False
+        # Документом считается единица, вложенная непосредственно во внешнюю, или внешняя без вложенных
+        # (не группа документов); единицы глубже входят в запись своего документа
+        document_unit = unit.savepoint and self._unit_depth == 1
+        if document_unit:
+            self._nested_units += 1
+        if document_unit or (not unit.savepoint and not self._nested_units):
+            _count("rolled_back" if unit.failed else "units")
+        if unit.failed:
+            del self._after_commit[callbacks:]
+        elif not unit.savepoint:
+            pending, self._after_commit = self._after_commit, []
+            for callback in pending:
+                callback()
+
     def close(self):
         """
-        Закрывает соединение и курсор с базой данных.
+        Закрывает курсор и возвращает соединение в пул.
 
         :return: None
         """
         try:
-            if self.cursor:
+            if self.cursor and not self.cursor.closed:
                 self.cursor.close()
                 logger.debug("Курсор закрыт.")
-            if self.connection:
-                self.connection.close()
-                logger.debug("Соединение с базой данных закрыто.")
+            if self._release is not None and self._release.alive:
+                self._release()
+                logger.debug("Соединение с базой данных возвращено в пул.")
         except Exception as e:
-            logger.exception(f"Ошибка при закрытии соединения или курсора: {e}")
\ No newline at end of file
+            logger.exception(f"Ошибка при закрытии соединения или курсора: {e}")
@@ -1,5 +1,9 @@
 from loguru import logger
 from database_work.database_connection import DatabaseManager
+from database_work.reference_cache import get_reference_cache, MISSING
+
+# Наибольшее число значений в одном запросе fetch_ids
+FETCH_IDS_CHUNK = 5000
 
 class DatabaseIDFetcher:
     """
@@ -9,15 +13,18 @@ class DatabaseIDFetcher:
         cursor (cursor): Общий курсор для выполнения запросов.
     """
 
-    def __init__(self):
+    def __init__(self, db_manager=None):
         """
         Инициализация объекта DatabaseIDFetcher.
 
-        Создает экземпляр DatabaseManager для выполнения запросов к базе данных.
+        :param db_manager: Общий DatabaseManager (см. runtime.RuntimeContext). Если не передан,
+                           создается собственный экземпляр DatabaseManager.
         """
 
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager or DatabaseManager()
         self.cursor = None  # Инициализируем курсор как None
+        # Заранее полученные id (см. prefetch): {(таблица, столбец): {значение: id или None}}
+        self._prefetched = {}
 
     def get_cursor(self):
         """
@@ -32,7 +39,21 @@ class DatabaseIDFetcher:
     def fetch_id(self, table_name, column_name, value):
         """
         Универсальный метод для получения id записи по заданному значению в указанной таблице.
+        Справочные таблицы (регионы, ОКПД, площадки, заказчики, поставщики) обслуживаются
+        из кэша процесса без запроса к БД (см. reference_cache.ReferenceCache).
         """
+        prefetched = self._prefetched.get((table_name, column_name))
+        if prefetched and value in prefetched:
+            # Значение получено заранее вместе с остальными файлами архива и используется один раз
+            return prefetched.pop(value)
+
+        cache = get_reference_cache()
+        cached = cache.get(table_name, column_name, value)
+        if cached is not MISSING:
+            if cached is None:
+                logger.debug(f"Запись с {column_name}={value} отсутствует в {table_name} (кэш).")
+            return cached
+
         query = f"SELECT id FROM {table_name} WHERE {column_name} = %s"
         params = (value,)
 
@@ -41,6 +62,10 @@ class DatabaseIDFetcher:
             cursor = self.get_cursor()  # Получаем курсор (создаём, если не существует)
             cursor.execute(query, params)
             result = cursor.fetchone()
+            # Внутри единицы работы найденная запись может быть ещё не зафиксирована,
+            # поэтому в кэш она попадает только после коммита
+            record_id = result[0] if result else None
+            self.db_manager.after_commit(lambda: cache.store(table_name, column_name, value, record_id))
             if result:
                 return result[0]  # Возвращаем id
             else:
@@ -48,8 +73,76 @@ class DatabaseIDFetcher:
                 return None
         except Exception as e:
             logger.error(f"Ошибка при получении id из {table_name}: {e}")
+            # Соединение используется повторно, поэтому прерванную транзакцию нужно откатить
+            self.db_manager.rollback()
+            return None
+
+    def fetch_ids(self, table_name, column_name, values):
+        """
+        Получает id записей для многих значений одним запросом (`= ANY(%s)`, по FETCH_IDS_CHUNK значений).
+        Значения, которые есть в кэше справочников, в запрос не попадают.
+
+        :param table_name: Таблица.
+        :param column_name: Столбец, по которому ищутся записи.
+        :param values: Значения того же типа, что и столбец (повторы допускаются).
+        :return: Словарь {значение: id} только для найденных значений или None при ошибке запроса.
+        """
+        cache = get_reference_cache()
+        found = {}
+        pending = []
+        for value in dict.fromkeys(value for value in values if value is not None):
+            cached = cache.get(table_name, column_name, value)
+            if cached is MISSING:
+                pending.append(value)
+            elif cached is not None:
+                found[value] = cached
+
+        query = f"SELECT {column_name}, id FROM {table_name} WHERE {column_name} = ANY(%s)"
+        try:
+            cursor = self.get_cursor()
+            for start in range(0, len(pending), FETCH_IDS_CHUNK):
+                chunk = pending[start:start + FETCH_IDS_CHUNK]
+                cursor.execute(query, (chunk,))
+                # Ключи сравниваются как строки: тип значения из БД может отличаться от переданного
+                rows = {str(key): record_id for key, record_id in cursor.fetchall()}
+                for value in chunk:
+                    record_id = rows.get(str(value))
+                    cache.store(table_name, column_name, value, record_id)
+                    if record_id is not None:
+                        found[value] = record_id
+        except Exception as e:
+            logger.error(f"Ошибка при получении id из {table_name}: {e}")
+            # Соединение используется повторно, поэтому прерванную транзакцию нужно откатить
+            self.db_manager.rollback()
             return None
 
+        logger.debug(f"{table_name}.{column_name}: найдено {len(found)} из {len(pending) + len(found)} значений, "
+                     f"запросов к БД {-(-len(pending) // FETCH_IDS_CHUNK)}")
+        return found
+
+    def prefetch(self, table_name, column_name, values):
+        """
+        Получает id для многих значений одним запросом (см. fetch_ids) и запоминает результат, включая
+        ненайденные значения: последующий fetch_id по каждому из этих значений не обращается к БД.
+        Каждое запомненное значение используется один раз; неиспользованные удаляет clear_prefetched.
+        При ошибке запроса ничего не запоминается, и fetch_id обращается к БД как обычно.
+
+        :return: Словарь {значение: id} только для найденных значений или None при ошибке запроса.
+        """
+        values = [value for value in values if value is not None]
+        found = self.fetch_ids(table_name, column_name, values)
+        if found is not None:
+            prefetched = self._prefetched.setdefault((table_name, column_name), {})
+            for value in values:
+                prefetched[value] = found.get(value)
+        return found
+
+    def clear_prefetched(self):
+        """
+        Удаляет неиспользованные заранее полученные id.
+        """
+        self._prefetched.clear()
+
     def get_collection_codes_okpd_id(self, code):
         """
         Получает id записи из таблицы collection_codes_okpd по коду.
@@ -223,6 +316,9 @@ class DatabaseIDFetcher:
 
     def close(self):
         """
-        Закрывает соединение с базой данных.
+        Закрывает курсор и возвращает соединение с базой данных в пул.
         """
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
         self.db_manager.close()
@@ -1,13 +1,18 @@
+import time
+from contextlib import contextmanager
 from loguru import logger
 from database_work.database_connection import DatabaseManager
 from psycopg2 import IntegrityError
+from psycopg2.extras import execute_values
 from secondary_functions import load_config
+from database_work.reference_cache import get_reference_cache
 
 
 class DatabaseOperations:
-    def __init__(self, config_path="config.ini"):
+    def __init__(self, config_path="config.ini", db_manager=None):
 
-        self.db_manager = DatabaseManager()
+        # Общий DatabaseManager (см. runtime.RuntimeContext) или собственный
+        self.db_manager = db_manager or DatabaseManager()
 
         self.config = load_config(config_path)
         if not self.config:
@@ -15,6 +20,35 @@ class DatabaseOperations:
 
         self.tags_paths = self.config['tags']
 
+        # Буферы многострочной вставки (см. buffer_insert): {(таблица, столбцы): [строки]}
+        self.insert_batch = max(1, self.config.getint('db', 'insert_batch', fallback=500))
+        self.insert_flush_seconds = self.config.getfloat('db', 'insert_flush_seconds', fallback=5)
+        self._buffers = {}
+        self._buffered_at = None
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Записи одного документа в одной транзакции (см. DatabaseManager.unit_of_work):
+
+            with db_operations.unit_of_work():
+                db_operations.insert_file_name(file_name)
+                ...
+
+        Строки, оставшиеся в буферах вставки, записываются перед коммитом, а при ошибке отбрасываются
+        и не попадают в транзакцию следующего документа.
+        """
+        with self.db_manager.unit_of_work() as unit:
+            try:
+                yield unit
+            except GeneratorExit:
+                self.flush_inserts()
+                raise
+            except BaseException:
+                self.discard_inserts()
+                raise
+            self.flush_inserts()
+
     def _prepare_contact(self, customer_data, tags_file):
         """Подготовка поля contact (ФИО) для записи."""
         if tags_file == self.tags_paths['get_tags_44_new']:
@@ -81,31 +115,113 @@ class DatabaseOperations:
             values = tuple(data.values())
             placeholders = ', '.join(['%s'] * len(data))
 
+            # Повтор уже записанного значения не прерывает транзакцию: внутри единицы работы ошибка
+            # уникальности отменила бы все записи документа
             insert_query = f"""
                 INSERT INTO {table_name} ({columns})
-                VALUES ({placeholders}) RETURNING id
+                VALUES ({placeholders})
+                ON CONFLICT DO NOTHING RETURNING id
             """
             cursor.execute(insert_query, values)
-            inserted_id = cursor.fetchone()[0]
+            row = cursor.fetchone()
+            if row is None:
+                logger.warning(f"Запись уже существует в {table_name}: {data}")
+                # Запись могла быть добавлена другим процессом: следующий поиск должен обратиться к БД
+                get_reference_cache().invalidate(table_name, data)
+                return None
+            inserted_id = row[0]
 
-            # Если курсор локальный, коммитим
+            # Если курсор локальный, коммитим (внутри единицы работы — при её завершении) и после коммита
+            # добавляем новую запись в кэш справочников
             if use_local_cursor:
-                self.db_manager.connection.commit()
+                self.db_manager.commit()
+                self.db_manager.after_commit(
+                    lambda: get_reference_cache().record_insert(table_name, data, inserted_id))
 
             logger.info(f"Добавлена новая запись в таблицу {table_name} с id: {inserted_id}")
             return inserted_id
 
         except IntegrityError as e:
             logger.warning(f"Ошибка при вставке данных в {table_name}: {e}")
+            # Соединение общее для потока, прерванную транзакцию нужно откатить
+            self.db_manager.rollback()
+            # Запись могла быть добавлена другим процессом: следующий поиск должен обратиться к БД
+            get_reference_cache().invalidate(table_name, data)
             return None
         except Exception as e:
             logger.error(f"Ошибка при вставке данных в {table_name}: {e}")
-            self.db_manager.connection.rollback()
+            self.db_manager.rollback()
+            get_reference_cache().invalidate(table_name, data)
             return None
         finally:
             if use_local_cursor:
                 cursor.close()
 
+    def buffer_insert(self, table_name, data):
+        """
+        Добавляет строку в буфер многострочной вставки таблицы. Буфер записывается одним запросом
+        (см. flush_inserts), когда в нём набирается `[db] insert_batch` строк или с первой строки прошло
+        `insert_flush_seconds` секунд. Подходит для записей, id которых не нужен сразу (ссылки на документацию).
+
+        :param table_name: Таблица.
+        :param data: Данные {столбец: значение}; пустые строки записываются как NULL.
+        """
+        key = (table_name, tuple(data))
+        row = tuple(None if value == '' else value for value in data.values())
+        if not self._buffers:
+            self._buffered_at = time.monotonic()
+        rows = self._buffers.setdefault(key, [])
+        rows.append(row)
+
+        if len(rows) >= self.insert_batch or time.monotonic() - self._buffered_at >= self.insert_flush_seconds:
+            self.flush_inserts()
+
+    def flush_inserts(self):
+        """
+        Записывает буферы вставки: строки каждой таблицы — многострочными запросами `INSERT ... VALUES`
+        (execute_values, по insert_batch строк). Уже существующие записи пропускаются одним
+        `ON CONFLICT DO NOTHING` для всего запроса, без исключения на каждую строку.
+
+        :return: Число добавленных строк или None при ошибке (строки буферов отбрасываются).
+        """
+        buffers, self._buffers = self._buffers, {}
+        self._buffered_at = None
+        if not buffers:
+            return 0
+
+        inserted_count = 0
+        try:
+            with self.db_manager.connection.cursor() as cursor:
+                for (table_name, columns), rows in buffers.items():
+                    insert_query = f"""
+                        INSERT INTO {table_name} ({', '.join(columns)})
+                        VALUES %s
+                        ON CONFLICT DO NOTHING RETURNING id
+                    """
+                    inserted = execute_values(cursor, insert_query, rows, page_size=self.insert_batch, fetch=True)
+                    inserted_count += len(inserted)
+
+                    duplicates = len(rows) - len(inserted)
+                    logger.info(f"Добавлено записей в таблицу {table_name}: {len(inserted)}"
+                                + (f", уже существовало: {duplicates}" if duplicates else ""))
+            self.db_manager.commit()
+            return inserted_count
+
+        except Exception as e:
+            tables = ", ".join(table_name for table_name, _ in buffers)
+            logger.error(f"Ошибка при многострочной вставке в {tables}: {e}")
+            self.db_manager.rollback()
+            return None
+
+    def discard_inserts(self):
+        """
+        Отбрасывает строки буферов вставки, не записывая их.
+        """
+        if self._buffers:
+            logger.debug(f"Отброшено строк буфера вставки: {sum(map(len, self._buffers.values()))}")
+        self._buffers = {}
+        self._buffered_at = None
+
     def insert_customer(self, customer_data, tags_file):
         """Вставка нового заказчика в таблицу."""
         try:
@@ -180,7 +296,7 @@ class DatabaseOperations:
                         """
                         update_values.append(customer_id)
                         cursor.execute(update_query, tuple(update_values))
-                        self.db_manager.connection.commit()  # <-- ДОБАВИЛ КОМИТ
+                        self.db_manager.commit()  # <-- ДОБАВИЛ КОМИТ
 
                         logger.info(f"Обновлена запись в customer с id: {customer_id}")
                 else:
@@ -191,7 +307,7 @@ class DatabaseOperations:
 
         except Exception as e:
             logger.error(f"Ошибка при обновлении данных в customer: {e}")
-            self.db_manager.connection.rollback()
+            self.db_manager.rollback()
             return None
 
     def insert_file_name(self, file_name):
@@ -200,25 +316,31 @@ class DatabaseOperations:
             with self.db_manager.connection.cursor() as cursor:  # Используем контекстный менеджер
                 insert_query = """
                     INSERT INTO file_names_xml (file_name)
-                    VALUES (%s) RETURNING id;
+                    VALUES (%s)
+                    ON CONFLICT DO NOTHING RETURNING id;
                 """
                 cursor.execute(insert_query, (file_name,))
-                inserted_id = cursor.fetchone()[0]
-                self.db_manager.connection.commit()
+                row = cursor.fetchone()
+                if row is None:
+                    logger.warning(f"Имя файла {file_name} уже записано в file_names_xml.")
+                    return None
+                inserted_id = row[0]
+                self.db_manager.commit()
 
                 logger.info(f"Добавлено имя файла в file_names_xml с id: {inserted_id}")
                 return inserted_id
 
         except IntegrityError as e:
             logger.warning(f"Ошибка при вставке имени файла {file_name} в file_names_xml: {e}")
+            self.db_manager.rollback()
             return None
         except Exception as e:
             logger.error(f"Ошибка при вставке имени файла {file_name}: {e}")
-            self.db_manager.connection.rollback()
+            self.db_manager.rollback()
             return None
 
-    def _update_existing_contract(self, contract_id, contract_data):
-        """Обновление данных существующего контракта."""
+    def _update_existing_contract(self, contract_id, contract_data, table_name="reestr_contract_44_fz"):
+        """Обновление данных существующего контракта (по умолчанию в reestr_contract_44_fz)."""
         try:
             with self.db_manager.connection.cursor() as cursor:
                 update_columns = []
@@ -231,13 +353,13 @@ class DatabaseOperations:
 
                 if update_columns:
                     update_query = f"""
-                        UPDATE reestr_contract_44_fz
+                        UPDATE {table_name}
                         SET {', '.join(update_columns)}
                         WHERE id = %s
                     """
                     update_values.append(contract_id)
                     cursor.execute(update_query, tuple(update_values))
-                    self.db_manager.connection.commit()  # <-- ДОБАВИЛ КОМИТ
+                    self.db_manager.commit()  # <-- ДОБАВИЛ КОМИТ
 
                     logger.info(f"Контракт с номером {contract_id} успешно обновлен.")
                     return contract_id
@@ -246,7 +368,7 @@ class DatabaseOperations:
                     return contract_id
         except Exception as e:
             logger.error(f"Ошибка при обновлении контракта {contract_id}: {e}")
-            self.db_manager.connection.rollback()
+            self.db_manager.rollback()
             return None
 
     # Пример вставки в другие таблицы, аналогично insert_customer
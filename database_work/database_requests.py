@@ -13,9 +13,9 @@ def get_region_codes():
     :return: Список кодов регионов (list[str]), если запрос выполнен успешно.
              Пустой список, если произошла ошибка.
     """
-    db = DatabaseManager()
-
+    db = None
     try:
+        db = DatabaseManager()
         # Выполняем запрос к базе данных для получения кодов регионов
         query = "SELECT code FROM region ORDER BY code;"
         db.cursor.execute(query)
@@ -34,6 +34,54 @@ def get_region_codes():
         return []
 
     finally:
-        # Закрываем курсор и соединение с базой данных
-        db.cursor.close()
-        db.connection.close()
+        # Закрываем курсор и возвращаем соединение в пул
+        if db is not None:
+            db.close()
+
+
+def get_okpd_codes():
+    """
+    Получает коды ОКПД из справочника `collection_codes_okpd`.
+
+    :return: Список кортежей (id, sub_code), если запрос выполнен успешно.
+             Пустой список, если произошла ошибка.
+    """
+    db = None
+    try:
+        db = DatabaseManager()
+        db.cursor.execute("SELECT id, sub_code FROM collection_codes_okpd WHERE sub_code IS NOT NULL;")
+        rows = db.cursor.fetchall()
+        logger.debug(f"Получено кодов ОКПД из справочника: {len(rows)}")
+        return rows
+
+    except Exception as e:
+        logger.exception(f"Ошибка при получении кодов ОКПД: {e}")
+        return []
+
+    finally:
+        if db is not None:
+            db.close()
+
+
+def get_user_okpd_codes():
+    """
+    Получает коды ОКПД, добавленные пользователями (таблица `okpd_from_users`).
+
+    :return: Список кортежей (id, code), если запрос выполнен успешно.
+             Пустой список, если произошла ошибка.
+    """
+    db = None
+    try:
+        db = DatabaseManager()
+        db.cursor.execute("SELECT id, code FROM okpd_from_users WHERE code IS NOT NULL;")
+        rows = db.cursor.fetchall()
+        logger.debug(f"Получено пользовательских кодов ОКПД: {len(rows)}")
+        return rows
+
+    except Exception as e:
+        logger.exception(f"Ошибка при получении пользовательских кодов ОКПД: {e}")
+        return []
+
+    finally:
+        if db is not None:
+            db.close()
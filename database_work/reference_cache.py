@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import OrderedDict
+from loguru import logger
+
+from secondary_functions import load_config
+from database_work.connection_pool import get_connection_pool
+
+# Признак отсутствия значения в кэше (None в кэше означает, что записи нет в БД)
+MISSING = object()
+
+# Небольшие справочники: загружаются целиком, отсутствие значения в загруженной таблице означает отсутствие в БД
+PRELOADED = (
+    ("region", "code"),
+    ("collection_codes_okpd", "code"),
+    ("collection_codes_okpd", "sub_code"),
+    ("trading_platform", "trading_platform_name"),
+)
+# Большие таблицы: ограниченный LRU-кэш найденных и ненайденных значений
+LRU = (
+    ("customer", "customer_inn"),
+    ("contractor", "inn"),
+)
+
+
+class ReferenceCache:
+    """
+    Кэш id справочных записей для DatabaseIDFetcher.fetch_id.
+
+    Таблицы PRELOADED загружаются целиком при первом обращении (или методом preload) и перезагружаются
+    раз в `refresh_minutes` минут. Для таблиц LRU хранятся последние `lru_size` значений, включая
+    ненайденные (ненайденное значение хранится не дольше `negative_ttl` секунд, 0 — без ограничения).
+    Записи, добавленные через DatabaseOperations, сразу попадают в кэш (см. record_insert), поэтому новые id
+    не запрашиваются из БД повторно. Значения, вставка которых не удалась, удаляются из кэша (см. invalidate)
+    и до следующего ответа БД ищутся запросом.
+
+    Параметры читаются из секции `[reference_cache]`.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.enabled = self.config.getboolean("reference_cache", "enabled", fallback=True)
+        self.refresh_interval = self.config.getint("reference_cache", "refresh_minutes", fallback=60) * 60
+        self.lru_size = max(1, self.config.getint("reference_cache", "lru_size", fallback=100000))
+        self.negative_ttl = self.config.getint("reference_cache", "negative_ttl", fallback=600)
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # {(таблица, столбец): {значение: id}} и время загрузки
+        self._tables = {}
+        self._loaded_at = {}
+        # {(таблица, столбец): значения загруженной таблицы, которые нужно проверить запросом к БД}
+        self._recheck = {key: set() for key in PRELOADED}
+        # {(таблица, столбец): OrderedDict {значение: (id или None, время записи)}}
+        self._lru = {key: OrderedDict() for key in LRU}
+        self.stats = {key: {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0} for key in PRELOADED + LRU}
+
+    def _load_table(self, table_name, column_name):
+        """
+        Загружает значения столбца и id всей таблицы.
+
+        :return: Словарь {значение: id} или None, если загрузить не удалось.
+        """
+        try:
+            with get_connection_pool().connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT {column_name}, id FROM {table_name} WHERE {column_name} IS NOT NULL")
+                    rows = cursor.fetchall()
+                connection.rollback()
+        except Exception as e:
+            logger.error(f"Не удалось загрузить справочник {table_name}.{column_name}: {e}")
+            return None
+        logger.debug(f"Справочник {table_name}.{column_name} загружен в кэш: {len(rows)} записей")
+        return {str(value): record_id for value, record_id in rows}
+
+    def preload(self):
+        """
+        Загружает (перезагружает) все таблицы PRELOADED.
+        """
+        if not self.enabled:
+            return
+        for key in PRELOADED:
+            self._refresh(key)
+
+    def _refresh(self, key):
+        values = self._load_table(*key)
+        with self._lock:
+            self._loaded_at[key] = time.monotonic()
+            if values is not None:
+                self._tables[key] = values
+                self._recheck[key].clear()
+
+    def _is_stale(self, key):
+        with self._lock:
+            loaded_at = self._loaded_at.get(key)
+        return loaded_at is None or (self.refresh_interval and time.monotonic() - loaded_at > self.refresh_interval)
+
+    def _preloaded(self, key):
+        """
+        Возвращает загруженную таблицу, загружая её при первом обращении и по истечении refresh_minutes.
+        """
+        if self._is_stale(key):
+            # Таблицу загружает один поток, остальные ждут и используют результат
+            with self._refresh_lock:
+                if self._is_stale(key):
+                    self._refresh(key)
+        with self._lock:
+            return self._tables.get(key)
+
+    def get(self, table_name, column_name, value):
+        """
+        Ищет id в кэше.
+
+        :return: id записи, None — записи нет в БД, MISSING — значение не кэшируется или не найдено в кэше.
+        """
+        key = (table_name, column_name)
+        if not self.enabled or key not in self.stats or value is None:
+            return MISSING
+        # Значения сравниваются как строки: тип столбца (например, числовой код региона) может не совпадать
+        # с типом значения из документа, а БД приводит их при сравнении
+        value = str(value)
+
+        if key in self._lru:
+            with self._lock:
+                entries = self._lru[key]
+                entry = entries.get(value)
+                if entry is not None and entry[0] is None and self.negative_ttl \
+                        and time.monotonic() - entry[1] > self.negative_ttl:
+                    del entries[value]
+                    entry = None
+                if entry is None:
+                    self.stats[key]["misses"] += 1
+                    return MISSING
+                entries.move_to_end(value)
+                self.stats[key]["hits" if entry[0] is not None else "negative_hits"] += 1
+                return entry[0]
+
+        values = self._preloaded(key)
+        with self._lock:
+            if values is None or value in self._recheck[key]:
+                self.stats[key]["misses"] += 1
+                return MISSING
+            record_id = values.get(value)
+            self.stats[key]["hits" if record_id is not None else "negative_hits"] += 1
+            return record_id
+
+    def store(self, table_name, column_name, value, record_id):
+        """
+        Запоминает результат запроса к БД: id записи или None, если записи нет.
+        """
+        key = (table_name, column_name)
+        if not self.enabled or value is None:
+            return
+        value = str(value)
+        with self._lock:
+            if key in self._lru:
+                entries = self._lru[key]
+                entries[value] = (record_id, time.monotonic())
+                entries.move_to_end(value)
+                while len(entries) > self.lru_size:
+                    entries.popitem(last=False)
+                    self.stats[key]["evictions"] += 1
+            elif key in self._tables:
+                # Ответ БД: проверенное значение снова берётся из таблицы
+                self._recheck[key].discard(value)
+                if record_id is not None:
+                    self._tables[key][value] = record_id
+
+    def record_insert(self, table_name, data, record_id):
+        """
+        Добавляет в кэш только что вставленную запись по всем кэшируемым столбцам таблицы.
+
+        :param table_name: Таблица.
+        :param data: Вставленные данные {столбец: значение}.
+        :param record_id: id новой записи.
+        """
+        if not self.enabled or record_id is None:
+            return
+        for key in PRELOADED + LRU:
+            if key[0] == table_name and data.get(key[1]) is not None:
+                self.store(table_name, key[1], data[key[1]], record_id)
+
+    def invalidate(self, table_name, data):
+        """
+        Удаляет из кэша значения записи, вставка которой не удалась (например, запись уже добавлена
+        другим процессом), чтобы следующий поиск обратился к БД. В загруженной таблице отсутствие значения
+        означает отсутствие записи в БД, поэтому значение отмечается для проверки до ответа БД (см. store).
+        """
+        with self._lock:
+            for key, entries in self._lru.items():
+                if key[0] == table_name and data.get(key[1]) is not None:
+                    entries.pop(str(data[key[1]]), None)
+            for key, values in self._tables.items():
+                if key[0] == table_name and data.get(key[1]) is not None:
+                    value = str(data[key[1]])
+                    values.pop(value, None)
+                    self._recheck[key].add(value)
+
+    def get_stats(self):
+        """
+        :return: Словарь {"таблица.столбец": {"hits", "negative_hits", "misses", "evictions", "size", "hit_rate"}}.
+        """
+        with self._lock:
+            stats = {}
+            for key, counters in self.stats.items():
+                size = len(self._lru[key]) if key in self._lru else len(self._tables.get(key) or ())
+                lookups = counters["hits"] + counters["negative_hits"] + counters["misses"]
+                hit_rate = (counters["hits"] + counters["negative_hits"]) / lookups if lookups else 0.0
+                stats[".".join(key)] = dict(counters, size=size, hit_rate=hit_rate)
+            return stats
+
+    def log_stats(self):
+        """
+        Логирует долю попаданий и вытеснения по таблицам.
+        """
+        if not self.enabled:
+            return
+        for name, stats in self.get_stats().items():
+            if stats["hits"] or stats["negative_hits"] or stats["misses"]:
+                logger.info(f"Кэш {name}: попаданий {stats['hits']}, отсутствующих {stats['negative_hits']}, "
+                            f"промахов {stats['misses']} ({stats['hit_rate']:.1%}), вытеснено {stats['evictions']}, "
+                            f"записей {stats['size']}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_reference_cache(config_path="config.ini"):
+    """
+    Возвращает общий для процесса кэш справочников, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр ReferenceCache.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ReferenceCache(config_path)
+        return _shared_cache
@@ -3,23 +3,36 @@ from datetime import datetime, timezone
 import uuid
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
-from secondary_functions import load_token, load_config
+from secondary_functions import load_config
 from database_work.database_requests import get_region_codes
 from utils import XMLParser  # Импорт класса с функцией extract_archive_urls
 from file_downloader import FileDownloader  # Импорт класса с функцией download_files
+from http_session_pool import get_http_pool
+from retry_policy import get_retry_policy, raise_for_soap_fault, classify_error, CircuitOpenError
+from adaptive_limiter import get_limiter
+from request_planner import RequestPlanner
+from stunnel_supervisor import get_supervisor
+from token_pool import get_token_pool
+from version_index import get_version_index
+from database_work.reference_cache import get_reference_cache
+from database_work.database_connection import log_commit_stats
 
 
 class EISRequester:
-    def __init__(self, config_path: str = "config.ini"):
+    def __init__(self, config_path: str = "config.ini", date: str = None, planner: RequestPlanner = None):
         """
         Инициализация объекта EISRequester.
 
-        Загружает настройки из конфигурационного файла, токен для авторизации,
-        информацию о регионах, подсистемах и типах документов для работы с ЕИС.
+        Загружает настройки из конфигурационного файла, пул токенов для авторизации,
+        информацию о регионах и планировщик запросов по подсистемам и типам документов ЕИС.
 
         :param config_path: Путь к конфигурационному файлу. По умолчанию "config.ini".
+        :param date: Дата запросов в формате "YYYY-MM-DD". По умолчанию берётся из секции [eis] конфигурации.
+        :param planner: Общий планировщик запросов (например, при обработке нескольких дат параллельно).
+                        Если не передан, создаётся собственный.
         :raises ValueError: Если загрузка конфигурации не удалась.
         """
 
@@ -29,40 +42,63 @@ class EISRequester:
             raise ValueError("Ошибка загрузки конфигурации!")
 
         self.url = "http://localhost:8080/eis-integration/services/getDocsIP"  # URL для запроса к ЕИС
+        self.url_template = "http://localhost:{port}/eis-integration/services/getDocsIP"  # URL через экземпляр stunnel
 
-        # Загружаем токен для доступа к сервису
-        self.token = load_token(self.config)
+        # Пул токенов для доступа к сервису (запросы распределяются между токенами)
+        self.token_pool = get_token_pool(config_path)
 
-        # Загружаем дату из конфигурации
-        self.date = self.config.get("eis", "date")
+        # Загружаем дату из параметров или из конфигурации
+        self.date = date or self.config.get("eis", "date")
         logger.info(f"Дата: {self.date}")  # Логируем текущую дату
 
-        # Получаем список регионов из файла с кодами регионов
-        self.regions = get_region_codes()
+        if planner:
+            # Регионы уже загружены общим планировщиком
+            self.regions = planner.regions
+            self.planner = planner
+        else:
+            # Получаем список регионов из базы данных
+            self.regions = get_region_codes()
 
-        # Загружаем подсистемы для запроса по 44-ФЗ из конфигурации
-        self.subsystems_44 = [s.strip() for s in self.config.get("eis", "subsystems_44").split(",")]
+            # Планировщик матрицы запросов (подсистемы и типы документов из секции [eis])
+            self.planner = RequestPlanner(self.regions, config_path)
 
-        # Загружаем типы документов для подсистемы 'Извещения о закупках' по 44-ФЗ
-        self.documentType44_PRIZ = [doc.strip() for doc in self.config.get("eis", "documentType44_PRIZ").split(",")]
+        # Создаём объект для парсинга XML
+        self.xml_parser = XMLParser()
 
-        # Загружаем типы документов для подсистемы 'Протоколы подведения итогов' по 44-ФЗ
-        self.documentType44_RGK = [doc.strip() for doc in self.config.get("eis", "documentType44_RGK").split(",")]
+        # Общий пул HTTP-соединений для SOAP-запросов и скачивания архивов
+        self.http_pool = get_http_pool(config_path)
 
-        # Загружаем подсистемы для запроса по 223-ФЗ из конфигурации
-        self.subsystems_223 = [s.strip() for s in self.config.get("eis", "subsystems_223").split(",")]
+        # Политика повторов для SOAP-запросов (общая для процесса)
+        self.retry_policy = get_retry_policy("soap", config_path)
 
-        # Загружаем типы документов для подсистемы 'Извещения о закупках' по 223-ФЗ
-        self.documentType223_RI223 = [doc.strip() for doc in self.config.get("eis", "documentType223_RI223").split(",")]
+        # Адаптивный (AIMD) ограничитель параллельных SOAP-запросов к ЕИС
+        self.limiter = get_limiter("soap", config_path)
 
-        # Загружаем типы документов для подсистемы 'Протоколы подведения итогов' по 223-ФЗ
-        self.documentType223_RD223 = [doc.strip() for doc in self.config.get("eis", "documentType223_RD223").split(",")]
+        # Создаём объект для скачивания файлов
+        self.file_downloader = FileDownloader(config_path)
 
-        # Создаём объект для парсинга XML
-        self.xml_parser = XMLParser()
+        # Количество потоков для параллельной отправки запросов (1 — последовательный режим)
+        self.max_workers = max(1, self.config.getint("eis", "max_workers", fallback=1))
 
-        # Создаём объект для скачивания файлов
-        self.file_downloader = FileDownloader()
+        # Итоги последнего запуска по ключу (регион, подсистема, тип документа)
+        self.results = {}
+
+    def get_service_url(self, port: int = None) -> str:
+        """
+        Возвращает URL сервиса ЕИС.
+
+        Если к токену привязан собственный порт stunnel, используется он. Иначе, если запущен супервизор stunnel,
+        запросы распределяются по его исправным экземплярам (локальным портам).
+
+        :param port: Локальный порт stunnel, привязанный к токену запроса.
+        :return: URL для отправки SOAP-запроса.
+        """
+        if port:
+            return self.url_template.format(port=port)
+        supervisor = get_supervisor()
+        if supervisor:
+            return self.url_template.format(port=supervisor.next_port())
+        return self.url
 
     def get_current_time_utc(self) -> str:
         """
@@ -73,13 +109,14 @@ class EISRequester:
         # Возвращаем текущее время в UTC в нужном формате
         return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    def generate_soap_request(self, region_code: int, subsystem: str, document_type: str) -> str:
+    def generate_soap_request(self, region_code: int, subsystem: str, document_type: str, token: str) -> str:
         """
         Генерирует SOAP-запрос для получения документов из ЕИС.
 
         :param region_code: Код региона для запроса.
         :param subsystem: Подсистема (например, 44ФЗ или 223ФЗ) для запроса.
         :param document_type: Тип документа (например, извещение или протокол).
+        :param token: Токен доступа, выданный пулом токенов.
         :return: Сформированный SOAP-запрос в виде строки.
         """
 
@@ -93,7 +130,7 @@ class EISRequester:
         <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
                           xmlns:ws="http://zakupki.gov.ru/fz44/get-docs-ip/ws">
             <soapenv:Header>
-                <individualPerson_token>{self.token}</individualPerson_token>
+                <individualPerson_token>{token}</individualPerson_token>
             </soapenv:Header>
             <soapenv:Body>
                 <ws:getDocsByOrgRegionRequest>
@@ -122,132 +159,235 @@ class EISRequester:
         # Возвращаем сформированный SOAP-запрос
         return soap_request
 
-    def send_soap_request(self, soap_request: str, region_code: int, document_type: str, subsystem: str) -> str:
+    def send_soap_request(self, soap_request: str, region_code: int, document_type: str, subsystem: str,
+                          result: dict = None, token_entry: dict = None) -> str:
         """
         Отправляет SOAP-запрос к серверу и обрабатывает полученный ответ с повторными попытками подключения.
 
-        В случае разрыва соединения (например, ConnectionResetError), попытки повторяются с увеличением интервала.
+        Повторы выполняет политика `self.retry_policy`: ошибки классифицируются (разрыв соединения, таймаут,
+        5xx, SOAP Fault), задержка растёт экспоненциально со случайным разбросом и измеряется в секундах.
+        После серии ошибок автомат временно отключает только регион запроса.
+
+        :param result: Необязательный словарь, в который записываются итоги запроса
+                       (количество архивов, скачанных и нескачанных файлов, ошибка, признак отложенного запроса).
+        :param token_entry: Запись токена из пула, которым подписан запрос. По завершении запроса
+                            токен возвращается в пул с результатом. Если не передана, берётся из пула.
         """
+        if result is None:
+            result = {}
+        if token_entry is None:
+            token_entry = self.token_pool.acquire()
+
         # Заголовки для отправки запроса
         headers = {
             "Content-Type": "text/xml",  # Устанавливаем тип контента как XML
-            "Authorization": f"Bearer {self.token}"  # Токен авторизации в заголовках
+            "Authorization": f"Bearer {token_entry['token']}"  # Токен авторизации в заголовках
         }
 
-        max_retries = 6  # Максимальное количество попыток
-        backoff_times = [5, 10, 15, 20, 25, 30]  # Время ожидания для каждой повторной попытки в минутах
-        retry_count = 0
-
-        while retry_count < max_retries:
-            logger.info(f"Попытка отправки запроса ({retry_count + 1}/{max_retries})...")
-            try:
+        def post_soap_request():
+            # Адаптивный ограничитель держит число одновременных запросов к ЕИС в безопасных пределах
+            with self.limiter.slot():
                 # Отправка POST-запроса с SOAP-данными
-                response = requests.post(self.url, data=soap_request.encode("utf-8"), headers=headers, verify=False)
+                response = self.http_pool.post(self.get_service_url(token_entry["port"]),
+                                               data=soap_request.encode("utf-8"), headers=headers, verify=False)
+                raise_for_soap_fault(response)  # SOAP Fault приходит и с кодом 500, проверяем его первым
                 response.raise_for_status()  # Проверяем, что запрос завершился успешно
-                logger.info(f"Ответ от сервера получен.")  # Логируем успешный ответ
-
-                # Парсим XML-ответ и извлекаем ссылки на архивы
-                archive_urls = self.xml_parser.extract_archive_urls(response.text)
-                if archive_urls:
-                    # Логируем, если найдены ссылки на архивы, и начинаем их загрузку
-                    logger.info(f"Найдено {len(archive_urls)} ссылок на архивы. Начинаем загрузку...")
-                    self.file_downloader.download_files(archive_urls, subsystem, region_code)  # Загружаем файлы
-                    logger.debug(f"Download if {subsystem}")
-                else:
-                    # Логируем, если ссылки на архивы не найдены
-                    logger.warning(f"Ссылки на архивы не найдены. Ответ сервера: {response.text}")
-
-                return response.text  # Возвращаем текст ответа от сервера
-
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Ошибка при выполнении SOAP-запроса: {e}")
-                if "Connection aborted" in str(e) or "ConnectionResetError" in str(e):
-                    # Если это ошибка подключения, то ожидаем перед следующей попыткой
-                    if retry_count < max_retries - 1:
-                        wait_time = backoff_times[retry_count]
-                        logger.info(f"Ошибка подключения. Попробуем снова через {wait_time} минут...")
-                        time.sleep(wait_time * 60)  # Ожидание в минутах
-                        retry_count += 1
-                    else:
-                        logger.error("Не удалось подключиться после нескольких попыток.")
-                        return None  # После исчерпания всех попыток возвращаем None
-                else:
-                    # Для других ошибок, если они не связаны с подключением
-                    logger.error("Ошибка, не связанная с подключением. Прерываем попытки.")
-                    return None  # Прерываем выполнение, если ошибка не связана с соединением
+            return response
+
+        try:
+            response = self.retry_policy.call(
+                post_soap_request,
+                key=f"region:{region_code}",
+                description=f"SOAP {region_code}/{subsystem}/{document_type}",
+            )
+        except CircuitOpenError as e:
+            self.token_pool.release(token_entry)
+            logger.warning(f"Запрос ({region_code}, {subsystem}, {document_type}) отложен: {e}")
+            result["error"] = str(e)
+            result["deferred"] = True
+            return None
+        except requests.exceptions.RequestException as e:
+            # Ошибки авторизации (401/403, SOAP Fault об ошибке токена) учитываются пулом и выводят сбойный
+            # токен из ротации
+            self.token_pool.release(token_entry, classify_error(e))
+            logger.error(f"Ошибка при выполнении SOAP-запроса: {e}")
+            result["error"] = str(e)
+            return None
+        except Exception as e:
+            self.token_pool.release(token_entry, classify_error(e))
+            raise
+
+        self.token_pool.release(token_entry)
+
+        logger.info(f"Ответ от сервера получен.")  # Логируем успешный ответ
+
+        # Парсим XML-ответ и извлекаем ссылки на архивы
+        archive_urls = self.xml_parser.extract_archive_urls(response.text)
+        if archive_urls:
+            # Логируем, если найдены ссылки на архивы, и начинаем их загрузку
+            logger.info(f"Найдено {len(archive_urls)} ссылок на архивы. Начинаем загрузку...")
+            result["archives"] = len(archive_urls)
+            self.file_downloader.download_files(archive_urls, subsystem, region_code, result)  # Загружаем файлы
+            logger.debug(f"Download if {subsystem}")
+        else:
+            # Логируем, если ссылки на архивы не найдены
+            logger.warning(f"Ссылки на архивы не найдены. Ответ сервера: {response.text}")
+
+        return response.text  # Возвращаем текст ответа от сервера
+
+    def _collect_request_tasks(self):
+        """
+        Формирует список задач на дату запроса по плану `self.planner`.
+
+        :return: Список кортежей (region_code, subsystem, document_type).
+        """
+        plan = self.planner.build_plan([self.date])
+        self.planner.log_plan(plan)
+        return [(region_code, subsystem, document_type) for _, region_code, subsystem, document_type in plan]
+
+    def dry_run(self):
+        """
+        Строит и выводит план запросов без их отправки.
+
+        :return: Список кортежей (region_code, subsystem, document_type).
+        """
+        return self._collect_request_tasks()
+
+    def execute_request(self, region_code, subsystem: str, document_type: str) -> dict:
+        """
+        Формирует и отправляет один SOAP-запрос, собирая итоги по ключу (регион, подсистема, тип документа).
+
+        :param region_code: Код региона для запроса.
+        :param subsystem: Подсистема (например, PRIZ или RI223).
+        :param document_type: Тип документа.
+        :return: Словарь с итогами запроса: status, archives, downloaded, failed, error, elapsed.
+        """
+        result = {"status": "error", "archives": 0, "downloaded": 0, "failed": 0, "error": None, "elapsed": 0.0,
+                  "deferred": False}
+        started = time.monotonic()
+
+        try:
+            # Токен выбирается пулом с учётом лимита запросов в минуту на токен
+            token_entry = self.token_pool.acquire()
+            soap_request = self.generate_soap_request(region_code, subsystem, document_type, token_entry["token"])
+            if not soap_request:
+                self.token_pool.release(token_entry)
+                result["error"] = "Не удалось сформировать запрос"
+                logger.error(f"Не удалось сформировать запрос для {subsystem} ({document_type}).")
+                return result
+
+            logger.info(f"Запрос для {subsystem} ({document_type}) успешно сформирован ({token_entry['name']}).")
+            response_text = self.send_soap_request(soap_request, region_code, document_type, subsystem, result,
+                                                   token_entry)
+            if response_text is None and not result["error"]:
+                result["error"] = "Ответ от сервера не получен"
+
+        except Exception as e:
+            # Ошибка одной задачи не должна останавливать остальные
+            logger.error(f"Ошибка при обработке запроса ({region_code}, {subsystem}, {document_type}): {e}")
+            result["error"] = str(e)
+
+        finally:
+            result["elapsed"] = round(time.monotonic() - started, 2)
+
+        if not result["error"]:
+            result["status"] = "ok" if result["archives"] else "empty"
+            self.planner.record_result(self.date, region_code, subsystem, document_type, result["archives"])
+
+        return result
 
     def process_requests(self):
         """
         Обрабатывает все запросы по всем регионам, подсистемам и типам документов.
 
-        Перебирает регионы, подсистемы и типы документов для 44-ФЗ и 223-ФЗ, генерирует и отправляет SOAP-запросы.
-        В случае ошибок при формировании запросов или отправке они логируются.
+        План (регион, подсистема, тип документа) строит `self.planner`: без повторов и с учётом истории пустых
+        ответов. По каждой ячейке генерируется и отправляется SOAP-запрос.
+        При `max_workers` больше 1 запросы выполняются параллельно в пуле потоков; фактическое число
+        одновременных запросов к ЕИС дополнительно ограничивает адаптивный ограничитель `self.limiter`.
+        Итоги сохраняются в `self.results` по ключу (регион, подсистема, тип документа).
+
+        :return: Словарь с итогами по каждому запросу.
         """
+        self.results = {}
+
         try:
-            # Перебираем регионы
-            for region_code in self.regions:
-                logger.info(f"Начинаем обработку региона {region_code}")  # Логируем начало обработки региона
-                # Перебираем подсистемы для 44ФЗ
-                for subsystem in self.subsystems_44:
-                    if subsystem == "PRIZ":
-                        # Перебираем документы для PRIZ
-                        for document_type in self.documentType44_PRIZ:
-                            soap_request = self.generate_soap_request(region_code, subsystem, document_type)
-                            if soap_request:
-                                logger.info(
-                                    f"Запрос для PRIZ ({document_type}) успешно сформирован.")  # Логируем успешное формирование запроса
-                                # Передаем запрос в send_soap_request с необходимыми параметрами
-                                self.send_soap_request(soap_request, region_code, document_type, subsystem)
-                            else:
-                                logger.error(
-                                    f"Не удалось сформировать запрос для PRIZ ({document_type}).")  # Логируем ошибку при формировании запроса
-
-                    elif subsystem == "RGK":
-                        # Перебираем документы для RGK
-                        for document_type in self.documentType44_RGK:
-                            soap_request = self.generate_soap_request(region_code, subsystem, document_type)
-                            if soap_request:
-                                logger.info(
-                                    f"Запрос для RGK ({document_type}) успешно сформирован.")  # Логируем успешное формирование запроса
-                                # Передаем запрос в send_soap_request с необходимыми параметрами
-                                self.send_soap_request(soap_request, region_code, document_type, subsystem)
-                            else:
-                                logger.error(
-                                    f"Не удалось сформировать запрос для RGK ({document_type}).")  # Логируем ошибку при формировании запроса
-
-                    # Перебираем подсистемы для 223ФЗ
-                    for subsystem in self.subsystems_223:
-                        if subsystem == "RI223":
-                            # Перебираем документы для RI223
-                            for document_type in self.documentType223_RI223:
-                                soap_request = self.generate_soap_request(region_code, subsystem, document_type)
-                                if soap_request:
-                                    logger.info(
-                                        f"Запрос для RI223 ({document_type}) успешно сформирован.")  # Логируем успешное формирование запроса
-                                    # Передаем запрос в send_soap_request с необходимыми параметрами
-                                    self.send_soap_request(soap_request, region_code, document_type, subsystem)
-                                else:
-                                    logger.error(
-                                        f"Не удалось сформировать запрос для RI223 ({document_type}).")  # Логируем ошибку при формировании запроса
-
-                        elif subsystem == "RD223":
-                            # Перебираем документы для RD223
-                            for document_type in self.documentType223_RD223:
-                                soap_request = self.generate_soap_request(region_code, subsystem, document_type)
-                                if soap_request:
-                                    logger.info(
-                                        f"Запрос для RD223 ({document_type}) успешно сформирован.")  # Логируем успешное формирование запроса
-                                    # Передаем запрос в send_soap_request с необходимыми параметрами
-                                    self.send_soap_request(soap_request, region_code, document_type, subsystem)
-                                else:
-                                    logger.error(
-                                        f"Не удалось сформировать запрос для RD223 ({document_type}).")  # Логируем ошибку при формировании запроса
+            tasks = self._collect_request_tasks()
+            logger.info(f"Потоков для запросов: {self.max_workers}")
+            self._run_tasks(tasks)
+
+            # Запросы по регионам с разомкнутым автоматом повторяем один раз после паузы
+            deferred = [task for task, result in self.results.items() if result["deferred"]]
+            if deferred:
+                wait_time = max(self.retry_policy.breaker.remaining(f"region:{task[0]}") for task in deferred)
+                logger.info(f"Отложено запросов: {len(deferred)}, повтор через {wait_time:.0f} с")
+                time.sleep(wait_time)
+                self._run_tasks(deferred)
 
         except Exception as e:
             logger.error(f"Ошибка при обработке запросов: {e}")  # Логируем ошибку при обработке запросов
 
+        # Дожидаемся записи в БД документов, разобранных конвейером
+        self.file_downloader.ingest_pipeline.flush()
+
+        self.planner.save_history()
+        self._log_results_summary()
+        return self.results
+
+    def _run_tasks(self, tasks):
+        """
+        Выполняет задачи последовательно или в пуле потоков и сохраняет итоги в `self.results`.
+
+        :param tasks: Список кортежей (region_code, subsystem, document_type).
+        """
+        if self.max_workers <= 1:
+            for task in tasks:
+                self.results[task] = self.execute_request(*task)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eis") as executor:
+            futures = {
+                executor.submit(self.execute_request, *task): task
+                for task in tasks
+            }
+            for future in as_completed(futures):
+                self.results[futures[future]] = future.result()
+
+    def _log_results_summary(self):
+        """
+        Логирует сводку по результатам запросов и перечисляет задачи, завершившиеся ошибкой.
+        """
+        statuses = {}
+        for result in self.results.values():
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+        logger.info(f"Итоги запросов за {self.date}: {statuses}")
+        self.http_pool.log_stats()
+        self.retry_policy.log_stats()
+        self.file_downloader.retry_policy.log_stats()
+        self.limiter.log_stats()
+        self.file_downloader.limiter.log_stats()
+        self.token_pool.log_stats()
+        self.file_downloader.archive_cache.log_stats()
+        self.file_downloader.archive_cache.save()
+        self.file_downloader.ingest_pipeline.log_stats()
+        get_version_index().log_stats()
+        get_version_index().save()
+        get_reference_cache().log_stats()
+        log_commit_stats()
+
+        for (region_code, subsystem, document_type), result in self.results.items():
+            if result["status"] == "error" or result["failed"]:
+                logger.warning(
+                    f"Регион {region_code}, {subsystem} ({document_type}): {result['error'] or ''} "
+                    f"архивов {result['archives']}, не скачано {result['failed']}, {result['elapsed']} с")
+
 
 # Тестирование
 if __name__ == "__main__":
+    import sys
+
     eis_requester = EISRequester(config_path="config.ini")
-    eis_requester.process_requests()
+    if "--dry-run" in sys.argv:
+        eis_requester.dry_run()  # Только выводим план запросов
+    else:
+        eis_requester.process_requests()
@@ -1,12 +1,20 @@
 import os
+import shutil
 import uuid
 import requests
 from urllib.parse import urlparse
 from loguru import logger
-from secondary_functions import load_config, load_token
+from secondary_functions import load_config
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from archive_extractor import ArchiveExtractor
+from http_session_pool import get_http_pool
+from retry_policy import get_retry_policy, CircuitOpenError
+from adaptive_limiter import get_limiter
+from token_pool import get_token_pool
+from archive_cache import get_archive_cache
+from ingest_pipeline import get_ingest_pipeline
 from parsing_xml.okpd_parser import process_okpd_files  # Импортируем функцию для проверки ОКПД
 from file_delete.file_deleter import FileDeleter  # Импортируем класс FileDeleter
 
@@ -14,7 +22,7 @@ from file_delete.file_deleter import FileDeleter  # Импортируем кл
 class FileDownloader:
     def __init__(self, config_path="config.ini"):
         """
-        Инициализирует объект для скачивания файлов, загружает конфигурацию и токен.
+        Инициализирует объект для скачивания файлов, загружает конфигурацию и пул токенов.
 
         :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
         :raises ValueError: Если конфигурация или токен не могут быть загружены.
@@ -25,23 +33,47 @@ class FileDownloader:
         if not self.config:
             raise ValueError("Ошибка загрузки конфигурации!")
 
-        # Загружаем токен
-        self.token = load_token(self.config)
-        if not self.token:
-            raise ValueError("Токен не найден! Проверьте .env файл.")
+        # Пул токенов (общий с SOAP-запросами), каждый архив скачивается с токеном, выбранным пулом
+        self.token_pool = get_token_pool(config_path)
 
         # Создаем объект для разархивации
         self.archive_extractor = ArchiveExtractor(config_path)
 
+        # Общий пул HTTP-соединений (тот же, что и для SOAP-запросов)
+        self.http_pool = get_http_pool(config_path)
+
+        # Политика повторов для скачивания архивов (автомат отключает отдельный хост)
+        self.retry_policy = get_retry_policy("download", config_path)
+
+        # Адаптивный (AIMD) ограничитель параллельных загрузок архивов
+        self.limiter = get_limiter("download", config_path)
+
+        # Кэш скачанных архивов (повторный запуск не скачивает архивы заново)
+        self.archive_cache = get_archive_cache(config_path)
+
+        # Конвейер обработки (разбор в пуле процессов, запись в БД отдельными потоками) при [ingest] mode = pipeline
+        self.ingest_pipeline = get_ingest_pipeline(config_path)
+
+        # Количество параллельных загрузок, размер блока записи и шаг логирования прогресса
+        self.max_workers = max(1, self.config.getint("download", "max_workers", fallback=1))
+        self.chunk_size = self.config.getint("download", "chunk_size_kb", fallback=256) * 1024
+        self.progress_step = self.config.getint("download", "progress_step_mb", fallback=5) * 1048576
+
         # Логируем успешную загрузку конфигурации и токена
         logger.info("Конфигурация и токен загружены успешно.")
 
-    def download_files(self, urls, subsystem, region_code):
+    def download_files(self, urls, subsystem, region_code, result=None):
         """
         Скачивает файлы по переданному списку URL и сохраняет их в нужную папку в зависимости от типа документа.
+
+        Архивы скачиваются параллельно (не более `max_workers` одновременно) во временные файлы `.part`,
+        каждый готовый архив сразу передаётся в обработку. XML-файлы читаются прямо из архива или распаковываются
+        в отдельный рабочий каталог архива, поэтому параллельные загрузки не обрабатывают чужие архивы.
+
         :param urls: Список URL для скачивания файлов.
         :param subsystem: Тип документа, который используется для определения пути сохранения файлов.
         :param region_code: Код региона из SOAP-запроса.
+        :param result: Необязательный словарь, в котором увеличиваются счётчики `downloaded`, `failed` и `bytes`.
         :return: Путь, куда были сохранены архивы.
         :raises: Записывает ошибки в лог при проблемах с скачиванием.
         """
@@ -69,48 +101,220 @@ class FileDownloader:
         # Создаём FileDeleter с уже известным save_path
         file_deleter = FileDeleter(save_path)
 
-        # Перебираем все URL в списке
-        for url in urls:
-            try:
-                # Разбираем URL для получения имени файла
-                parsed_url = urlparse(url)
-                filename = os.path.basename(parsed_url.path) or f"file_{uuid.uuid4().hex[:8]}.zip"
-                file_path = os.path.join(save_path, filename)
+        if result is None:
+            result = {}
+        for counter in ("downloaded", "failed", "bytes"):
+            result.setdefault(counter, 0)
+
+        started = time.monotonic()
+        workers = min(self.max_workers, len(urls))
+
+        if workers <= 1:
+            outcomes = [self._download_and_process(url, save_path, region_code, file_deleter) for url in urls]
+        else:
+            # Архивы скачиваются параллельно, каждый готовый архив сразу передаётся в обработку
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as executor:
+                futures = [
+                    executor.submit(self._download_and_process, url, save_path, region_code, file_deleter)
+                    for url in urls
+                ]
+                outcomes = [future.result() for future in as_completed(futures)]
+
+        for downloaded_bytes in outcomes:
+            if downloaded_bytes is None:
+                result["failed"] += 1
+            else:
+                result["downloaded"] += 1
+                result["bytes"] += downloaded_bytes
 
-                logger.info(f"Скачивание {url} в {file_path}...")
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Скачано архивов {result['downloaded']} из {len(urls)} ({subsystem}, регион {region_code}): "
+            f"{self._format_throughput(result['bytes'], elapsed)}")
 
-                # Устанавливаем заголовки для запроса
-                headers = {'individualPerson_token': self.token}
+        # Возвращаем путь, в который были сохранены архивы
+        return save_path
+
+    def _download_and_process(self, url, save_path, region_code, file_deleter):
+        """
+        Скачивает один архив и передаёт его в обработку.
+
+        :param url: URL архива.
+        :param save_path: Папка сохранения архивов.
+        :param region_code: Код региона из SOAP-запроса.
+        :param file_deleter: Объект для удаления файлов в папке сохранения.
+        :return: Количество скачанных байт или None при ошибке скачивания или обработки архива.
+        """
+        try:
+            # Разбираем URL для получения имени файла
+            parsed_url = urlparse(url)
+            filename = os.path.basename(parsed_url.path) or f"file_{uuid.uuid4().hex[:8]}.zip"
+            file_path = os.path.join(save_path, filename)
 
-                # Отправляем GET-запрос для скачивания файла
-                response = requests.get(url, stream=True, headers=headers, timeout=120)
-                response.raise_for_status()  # Проверка на успешность запроса
+            def download():
+                with self.limiter.slot(), self.token_pool.use() as token_entry:
+                    return self._download_archive(url, file_path, token_entry["token"])
 
-                # Записываем скачанный файл на диск
-                with open(file_path, "wb") as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
+            downloaded_bytes = self.retry_policy.call(
+                download,
+                key=f"host:{parsed_url.netloc}",
+                description=f"Скачивание {filename}",
+            )
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            logger.error(f"Ошибка при скачивании {url}: {e}")
+            file_deleter.delete_single_file(f"{file_path}.part")
+            return None
+
+        try:
+            self._process_archive(file_path, save_path, region_code, file_deleter)
+        except Exception:
+            # Ошибка обработки (БД, пул соединений, повреждённый архив) не прерывает обработку остальных архивов
+            logger.exception(f"Ошибка при обработке архива {filename}")
+            return None
+        return downloaded_bytes
 
-                logger.info(f"Файл сохранен: {file_path}")
+    def _download_archive(self, url, file_path, token):
+        """
+        Скачивает архив потоково, по частям записывая его во временный файл `.part`.
 
-                # После скачивания сразу разархивируем файл
-                self.archive_extractor.unzip_files(save_path)
+        Если архив есть в кэше, он берётся оттуда (при наличии ETag/Last-Modified — после условного запроса,
+        на который сервер отвечает 304). Недокачанная ранее передача продолжается запросом Range.
+        Скачанный архив проверяется на целостность и сохраняется в кэш, а в `<file_path>.part`
+        кладётся ссылка на него.
 
-                time.sleep(5)  # 1 секунда задержки (можно настроить по необходимости)
+        Прогресс логируется каждые `progress_step_mb` мегабайт, по завершении — скорость скачивания.
 
-                # Удаляем файл после обработки
-                file_deleter.delete_single_file(file_path)
-                # logger.info(f'Файл {file_path} удален')
+        :param url: URL архива.
+        :param file_path: Итоговый путь к архиву (данные пишутся в `<file_path>.part`).
+        :param token: Токен доступа, выданный пулом токенов.
+        :return: Количество скачанных байт (0, если архив взят из кэша).
+        :raises requests.exceptions.RequestException: При ошибке скачивания или повреждённом архиве.
+        """
+        part_path = f"{file_path}.part"
 
-                # Путь к разархивированным файлам
-                extracted_folder_path = save_path  # Папка с разархивированными файлами
+        cached = self.archive_cache.lookup(url)
+        if cached and self.archive_cache.is_fresh_without_request(cached):
+            self.archive_cache.record_hit(cached)
+            self.archive_cache.link_or_copy(cached["path"], part_path)
+            logger.info(f"Архив {os.path.basename(file_path)} взят из кэша.")
+            return 0
 
-                # Проверяем файлы на ОКПД и удаляем, если они не в базе
-                okpd_results = process_okpd_files(extracted_folder_path, region_code)
-                logger.info(f"Обработка файлов в папке {extracted_folder_path} завершена.")
+        logger.info(f"Скачивание {url} в {file_path}...")
 
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Ошибка при скачивании {url}: {e}")
+        # Устанавливаем заголовки для запроса
+        headers = {'individualPerson_token': token}
 
-        # Возвращаем путь, в который были сохранены архивы
-        return save_path
\ No newline at end of file
+        offset = 0
+        if cached:
+            headers.update(self.archive_cache.conditional_headers(cached))
+        else:
+            resume_headers, offset = self.archive_cache.resume_headers(url)
+            headers.update(resume_headers)
+
+        # При включённом кэше данные пишутся в его папку недокачанных передач, чтобы их можно было продолжить
+        download_path = self.archive_cache.partial_path(url) if self.archive_cache.enabled else part_path
+
+        started = time.monotonic()
+
+        # Отправляем GET-запрос для скачивания файла
+        with self.http_pool.get(url, stream=True, headers=headers) as response:
+            if response.status_code == 304 and cached:
+                self.archive_cache.record_hit(cached, revalidated=True)
+                self.archive_cache.link_or_copy(cached["path"], part_path)
+                logger.info(f"Архив {os.path.basename(file_path)} не изменился, взят из кэша.")
+                return 0
+
+            if response.status_code == 416:
+                # Недокачанная передача не совпадает с архивом на сервере, при следующей попытке скачаем заново
+                self.archive_cache.discard_partial(url)
+            response.raise_for_status()  # Проверка на успешность запроса
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.status_code != 206:
+                # Сервер не поддерживает Range или архив изменился — скачиваем заново
+                offset = 0
+                self.archive_cache.save_partial_meta(url, etag, last_modified)
+            else:
+                logger.info(f"Продолжение скачивания {os.path.basename(file_path)} с {offset / 1048576:.1f} МБ")
+
+            total_bytes = offset + int(response.headers.get("Content-Length") or 0)
+            downloaded_bytes = 0
+            next_progress = offset + self.progress_step
+
+            # Записываем скачанный файл на диск во временный файл
+            with open(download_path, "ab" if offset else "wb") as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+                    downloaded_bytes += len(chunk)
+
+                    if offset + downloaded_bytes >= next_progress:
+                        next_progress += self.progress_step
+                        progress = f" ({(offset + downloaded_bytes) / total_bytes:.0%})" if total_bytes else ""
+                        logger.debug(f"{os.path.basename(file_path)}: "
+                                     f"{(offset + downloaded_bytes) / 1048576:.1f} МБ{progress}")
+
+        if self.archive_cache.enabled:
+            self.archive_cache.record_miss(offset)
+            # Проверяем целостность архива и сохраняем его в кэш
+            cached_path = self.archive_cache.store(url, download_path, etag, last_modified)
+            self.archive_cache.link_or_copy(cached_path, part_path)
+
+        logger.info(
+            f"Файл скачан: {os.path.basename(file_path)}, "
+            f"{self._format_throughput(downloaded_bytes, time.monotonic() - started)}")
+        return downloaded_bytes
+
+    def _process_archive(self, file_path, save_path, region_code, file_deleter):
+        """
+        Разархивирует скачанный архив и запускает проверку ОКПД и парсинг файлов.
+
+        В режиме `extract_mode = memory` XML-файлы читаются прямо из архива и на диск не распаковываются.
+        В режиме `disk` архив распаковывается в собственный рабочий каталог, обрабатываются только его файлы,
+        после чего каталог удаляется целиком. Общая папка сохранения не используется, поэтому архивы
+        можно обрабатывать параллельно.
+        При `[ingest] mode = pipeline` архив разбирается в пуле процессов конвейера, а запись в БД выполняется
+        его потоками записи; архив удаляется сразу после разбора.
+
+        :param file_path: Путь к архиву (скачанные данные лежат в `<file_path>.part`).
+        :param save_path: Папка сохранения архивов.
+        :param region_code: Код региона из SOAP-запроса.
+        :param file_deleter: Объект для удаления файлов в папке сохранения.
+        """
+        archive_path = f"{file_path}.part"
+        try:
+            if self.ingest_pipeline.enabled:
+                self.ingest_pipeline.process_archive(archive_path, save_path, region_code)
+                logger.info(f"Архив {os.path.basename(file_path)} разобран, документы переданы на запись.")
+                return
+
+            if self.archive_extractor.extract_mode == "memory":
+                process_okpd_files(save_path, region_code, archive_path=archive_path)
+                logger.info(f"Обработка архива {os.path.basename(file_path)} завершена.")
+                return
+
+            # Каждый архив распаковывается в собственный рабочий каталог, который удаляется целиком
+            work_dir = self.archive_extractor.create_work_dir(file_path)
+            try:
+                if self.archive_extractor.extract_archive(archive_path, work_dir):
+                    # Проверяем файлы на ОКПД и удаляем, если они не в базе
+                    process_okpd_files(save_path, region_code, work_dir=work_dir)
+                    logger.info(f"Обработка файлов архива {os.path.basename(file_path)} завершена.")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        finally:
+            # Удаляем файл после обработки
+            file_deleter.delete_single_file(archive_path)
+
+    @staticmethod
+    def _format_throughput(size_bytes, elapsed):
+        """
+        Форматирует объём и скорость скачивания для логов.
+
+        :param size_bytes: Объём в байтах.
+        :param elapsed: Время в секундах.
+        :return: Строка вида "12.3 МБ за 4.5 с (2.7 МБ/с)".
+        """
+        megabytes = size_bytes / 1048576
+        speed = megabytes / elapsed if elapsed > 0 else 0.0
+        return f"{megabytes:.1f} МБ за {elapsed:.1f} с ({speed:.2f} МБ/с)"
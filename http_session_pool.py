@@ -0,0 +1,201 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from loguru import logger
+
+from secondary_functions import load_config
+
+
+# Счётчик установленных TCP-соединений по хостам ("scheme://host:port" -> количество)
+_connects = {}
+_connects_lock = threading.Lock()
+
+
+def _count_connect(scheme, host, port):
+    """
+    Увеличивает счётчик установленных соединений для хоста.
+    """
+    key = f"{scheme}://{host}:{port}"
+    with _connects_lock:
+        _connects[key] = _connects.get(key, 0) + 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        super().connect()
+        _count_connect("http", self.host, self.port)
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        super().connect()
+        _count_connect("https", self.host, self.port)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """
+    Адаптер, пулы которого считают фактические TCP-подключения (включая переподключения
+    после закрытия соединения сервером).
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+class HTTPSessionPool:
+    """
+    Общий пул HTTP-соединений для SOAP-запросов и скачивания архивов.
+
+    Все запросы проходят через один `requests.Session` с пулом keep-alive соединений,
+    поэтому TCP-соединение через локальный stunnel (и TLS-рукопожатие ГОСТ за ним)
+    переиспользуется между запросами, а не открывается заново на каждый вызов.
+
+    Атрибуты:
+        session (requests.Session): Сессия с подключенными адаптерами пула.
+        timeout (tuple): Таймауты по умолчанию (connect, read) в секундах.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        Инициализирует сессию и адаптеры пула из секции `[http]` конфигурации.
+
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        # Количество хостов, для которых держатся отдельные пулы, и размер пула на хост
+        self.pool_connections = self.config.getint("http", "pool_connections", fallback=4)
+        self.pool_maxsize = self.config.getint("http", "pool_maxsize", fallback=16)
+        self.keep_alive = self.config.getboolean("http", "keep_alive", fallback=True)
+
+        # Таймауты по умолчанию для каждого запроса
+        self.timeout = (
+            self.config.getfloat("http", "connect_timeout", fallback=10),
+            self.config.getfloat("http", "read_timeout", fallback=120),
+        )
+
+        self.session = requests.Session()
+        self.adapter = _CountingHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0,  # Повторные попытки выполняются вызывающим кодом
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers["Connection"] = "keep-alive" if self.keep_alive else "close"
+
+        logger.info(
+            f"Пул HTTP-соединений создан: хостов {self.pool_connections}, соединений на хост {self.pool_maxsize}, "
+            f"keep-alive {self.keep_alive}, таймауты {self.timeout}")
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Выполняет HTTP-запрос через общую сессию.
+
+        :param method: HTTP-метод ("GET", "POST" и т.д.).
+        :param url: Адрес запроса.
+        :param timeout: Таймаут (connect, read) или число; по умолчанию берётся из конфигурации.
+        :param kwargs: Остальные параметры `requests.Session.request`.
+        :return: Объект requests.Response.
+        """
+        return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+
+    def get(self, url, **kwargs):
+        """
+        Выполняет GET-запрос через общую сессию.
+
+        :param url: Адрес запроса.
+        :return: Объект requests.Response.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        Выполняет POST-запрос через общую сессию.
+
+        :param url: Адрес запроса.
+        :return: Объект requests.Response.
+        """
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self):
+        """
+        Собирает статистику переиспользования соединений по хостам.
+
+        :return: Словарь с общим числом запросов, открытых соединений, долей переиспользования
+                 и разбивкой по хостам.
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {"requests": pool.num_requests, "connections": 0}
+
+        with _connects_lock:
+            for host, count in _connects.items():
+                hosts.setdefault(host, {"requests": 0, "connections": 0})["connections"] = count
+
+        total_requests = sum(host["requests"] for host in hosts.values())
+        total_connections = sum(host["connections"] for host in hosts.values())
+        reuse_ratio = 1 - total_connections / total_requests if total_requests else 0.0
+
+        return {
+            "requests": total_requests,
+            "connections": total_connections,
+            "reuse_ratio": round(reuse_ratio, 3),
+            "hosts": hosts,
+        }
+
+    def log_stats(self):
+        """
+        Логирует статистику переиспользования соединений.
+        """
+        stats = self.get_stats()
+        logger.info(
+            f"HTTP: запросов {stats['requests']}, новых соединений {stats['connections']}, "
+            f"доля переиспользования {stats['reuse_ratio']:.1%}")
+        for host, host_stats in stats["hosts"].items():
+            logger.debug(f"HTTP {host}: {host_stats}")
+
+    def close(self):
+        """
+        Закрывает сессию и все соединения пула.
+        """
+        self.session.close()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_http_pool(config_path="config.ini"):
+    """
+    Возвращает общий для процесса пул HTTP-соединений, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр HTTPSessionPool.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPSessionPool(config_path)
+        return _shared_pool
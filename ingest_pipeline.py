@@ -0,0 +1,320 @@
+import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+
+from secondary_functions import load_config
+from archive_extractor import ArchiveExtractor
+from runtime import get_runtime
+from parsing_xml.okpd_parser import process_okpd_file, process_contract_file, CONTRACT_NUMBER_PATH
+from parsing_xml.xml_parser_recouped_contract import EXECUTION_END_DATE_PATH
+from parsing_xml.xml_document import XMLDocument
+from parsing_xml.document_snapshot import DocumentSnapshot
+from parsing_xml.field_extractor import get_field_extractor
+from parsing_xml.tag_specs import get_tag_spec
+
+
+# Состояние процесса пула разбора (заполняется в _init_worker)
+_worker = {}
+
+
+def _init_worker(config_path):
+    """
+    Инициализирует процесс пула разбора: настройки чтения архивов и порог потокового режима.
+    """
+    config = load_config(config_path)
+    _worker["archive_extractor"] = ArchiveExtractor(config_path)
+    _worker["stream_threshold"] = config.getint("xml", "stream_threshold_mb", fallback=8) * 1048576
+
+
+def parse_archive(archive_path, folder_path, kind, tags_file, extra_paths=(), start=0, count=None):
+    """
+    Читает XML-файлы архива и извлекает из них значения. Выполняется в процессе пула разбора и не обращается к БД.
+
+    :param archive_path: Путь к ZIP-архиву.
+    :param folder_path: Папка типа документов (используется в условных путях файлов).
+    :param kind: "notice" — извещения (с фильтром ОКПД), "contract" — контракты.
+    :param tags_file: Путь к JSON-файлу тегов типа документов.
+    :param extra_paths: Дополнительные скомпилированные пути, которые нужно извлечь.
+    :param start: Номер первого XML-файла архива, с которого начинается часть.
+    :param count: Число XML-файлов в части (None — до конца архива).
+    :return: Кортеж (список DocumentSnapshot, время работы в секундах). Ошибка чтения или разбора документа
+             сохраняется в его снимке (см. DocumentSnapshot.capture) и не прерывает разбор остальных.
+    :raises zipfile.BadZipFile: Если архив повреждён.
+    """
+    started = time.perf_counter()
+    extractor = get_field_extractor(tags_file, extra_paths)
+    links_documentation_tags = get_tag_spec(tags_file).get("links_documentation")
+
+    snapshots = []
+    stop = start + count if count else None
+    for file_name, member in _worker["archive_extractor"].iter_xml_members(archive_path, start, stop):
+        file_path = os.path.join(folder_path, file_name)
+        try:
+            document = XMLDocument.load(file_path, member, _worker["stream_threshold"])
+        except Exception as e:
+            snapshots.append(DocumentSnapshot.failed(file_path, e))
+            continue
+        snapshots.append(DocumentSnapshot.capture(
+            document, extractor, links_documentation_tags, prefilter=kind == "notice"))
+
+    return snapshots, time.perf_counter() - started
+
+
+class IngestPipeline:
+    """
+    Конвейер обработки скачанных архивов: разбор в пуле процессов и запись в БД отдельными потоками.
+
+    Чтение архивов, фильтр ОКПД, разбор XML и извлечение полей выполняются в процессах `parse_workers`
+    (не ограничены GIL) и возвращают снимки документов (DocumentSnapshot) — простые данные без обращения к БД —
+    частями по `chunk_size` документов, поэтому ни процесс разбора, ни основной процесс не держат в памяти
+    снимки всего архива.
+    Снимки передаются через ограниченную очередь `queue_size` потокам записи (`writers`), у каждого из которых
+    собственные соединения с БД; поток записи обрабатывает снимок теми же функциями, что и обычный режим
+    (process_okpd_file, process_contract_file). Число частей в разборе ограничено удвоенным числом процессов,
+    поэтому при отставании записи скачивание приостанавливается, а не накапливает данные в памяти.
+
+    Параметры читаются из секции `[ingest]`; при `mode = inline` конвейер не используется.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.enabled = self.config.get("ingest", "mode", fallback="inline") == "pipeline"
+        # 0 — по числу ядер
+        self.parse_workers = self.config.getint("ingest", "parse_workers", fallback=0) or os.cpu_count() or 1
+        self.writers = max(1, self.config.getint("ingest", "writers", fallback=1))
+        self.queue_size = max(1, self.config.getint("ingest", "queue_size", fallback=64))
+        self.chunk_size = max(1, self.config.getint("ingest", "chunk_size", fallback=100))
+
+        self.xml_paths = self.config["path"]
+        self.tags_paths = self.config["tags"]
+
+        self._executor = None
+        self._writer_threads = []
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._parse_slots = threading.BoundedSemaphore(self.parse_workers * 2)
+        self._lock = threading.Lock()
+        self._started_at = None
+        self.stats = {"archives": 0, "parsed": 0, "parse_time": 0.0, "written": 0, "write_time": 0.0,
+                      "queue_wait": 0.0, "errors": 0}
+
+    def _document_kind(self, folder_path):
+        """
+        Определяет тип документов папки.
+
+        :return: Кортеж (вид, файл тегов, дополнительные пути) или None, если документы папки не обрабатываются.
+        """
+        if folder_path == self.xml_paths.get("reest_new_contract_archive_44_fz_xml"):
+            return "notice", self.tags_paths["get_tags_44_new"], ()
+        if folder_path == self.xml_paths.get("reest_new_contract_archive_223_fz_xml"):
+            return "notice", self.tags_paths["get_tags_223_new"], ()
+        if folder_path == self.xml_paths.get("recouped_contract_archive_44_fz_xml"):
+            return "contract", self.tags_paths["get_tags_44_recouped"], (CONTRACT_NUMBER_PATH, EXECUTION_END_DATE_PATH)
+        return None
+
+    def _start(self):
+        """
+        Запускает пул разбора и потоки записи при первом архиве.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._started_at = time.monotonic()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers, initializer=_init_worker, initargs=(self.config_path,))
+            for number in range(self.writers):
+                thread = threading.Thread(target=self._write_loop, name=f"db-writer-{number}", daemon=True)
+                thread.start()
+                self._writer_threads.append(thread)
+            logger.info(f"Конвейер обработки запущен: процессов разбора {self.parse_workers}, "
+                        f"потоков записи {self.writers}, очередь {self.queue_size}")
+
+    def process_archive(self, archive_path, folder_path, region_code):
+        """
+        Разбирает архив в пуле процессов и ставит снимки документов в очередь записи.
+
+        Возвращает управление, когда архив разобран (его можно удалять), не дожидаясь записи в БД.
+        Блокируется, если в разборе уже максимум частей архивов или очередь записи заполнена.
+
+        :param archive_path: Путь к ZIP-архиву.
+        :param folder_path: Папка сохранения, по которой определяется тип документов.
+        :param region_code: Код региона из SOAP-запроса.
+        """
+        document_kind = self._document_kind(folder_path)
+        if document_kind is None:
+            logger.info(f"Файлы архива {archive_path} не обрабатываются, пропускаем.")
+            return
+
+        self._start()
+        kind = document_kind[0]
+        start = 0
+        future = self._submit_chunk(archive_path, folder_path, document_kind, start)
+        while future is not None:
+            try:
+                snapshots, parse_time = future.result()
+            except zipfile.BadZipFile:
+                logger.error(f"Не удалось прочитать архив: {archive_path}")
+                return
+            except Exception as e:
+                logger.error(f"Ошибка при разборе архива {archive_path}: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+                return
+            finally:
+                self._parse_slots.release()
+
+            # Следующая часть архива разбирается, пока текущая ставится в очередь записи
+            start += len(snapshots)
+            future = None
+            if len(snapshots) == self.chunk_size:
+                future = self._submit_chunk(archive_path, folder_path, document_kind, start)
+
+            with self._lock:
+                self.stats["parsed"] += len(snapshots)
+                self.stats["parse_time"] += parse_time
+                if future is None:
+                    self.stats["archives"] += 1
+
+            started = time.monotonic()
+            for snapshot in snapshots:
+                self._queue.put((snapshot, folder_path, region_code, kind))
+            with self._lock:
+                self.stats["queue_wait"] += time.monotonic() - started
+
+    def _submit_chunk(self, archive_path, folder_path, document_kind, start):
+        """
+        Отправляет в пул разбора часть архива из chunk_size документов, начиная с документа start.
+        Блокируется, если в разборе уже максимум частей; слот освобождается после получения результата.
+        """
+        self._parse_slots.acquire()
+        try:
+            return self._executor.submit(parse_archive, archive_path, folder_path, *document_kind,
+                                         start=start, count=self.chunk_size)
+        except Exception:
+            self._parse_slots.release()
+            raise
+
+    def _write_loop(self):
+        """
+        Поток записи: применяет снимки документов к БД, беря соединение из пула на каждый документ.
+        """
+        runtime = get_runtime(self.config_path)
+        region_ids = {}
+
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+
+                snapshot, folder_path, region_code, kind = item
+                started = time.monotonic()
+                # Соединение берётся из пула на время записи документа
+                with runtime.session():
+                    db_id_fetcher = runtime.id_fetcher()
+                    if kind == "contract":
+                        process_contract_file(snapshot, db_id_fetcher, folder_path)
+                    else:
+                        if region_code not in region_ids:
+                            region_ids[region_code] = db_id_fetcher.get_region_id(region_code)
+                        if not region_ids[region_code]:
+                            logger.error(f"Не удалось получить ID региона для кода {region_code}")
+                            continue
+                        process_okpd_file(snapshot, db_id_fetcher, region_code, folder_path)
+
+                with self._lock:
+                    self.stats["written"] += 1
+                    self.stats["write_time"] += time.monotonic() - started
+            except Exception as e:
+                logger.error(f"Ошибка при записи документа в БД: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Ожидает, пока все документы из очереди будут записаны в БД.
+        """
+        if self._executor is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        Записывает оставшиеся документы, останавливает потоки записи и пул разбора.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            threads, self._writer_threads = self._writer_threads, []
+        if executor is None:
+            return
+
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+        executor.shutdown()
+
+    def get_stats(self):
+        """
+        :return: Словарь со статистикой по стадиям: архивы и документы, разобранные и записанные, суммарное время
+                 работы стадий, время ожидания очереди записи, ошибки, длина очереди и время работы конвейера.
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return dict(self.stats, queued=self._queue.qsize(), elapsed=elapsed)
+
+    def log_stats(self):
+        """
+        Логирует пропускную способность стадий конвейера.
+        """
+        if not self.enabled:
+            return
+        stats = self.get_stats()
+        elapsed = stats["elapsed"] or 1.0
+        logger.info(
+            f"Конвейер: разбор — архивов {stats['archives']}, документов {stats['parsed']} "
+            f"({stats['parsed'] / elapsed:.1f} док/с, работа процессов {stats['parse_time']:.1f} с); "
+            f"запись — документов {stats['written']} ({stats['written'] / elapsed:.1f} док/с, "
+            f"работа потоков {stats['write_time']:.1f} с); ожидание очереди записи {stats['queue_wait']:.1f} с, "
+            f"в очереди {stats['queued']}, ошибок {stats['errors']}")
+
+
+_shared_pipeline = None
+_shared_pipeline_lock = threading.Lock()
+
+
+def get_ingest_pipeline(config_path="config.ini"):
+    """
+    Возвращает общий для процесса конвейер обработки, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр IngestPipeline.
+    """
+    global _shared_pipeline
+    with _shared_pipeline_lock:
+        if _shared_pipeline is None:
+            _shared_pipeline = IngestPipeline(config_path)
+        return _shared_pipeline
+
+
+def close_ingest_pipeline():
+    """
+    Останавливает общий конвейер обработки, если он был создан.
+    """
+    with _shared_pipeline_lock:
+        pipeline = _shared_pipeline
+    if pipeline is not None:
+        pipeline.close()
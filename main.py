@@ -1,11 +1,18 @@
 import os
 import time
 import json
+import argparse
+import threading
 import configparser
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
-from stunnel_runner import StunnelRunner
+from stunnel_supervisor import StunnelSupervisor
 from eis_requester import EISRequester
+from request_planner import RequestPlanner
+from ingest_pipeline import close_ingest_pipeline
+from runtime import get_runtime, close_runtime
+from database_work.database_requests import get_region_codes
 
 # Пути к файлам
 CONFIG_PATH = "config.ini"
@@ -17,6 +24,10 @@ TODAY = datetime.today()  # Текущая дата
 # Настройка логирования в одном месте
 logger.add("errors.log", level="ERROR", rotation="1 week", compression="zip")
 
+# Блокировка файла обработанных дат при параллельной дозагрузке
+processed_dates_lock = threading.Lock()
+
+
 def load_processed_dates():
     """Загружает список уже обработанных дат из JSON-файла."""
     if os.path.exists(PROCESSED_DATES_FILE):
@@ -26,11 +37,12 @@ def load_processed_dates():
 
 def save_processed_date(date_str):
     """Сохраняет отработанную дату в JSON-файл."""
-    processed_dates = load_processed_dates()
-    processed_dates.add(date_str)
+    with processed_dates_lock:
+        processed_dates = load_processed_dates()
+        processed_dates.add(date_str)
 
-    with open(PROCESSED_DATES_FILE, "w") as file:
-        json.dump(list(processed_dates), file, indent=4)
+        with open(PROCESSED_DATES_FILE, "w") as file:
+            json.dump(sorted(processed_dates), file, indent=4)
 
 def get_current_date():
     """Читает текущую дату из config.ini, исправлена проблема с кодировкой."""
@@ -58,41 +70,133 @@ def update_config_date(new_date):
     logger.info(f"Дата в config.ini обновлена: {new_date.strftime('%Y-%m-%d')}")
 
 
-if __name__ == "__main__":
-    logger.info("Запуск программы...")
+def process_day(date_str, planner):
+    """Обрабатывает одну дату отдельным EISRequester и возвращает количество запросов по статусам."""
+    eis_requester = EISRequester(date=date_str, planner=planner)
+    results = eis_requester.process_requests()
 
-    # Запуск Stunnel
-    stunnel_runner = StunnelRunner()
-    stunnel_runner.run_stunnel()
-    logger.info("Stunnel успешно запущен.")
+    statuses = {}
+    for result in results.values():
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return statuses
 
-    processed_dates = load_processed_dates()
 
-    # Читаем начальную дату из конфигурации
-    current_date = get_current_date()
+def run_backfill(start_date, end_date, max_days):
+    """
+    Дозагружает диапазон дат, обрабатывая до max_days дней параллельно.
+    config.ini не изменяется; день без ошибочных запросов записывается в обработанные даты.
+    """
+    processed_dates = load_processed_dates()
 
-    while current_date <= TODAY:
+    dates = []
+    current_date = start_date
+    while current_date <= end_date:
         date_str = current_date.strftime("%Y-%m-%d")
-
-        # Пропускаем дату, если она уже была обработана
         if date_str in processed_dates:
             logger.info(f"Дата {date_str} уже обработана, пропускаем...")
         else:
-            logger.info(f"Обработка данных за {date_str}...")
-            eis_requester = EISRequester()
-            eis_requester.process_requests()
+            dates.append(date_str)
+        current_date += timedelta(days=1)
+
+    logger.info(f"Дозагрузка: {len(dates)} дней с {start_date:%Y-%m-%d} по {end_date:%Y-%m-%d}, "
+                f"одновременно {max_days}")
+
+    # Общий планировщик: регионы загружаются один раз, история пустых ответов общая для всех дней
+    planner = RequestPlanner(get_region_codes(), CONFIG_PATH)
+
+    day_statuses = {}
+    with ThreadPoolExecutor(max_workers=max_days, thread_name_prefix="day") as executor:
+        futures = {executor.submit(process_day, date_str, planner): date_str for date_str in dates}
+
+        for completed, future in enumerate(as_completed(futures), start=1):
+            date_str = futures[future]
+            try:
+                statuses = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка при обработке даты {date_str}: {e}")
+                statuses = {"error": 1}
+
+            day_statuses[date_str] = statuses
+            if not statuses.get("error"):
+                save_processed_date(date_str)
+
+            logger.info(f"Дата {date_str} завершена ({completed}/{len(dates)}): {statuses}")
 
-            # # Сохраняем отработанную дату
-            # save_processed_date(date_str)
+    failed_days = sorted(date_str for date_str, statuses in day_statuses.items() if statuses.get("error"))
+    logger.info(f"Дозагрузка завершена: дней {len(day_statuses)}, с ошибками {len(failed_days)} {failed_days}")
 
-        # Обновляем дату на следующий день
-        next_date = current_date + timedelta(days=1)
-        update_config_date(next_date)
 
-        # Опционально: можно добавить небольшую задержку
-        time.sleep(2)
+def parse_args():
+    """Разбирает аргументы командной строки для режима дозагрузки."""
+    parser = argparse.ArgumentParser(description="Загрузка данных ЕИС")
+    parser.add_argument("--start", help="Первая дата дозагрузки (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Последняя дата дозагрузки (YYYY-MM-DD), по умолчанию сегодня")
+    parser.add_argument("--days", type=int, default=None, help="Количество дней, обрабатываемых параллельно")
+    return parser.parse_args()
+
+
+def run(args):
+    """Запускает дозагрузку диапазона дат (--start) или обычную последовательную обработку дат."""
+    if args.start:
+        # Режим дозагрузки диапазона дат
+        config = configparser.ConfigParser()
+        with open(CONFIG_PATH, "r", encoding="utf-8") as file:
+            config.read_file(file)
+
+        max_days = args.days or config.getint("backfill", "max_days", fallback=2)
+        end_date = datetime.strptime(args.end, "%Y-%m-%d") if args.end else TODAY
+        run_backfill(datetime.strptime(args.start, "%Y-%m-%d"), end_date, max_days)
+    else:
+        processed_dates = load_processed_dates()
+
+        # Читаем начальную дату из конфигурации
+        current_date = get_current_date()
+
+        while current_date <= TODAY:
+            date_str = current_date.strftime("%Y-%m-%d")
+
+            # Пропускаем дату, если она уже была обработана
+            if date_str in processed_dates:
+                logger.info(f"Дата {date_str} уже обработана, пропускаем...")
+            else:
+                logger.info(f"Обработка данных за {date_str}...")
+                eis_requester = EISRequester(date=date_str)
+                eis_requester.process_requests()
+
+                # # Сохраняем отработанную дату
+                # save_processed_date(date_str)
+
+            # Обновляем дату на следующий день
+            next_date = current_date + timedelta(days=1)
+            update_config_date(next_date)
+
+            # Опционально: можно добавить небольшую задержку
+            time.sleep(2)
+
+            # Переходим к следующему дню
+            current_date = next_date
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger.info("Запуск программы...")
 
-        # Переходим к следующему дню
-        current_date = next_date
+    # Запуск Stunnel под супервизором: ожидание готовности портов и перезапуск упавших экземпляров
+    stunnel_supervisor = StunnelSupervisor()
+    if not stunnel_supervisor.start():
+        logger.error("Ни один экземпляр stunnel не запустился.")
+    else:
+        logger.info("Stunnel успешно запущен.")
+
+    try:
+        # Справочники (регионы, ОКПД, торговые площадки) загружаются в кэш один раз до обработки
+        get_runtime(CONFIG_PATH).warm_up()
+        run(args)
+    finally:
+        # Дописываем в БД разобранные документы и останавливаем процессы разбора
+        close_ingest_pipeline()
+        # Закрываем соединения общего пула БД
+        close_runtime()
+        stunnel_supervisor.stop()
 
     logger.info("Программа завершена.")
@@ -0,0 +1,192 @@
+import threading
+import time
+from loguru import logger
+
+from secondary_functions import load_config
+from database_work.database_requests import get_okpd_codes, get_user_okpd_codes
+
+
+def okpd_digits(code):
+    """
+    Оставляет в коде ОКПД2 только цифры ("26.20.15.000" -> "2620150000").
+
+    Класс, подкласс, группа и т. д. кода ОКПД2 — это последовательные цифры, поэтому коду соответствуют
+    все записи справочника, цифры которых являются началом цифр кода ("26.2" и "26.20" для "26.20.15.000").
+    """
+    return "".join(char for char in code if char.isdigit()) if code else ""
+
+
+class OKPDReferenceError(Exception):
+    """
+    Исключение, возникающее, если справочник ОКПД не загружен: без него нельзя отличить подходящие документы.
+    """
+
+
+class OKPDTrie:
+    """
+    Префиксное дерево по цифрам кодов ОКПД2.
+
+    Узел — словарь {цифра: узел}; значения записей, заканчивающихся в узле, хранятся под ключом None.
+    Поиск по коду проходит не больше 9–10 узлов (по числу цифр кода) независимо от размера справочника.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self.size = 0
+
+    def add(self, code, value):
+        """
+        Добавляет запись справочника.
+
+        :param code: Код ОКПД2 (класс, подкласс, группа и т. д.).
+        :param value: Значение, возвращаемое при совпадении (например, кортеж (таблица, id)).
+        """
+        digits = okpd_digits(code)
+        if not digits:
+            return
+        node = self._root
+        for digit in digits:
+            node = node.setdefault(digit, {})
+        node.setdefault(None, []).append(value)
+        self.size += 1
+
+    def match(self, code):
+        """
+        Находит записи, коды которых являются началом кода.
+
+        :param code: Код ОКПД2 позиции документа.
+        :return: Список значений от самой общей записи к самой точной.
+        """
+        matched = []
+        node = self._root
+        for digit in okpd_digits(code):
+            node = node.get(digit)
+            if node is None:
+                break
+            matched.extend(node.get(None, ()))
+        return matched
+
+
+class OKPDMatcher:
+    """
+    Сопоставление кодов ОКПД2 позиций документа со справочником `collection_codes_okpd`
+    и пользовательскими кодами `okpd_from_users` без запросов к БД на каждый документ.
+
+    Дерево строится из БД при первом обращении и перестраивается методом refresh, а также
+    автоматически раз в `[okpd] refresh_minutes` минут (0 — только по вызову refresh).
+    """
+
+    COLLECTION = "collection_codes_okpd"
+    USERS = "okpd_from_users"
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.refresh_interval = self.config.getint("okpd", "refresh_minutes", fallback=60) * 60
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._trie = None
+        self._loaded_at = 0.0
+
+    def refresh(self):
+        """
+        Перестраивает дерево по текущему содержимому справочников.
+        Если справочник не удалось загрузить, продолжает использоваться прежнее дерево.
+
+        :raises OKPDReferenceError: Если справочник не загружен и прежнего дерева нет. Пустое дерево
+                                    не устанавливается: иначе все документы отклонялись бы до следующей загрузки.
+        """
+        collection_codes = get_okpd_codes()
+        user_codes = get_user_okpd_codes()
+
+        trie = OKPDTrie()
+        for okpd_id, code in collection_codes:
+            trie.add(code, (self.COLLECTION, okpd_id))
+        for okpd_id, code in user_codes:
+            trie.add(code, (self.USERS, okpd_id))
+
+        with self._lock:
+            if not trie.size:
+                if self._trie is None:
+                    raise OKPDReferenceError("Справочник ОКПД пуст или не загружен.")
+                # Прежнее дерево используется до следующей попытки через refresh_minutes
+                self._loaded_at = time.monotonic()
+                logger.error("Справочник ОКПД пуст или не загружен, используется прежний.")
+                return
+            self._loaded_at = time.monotonic()
+            self._trie = trie
+        logger.info(f"Справочник ОКПД загружен: {len(collection_codes)} кодов, "
+                    f"пользовательских {len(user_codes)}")
+
+    def _is_stale(self):
+        with self._lock:
+            return self._trie is None or (
+                self.refresh_interval and time.monotonic() - self._loaded_at > self.refresh_interval)
+
+    def _get_trie(self):
+        if self._is_stale():
+            # Справочник загружает один поток, остальные ждут и используют результат
+            with self._refresh_lock:
+                if self._is_stale():
+                    self.refresh()
+        return self._trie
+
+    def match(self, codes):
+        """
+        Сопоставляет коды всех позиций документа со справочниками.
+        Если справочник не загружен, возникает OKPDReferenceError: записи документа откатываются,
+        и файл обрабатывается повторно.
+
+        :param codes: Коды ОКПД2 позиций (в порядке документа, могут повторяться).
+        :return: Словарь {"codes": совпавшие коды позиций,
+                          "okpd_ids": id записей collection_codes_okpd (сначала самые точные для каждого кода),
+                          "user_okpd_ids": id записей okpd_from_users}; списки без повторов.
+        """
+        trie = self._get_trie()
+        result = {"codes": [], "okpd_ids": [], "user_okpd_ids": []}
+
+        for code in dict.fromkeys(code.strip() for code in codes if code and code.strip()):
+            matched = trie.match(code)
+            if not matched:
+                continue
+            result["codes"].append(code)
+            for table, okpd_id in reversed(matched):
+                key = "okpd_ids" if table == self.COLLECTION else "user_okpd_ids"
+                if okpd_id not in result[key]:
+                    result[key].append(okpd_id)
+        return result
+
+    def okpd_id(self, code):
+        """
+        :return: id самой точной записи collection_codes_okpd для кода или None.
+        """
+        for table, okpd_id in reversed(self._get_trie().match(code)):
+            if table == self.COLLECTION:
+                return okpd_id
+        return None
+
+
+_shared_matcher = None
+_shared_matcher_lock = threading.Lock()
+
+
+def get_okpd_matcher(config_path="config.ini"):
+    """
+    Возвращает общий для процесса сопоставитель кодов ОКПД, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр OKPDMatcher.
+    """
+    global _shared_matcher
+    with _shared_matcher_lock:
+        if _shared_matcher is None:
+            _shared_matcher = OKPDMatcher(config_path)
+        return _shared_matcher
+
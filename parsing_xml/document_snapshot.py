@@ -0,0 +1,188 @@
+import os
+import xml.etree.ElementTree as ET
+
+from parsing_xml.okpd_prefilter import local_name, empty_result
+from parsing_xml.tag_specs import path_steps
+
+
+class SnapshotError(Exception):
+    """
+    Исключение, возникающее при обращении к снимку документа, который не удалось прочитать
+    (кроме ошибок разбора XML, которые возникают повторно как ET.ParseError).
+    """
+
+
+class DocumentSnapshot:
+    """
+    Значения, извлечённые из XML-документа, в виде простых данных, которые можно передать между процессами.
+
+    Снимок создаётся в процессе разбора (см. ingest_pipeline) и заменяет XMLDocument в процессе записи в БД:
+    методы prefilter, prepare, find, findall и iterfind отвечают так же, как у документа, но без повторного
+    чтения и разбора. Для каждого пути полей хранятся первое, первое непустое и последнее совпадение
+    (как в потоковом режиме XMLDocument), для элементов секции `links_documentation` — все совпадения
+    с текстами вложенных `file_name` и `document_links`.
+    """
+
+    def __init__(self, file_path, on_disk=False):
+        """
+        :param file_path: Путь к файлу документа (для файла из архива — условный путь).
+        :param on_disk: True — документ прочитан из файла file_path, и файл удаляется методом delete.
+        """
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.on_disk = on_disk
+        self.error = None
+        self._parse_error = False
+        self._prefilter = None
+        # {путь: [(локальное имя, текст)]}
+        self._fields = {}
+        # {путь: [(локальное имя, текст, {относительный путь: текст})]}
+        self._subtrees = {}
+
+    @classmethod
+    def capture(cls, document, extractor, links_documentation_tags=None, prefilter=False):
+        """
+        Снимает значения с документа и освобождает его.
+
+        :param document: Документ XMLDocument.
+        :param extractor: Сопоставитель FieldExtractor для типа документа (см. get_field_extractor).
+        :param links_documentation_tags: Скомпилированная секция `links_documentation` (см. tag_specs).
+        :param prefilter: True — сначала выполняется потоковый фильтр ОКПД; документ без кода ОКПД
+                          не разбирается.
+        :return: Экземпляр DocumentSnapshot. Ошибка чтения или разбора сохраняется в `error` и возникает
+                 повторно при обращении к снимку, поэтому ошибка одного документа не прерывает разбор архива.
+        """
+        snapshot = cls(document.file_path, document.on_disk)
+        try:
+            if prefilter:
+                snapshot._prefilter = document.prefilter()
+                if not snapshot._prefilter["okpd_code"]:
+                    return snapshot
+
+            document.prepare(extractor)
+            link_paths = {link["xpath"] for link in (links_documentation_tags or {}).values()}
+            for path in extractor.paths:
+                if path not in link_paths:
+                    snapshot._fields[path] = [
+                        (local_name(elem.tag), elem.text) for elem in _summary(document.findall(path))
+                    ]
+
+            for link in (links_documentation_tags or {}).values():
+                relative_paths = [path for path in (link["file_name"], link["document_links"]) if path]
+                snapshot._subtrees[link["xpath"]] = [
+                    (local_name(elem.tag), elem.text, {
+                        path: child.text for path in relative_paths
+                        if (child := elem.find(path)) is not None
+                    })
+                    for elem in document.iterfind(link["xpath"])
+                ]
+        except Exception as e:
+            snapshot.set_error(e)
+        finally:
+            document.release()
+        return snapshot
+
+    @classmethod
+    def failed(cls, file_path, error):
+        """
+        Снимок документа, который не удалось загрузить (например, ошибка чтения файла из архива).
+
+        :param file_path: Путь к файлу документа (для файла из архива — условный путь).
+        :param error: Исключение.
+        """
+        snapshot = cls(file_path)
+        snapshot.set_error(error)
+        return snapshot
+
+    def set_error(self, error):
+        """
+        Сохраняет ошибку чтения или разбора документа.
+        """
+        self._parse_error = isinstance(error, ET.ParseError)
+        self.error = str(error) if self._parse_error else f"{type(error).__name__}: {error}"
+
+    def _check(self):
+        if self.error:
+            if self._parse_error:
+                raise ET.ParseError(self.error)
+            raise SnapshotError(self.error)
+
+    def prefilter(self):
+        """
+        Результат потокового фильтра ОКПД, полученный при создании снимка.
+        """
+        self._check()
+        return self._prefilter or empty_result()
+
+    def parse(self):
+        """
+        Снимок не содержит дерева; повторно возникает ошибка разбора, если она была.
+        """
+        self._check()
+
+    def prepare(self, extractor):
+        """
+        Значения уже извлечены при создании снимка; повторно возникает ошибка разбора, если она была.
+        """
+        self._check()
+
+    def find(self, path):
+        """
+        Аналог Element.find по сохранённым значениям.
+        """
+        elements = self.findall(path)
+        return elements[0] if elements else None
+
+    def findall(self, path):
+        """
+        Аналог Element.findall по сохранённым значениям.
+        Для путей, не попавших в снимок, возвращает пустой список.
+        """
+        if path in self._subtrees:
+            return [_build(tag, text, children) for tag, text, children in self._subtrees[path]]
+        return [_build(tag, text) for tag, text in self._fields.get(path, ())]
+
+    def iterfind(self, path):
+        """
+        Аналог Element.iterfind по сохранённым значениям.
+        """
+        return iter(self.findall(path))
+
+    def delete(self):
+        """
+        Удаляет файл документа с диска (если документ прочитан из файла) и освобождает снимок.
+        """
+        if self.on_disk and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.release()
+
+    def release(self):
+        """
+        Освобождает сохранённые значения.
+        """
+        self._fields = {}
+        self._subtrees = {}
+
+
+def _summary(elements):
+    """
+    Оставляет первое, первое непустое и последнее совпадение (в порядке документа).
+    """
+    if not elements:
+        return []
+    first_text = next((elem for elem in elements if elem.text and elem.text.strip()), None)
+    return list(dict.fromkeys(elem for elem in (elements[0], first_text, elements[-1]) if elem is not None))
+
+
+def _build(tag, text, children=None):
+    """
+    Восстанавливает элемент с текстом и вложенными элементами по относительным путям.
+    """
+    elem = ET.Element(tag)
+    elem.text = text
+    for path, child_text in (children or {}).items():
+        parent = elem
+        for step in path_steps(path):
+            parent = ET.SubElement(parent, step)
+        parent.text = child_text
+    return elem
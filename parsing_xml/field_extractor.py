@@ -0,0 +1,155 @@
+import threading
+import xml.etree.ElementTree as ET
+
+from parsing_xml.okpd_prefilter import local_name
+from parsing_xml.tag_specs import get_tag_spec, path_steps
+
+
+class FieldExtractor:
+    """
+    Сопоставитель путей, который находит элементы для всех полей типа документа за один обход.
+
+    Пути вида ".//{*}a/{*}b" (см. tag_specs.compile_path) раскладываются на шаги по локальным именам
+    и индексируются по последнему шагу. Для каждого элемента документа проверяются только пути,
+    оканчивающиеся его именем, — сравнением хвоста текущего пути от корня. Так вместо отдельного
+    просмотра дерева на каждое поле выполняется один обход.
+
+    Сопоставление по стеку имён (match) не зависит от способа обхода, поэтому тот же объект
+    используется и для потока событий iterparse.
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: Скомпилированные пути поиска на любом уровне (начинаются с ".//").
+        """
+        self.paths = list(dict.fromkeys(paths))
+        self._by_last_step = {}
+        for path in self.paths:
+            steps = path_steps(path)
+            self._by_last_step.setdefault(steps[-1], []).append((steps, path))
+
+    @classmethod
+    def for_spec(cls, spec, extra_paths=()):
+        """
+        Собирает сопоставитель для скомпилированных тегов: все простые поля, элементы секции
+        `links_documentation` и дополнительные пути.
+
+        :param spec: Скомпилированный словарь тегов (см. tag_specs.get_tag_spec).
+        :param extra_paths: Дополнительные скомпилированные пути.
+        """
+        paths = []
+        for section, fields in spec.items():
+            if section == "links_documentation":
+                paths.extend(link["xpath"] for link in fields.values())
+            else:
+                paths.extend(fields.values())
+        paths.extend(extra_paths)
+        return cls(paths)
+
+    def match(self, names):
+        """
+        Определяет, каким путям соответствует элемент.
+
+        :param names: Локальные имена элементов от корня документа до текущего элемента включительно.
+        :return: Список совпавших путей.
+        """
+        candidates = self._by_last_step.get(names[-1])
+        if not candidates:
+            return []
+        # Как и в ElementPath, ".//" ищет только среди потомков корня, поэтому путь должен быть короче стека
+        return [
+            path for steps, path in candidates
+            if len(names) > len(steps) and tuple(names[-len(steps):]) == steps
+        ]
+
+    def index(self, root):
+        """
+        Обходит дерево один раз (в порядке документа) и собирает элементы для всех путей.
+
+        :param root: Корень дерева документа.
+        :return: Словарь {путь: [элементы в порядке документа]}; результаты совпадают с root.findall(путь).
+        """
+        found = {path: [] for path in self.paths}
+        names = []
+        pending = [(root, 0)]
+
+        while pending:
+            elem, depth = pending.pop()
+            if not isinstance(elem.tag, str):
+                continue  # Комментарии и инструкции обработки
+
+            del names[depth:]
+            names.append(local_name(elem.tag))
+            for path in self.match(names):
+                found[path].append(elem)
+
+            pending.extend((child, depth + 1) for child in reversed(elem))
+
+        return found
+
+    def iterparse(self, source, keep=()):
+        """
+        Потоково читает документ и отдаёт совпавшие элементы по мере их закрытия, не строя дерево целиком.
+
+        Прочитанные элементы очищаются и отсоединяются от родителя, поэтому потребление памяти не зависит
+        от размера документа. Поддерево элемента сохраняется только для путей из `keep`
+        (например, вложения, у которых нужны дочерние fileName и url); у остальных совпавших элементов
+        к моменту выдачи доступны текст и атрибуты. Элемент действителен только до следующей итерации.
+
+        :param source: Путь к файлу или файловый объект в двоичном режиме.
+        :param keep: Пути, для элементов которых сохраняется поддерево.
+        :return: Генератор кортежей (путь, элемент) в порядке закрытия элементов.
+        :raises xml.etree.ElementTree.ParseError: Если документ не является корректным XML.
+        """
+        keep = set(keep)
+        names = []
+        elements = []
+        matches = []
+        # Глубина внешнего открытого элемента, поддерево которого сохраняется (None — такого нет)
+        kept_depth = None
+
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                names.append(local_name(elem.tag))
+                paths = self.match(names)
+                if kept_depth is None and keep.intersection(paths):
+                    kept_depth = len(elements)
+                elements.append(elem)
+                matches.append(paths)
+                continue
+
+            names.pop()
+            elements.pop()
+            for path in matches.pop():
+                yield path, elem
+
+            if kept_depth == len(elements):
+                kept_depth = None
+            if kept_depth is None:
+                # Освобождаем прочитанный элемент; предыдущие братья уже удалены, поэтому remove находит его сразу
+                if elements:
+                    elements[-1].remove(elem)
+                elem.clear()
+
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def get_field_extractor(tags_file, extra_paths=()):
+    """
+    Возвращает сопоставитель для файла тегов (типа документа), создавая его один раз за время работы процесса.
+
+    :param tags_file: Путь к JSON-файлу тегов.
+    :param extra_paths: Дополнительные скомпилированные пути (например, сроки исполнения контракта).
+    :return: Экземпляр FieldExtractor или None, если теги не удалось загрузить.
+    """
+    key = (tags_file, tuple(extra_paths))
+    with _extractors_lock:
+        if key not in _extractors:
+            spec = get_tag_spec(tags_file)
+            if spec is None:
+                return None
+            _extractors[key] = FieldExtractor.for_spec(spec, extra_paths)
+        return _extractors[key]
+
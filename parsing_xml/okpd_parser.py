@@ -1,245 +1,462 @@
+import itertools
 import os
+import zipfile
 from loguru import logger
 import xml.etree.ElementTree as ET
-import time
 
-from secondary_functions import load_config
-from database_work.check_database import DatabaseCheckManager
-from database_work.database_id_fetcher import DatabaseIDFetcher
-from file_delete.file_deleter import FileDeleter
 from parsing_xml.xml_parser import XMLParser  # Импортируем функцию process_file из xml_parser.py
 from parsing_xml.xml_parser_recouped_contract import AdvancedXMLParser
-from database_work.database_operations import DatabaseOperations
-
-def process_okpd_files(folder_path, region_code):
+from parsing_xml.xml_document import XMLDocument
+from parsing_xml.field_extractor import FieldExtractor
+from parsing_xml.tag_specs import compile_path
+from archive_extractor import ArchiveExtractor
+from version_index import get_version_index
+from okpd_trie import get_okpd_matcher
+from runtime import get_runtime
+
+# Пути без учёта пространств имён (см. tag_specs.compile_path)
+CONTRACT_NUMBER_PATH = compile_path("order/notificationNumber")
+
+def process_okpd_files(folder_path, region_code, archive_path=None, work_dir=None):
     """
     Общая функция для запуска всех этапов обработки.
-    :param folder_path: Путь к папке с распакованными файлами
+    :param folder_path: Путь к папке с распакованными файлами. По нему определяется тип документов
     :param region_code: Код региона из SOAP-запроса
+    :param archive_path: Путь к ZIP-архиву. Если указан, XML-файлы читаются прямо из архива
+                         без распаковки на диск, а папка используется только для выбора типа документов
+    :param work_dir: Рабочий каталог, в который распакован один архив. Если указан, обрабатываются
+                     только его файлы, а папка используется только для выбора типа документов
     """
-    db_id_fetcher = DatabaseIDFetcher()
-    region_id = db_id_fetcher.get_region_id(region_code)
+    runtime = get_runtime()
+    # Соединение с БД берётся из пула на время обработки архива и возвращается в пул после неё
+    with runtime.session():
+        db_id_fetcher = runtime.id_fetcher()
+        region_id = db_id_fetcher.get_region_id(region_code)
+
+        if not region_id:
+            logger.error(f"Не удалось получить ID региона для кода {region_code}")
+            return
 
-    if not region_id:
-        logger.error(f"Не удалось получить ID региона для кода {region_code}")
-        return
+        # Получаем пути папок из общей конфигурации
+        config = runtime.config
+        recouped_contract_archive_44_fz_xml = config.get('path', 'recouped_contract_archive_44_fz_xml', fallback=None)
+        recouped_contract_archive_223_fz_xml = config.get('path', 'recouped_contract_archive_223_fz_xml', fallback=None)
+        # Документы больше этого размера обрабатываются потоково, без загрузки в память целиком
+        stream_threshold = config.getint('xml', 'stream_threshold_mb', fallback=8) * 1048576
+        # Число контрактов, имена файлов и номера которых проверяются в БД одним запросом
+        resolve_batch = max(1, config.getint('db', 'resolve_batch', fallback=500))
+        # Число документов, записи которых фиксируются одним коммитом (1 — коммит на каждый документ)
+        commit_group = max(1, config.getint('db', 'commit_group', fallback=1))
+
+        # XML-файлы архива (без распаковки) или None, если файлы уже распакованы в папку
+        archive_extractor = ArchiveExtractor()
+        members = archive_extractor.iter_xml_members(archive_path) if archive_path else None
+
+        try:
+            # Обработка файлов контрактов или удаление файлов из папки
+            if folder_path == recouped_contract_archive_44_fz_xml:
+                process_contract_files(folder_path, db_id_fetcher, archive_path, work_dir, stream_threshold,
+                                       resolve_batch, commit_group)
+            elif folder_path == recouped_contract_archive_223_fz_xml:
+                if members is not None or work_dir:
+                    # Файлы не распакованы в общую папку, удалять из неё нечего
+                    logger.info(f"Файлы архива {archive_path or work_dir} не обрабатываются, пропускаем.")
+                    return
+
+                # Удаляем файл из папки
+                for file_name in os.listdir(folder_path):
+                    file_path = os.path.join(folder_path, file_name)
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+                        logger.info(f"Файл {file_name} удален из папки {folder_path}")
+            else:
+                # Имена всех файлов архива проверяются в БД одним запросом до разбора
+                if archive_path:
+                    file_names = archive_extractor.list_xml_members(archive_path)
+                else:
+                    file_names = [name for name in os.listdir(work_dir or folder_path) if name.endswith(".xml")]
+                db_id_fetcher.prefetch("file_names_xml", "file_name", file_names)
 
-    # Загружаем конфигурацию и получаем пути папок
-    config = load_config()
-    recouped_contract_archive_44_fz_xml = config.get('path', 'recouped_contract_archive_44_fz_xml', fallback=None)
-    recouped_contract_archive_223_fz_xml = config.get('path', 'recouped_contract_archive_223_fz_xml', fallback=None)
-
-    # Обработка файлов контрактов или удаление файлов из папки
-    if folder_path == recouped_contract_archive_44_fz_xml:
-        process_contract_files(folder_path, db_id_fetcher)
-    elif folder_path == recouped_contract_archive_223_fz_xml:
-        # Удаляем файл из папки
-        for file_name in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-                logger.info(f"Файл {file_name} удален из папки {folder_path}")
-    else:
-        process_okpd_files_normal(folder_path, db_id_fetcher, region_code)
+                process_okpd_files_normal(folder_path, db_id_fetcher, region_code, members, work_dir, stream_threshold,
+                                          commit_group)
 
+        except zipfile.BadZipFile:
+            logger.error(f"Не удалось прочитать архив: {archive_path}")
+        finally:
+            db_id_fetcher.clear_prefetched()
 
-def process_contract_files(folder_path, db_id_fetcher):
+
+def process_contract_files(folder_path, db_id_fetcher, archive_path=None, work_dir=None, stream_threshold=0,
+                           resolve_batch=1, commit_group=1):
     """
     Обрабатывает файлы контрактов в папках с архивами контрактов (44-ФЗ, 223-ФЗ).
     :param folder_path: Путь к папке с контрактами
     :param db_id_fetcher: Объект для получения данных из базы
-    :param region_code: Код региона из SOAP-запроса
+    :param archive_path: Путь к ZIP-архиву, XML-файлы которого обрабатываются без распаковки.
+                         Если не передан, обрабатываются XML-файлы папки
+    :param work_dir: Рабочий каталог одного архива, XML-файлы которого обрабатываются вместо файлов папки
+    :param stream_threshold: Размер документа в байтах, начиная с которого он обрабатывается потоково
+                             (0 — все документы загружаются в память)
+    :param resolve_batch: Число документов, имена файлов и номера контрактов которых проверяются в БД
+                          одним запросом (см. process_contract_batch)
+    :param commit_group: Число документов, записи которых фиксируются одним коммитом (см. commit_groups)
     """
-    file_deleter = FileDeleter(folder_path)
     logger.info(f"Обрабатываем папку с контрактами: {folder_path}")
 
-    for file_name in os.listdir(folder_path):
-        if not file_name.endswith(".xml"):
+    # Имена файлов берутся из оглавления архива или каталога, документы читаются пачками
+    if archive_path:
+        file_names = ArchiveExtractor().list_xml_members(archive_path)
+    else:
+        file_names = [name for name in os.listdir(work_dir or folder_path) if name.endswith(".xml")]
+
+    for start in range(0, len(file_names), resolve_batch):
+        stop = start + resolve_batch
+        process_contract_batch(file_names[start:stop], db_id_fetcher, folder_path, archive_path, work_dir, start,
+                               stream_threshold, commit_group)
+
+
+def _iter_contract_sources(folder_path, file_names, archive_path, work_dir, start):
+    """
+    Отдаёт источники документов пачки: файлы архива с номерами от start или файлы каталога.
+
+    :return: Генератор кортежей (путь к файлу, файловый объект из архива или None).
+    """
+    if archive_path:
+        members = ArchiveExtractor().iter_xml_members(archive_path, start, start + len(file_names))
+        for file_name, member in members:
+            yield os.path.join(folder_path, file_name), member
+        return
+
+    source_dir = work_dir or folder_path
+    for file_name in file_names:
+        yield os.path.join(source_dir, file_name), None
+
+
+def _iter_contract_documents(folder_path, file_names, archive_path, work_dir, start, stream_threshold):
+    """
+    Загружает документы пачки по одному при обработке.
+    """
+    for file_path, member in _iter_contract_sources(folder_path, file_names, archive_path, work_dir, start):
+        logger.info(f"Обрабатываем файл{' из архива' if member is not None else ''}: {os.path.basename(file_path)}")
+        document = _load_document(file_path, member, stream_threshold)
+        if document is not None:
+            yield document
+
+
+def process_contract_batch(file_names, db_id_fetcher, folder_path, archive_path=None, work_dir=None, start=0,
+                           stream_threshold=0, commit_group=1):
+    """
+    Обрабатывает пачку файлов контрактов, проверяя имена файлов и номера контрактов всей пачки
+    в БД двумя запросами вместо двух запросов на каждый файл (см. DatabaseIDFetcher.prefetch).
+
+    В пачке хранятся только имена файлов и номера контрактов: номер читается потоково до первого
+    notificationNumber (см. sniff_contract_number), а документ загружается заново при его обработке.
+    :param file_names: Имена XML-файлов пачки
+    :param db_id_fetcher: Объект для получения данных из базы
+    :param folder_path: Путь к папке, по которой определяется тип документов
+    :param archive_path: Путь к ZIP-архиву или None, если файлы читаются из каталога
+    :param work_dir: Рабочий каталог одного архива, из которого читаются файлы вместо папки
+    :param start: Номер первого файла пачки среди XML-файлов архива
+    :param stream_threshold: Размер документа в байтах, начиная с которого он обрабатывается потоково
+    :param commit_group: Число документов, записи которых фиксируются одним коммитом (см. commit_groups)
+    """
+    file_ids = db_id_fetcher.prefetch("file_names_xml", "file_name", file_names)
+
+    # Номера контрактов нужны только для файлов, которых ещё нет в БД
+    batch = []
+    for file_path, member in _iter_contract_sources(folder_path, file_names, archive_path, work_dir, start):
+        file_name = os.path.basename(file_path)
+        if file_ids is not None and file_name in file_ids:
             continue
+        try:
+            batch.append((file_name, sniff_contract_number(member if member is not None else file_path)))
+        except ET.ParseError:
+            # Ошибка разбора будет записана в лог при обработке файла
+            continue
+    db_id_fetcher.prefetch("reestr_contract_44_fz", "contract_number", [number for _, number in batch if number])
+
+    documents = _iter_contract_documents(folder_path, file_names, archive_path, work_dir, start, stream_threshold)
+    for document in commit_groups(documents, commit_group):
+        _process_in_group(process_contract_file, document, db_id_fetcher, folder_path)
+        # Документ не нужен после записи, даже если он остался на диске
+        document.release()
+
+
+def commit_groups(documents, size):
+    """
+    Отдаёт документы, объединяя записи каждых `size` документов в одну транзакцию: каждый документ
+    обрабатывается в собственной точке сохранения, и группа фиксируется одним коммитом. Ошибка документа
+    (см. _process_in_group) откатывает только его записи, остальные документы группы записываются.
+    Документы, которые не удалось прочитать, пропускаются источником (см. _load_document).
+    :param documents: Документы (итерируемый объект)
+    :param size: Размер группы; при 1 каждый документ фиксируется своим коммитом
+    """
+    if size <= 1:
+        yield from documents
+        return
+
+    documents = iter(documents)
+    db_operations = get_runtime().db_operations()
+    for first in documents:
+        with db_operations.unit_of_work():
+            for _, document in zip(range(size), itertools.chain((first,), documents)):
+                with db_operations.unit_of_work():
+                    yield document
+
+
+def _process_in_group(process, document, *args):
+    """
+    Обрабатывает документ группы (см. commit_groups). Исключение записывается в лог и откатывает
+    только записи документа (его точку сохранения), обработка группы продолжается.
+    :param process: Функция обработки документа (process_okpd_file, process_contract_file)
+    :param document: Документ XMLDocument
+    :param args: Остальные аргументы функции обработки
+    """
+    try:
+        process(document, *args)
+    except Exception:
+        logger.exception(f"Ошибка при обработке файла {document.file_name}")
+        get_runtime().db_manager().rollback()
 
-        file_path = os.path.join(folder_path, file_name)
-        logger.info(f"Обрабатываем файл: {file_name}")
 
-        process_contract_file(file_path, file_name, db_id_fetcher, file_deleter, folder_path)
+def _load_document(file_path, member, stream_threshold):
+    """
+    Загружает документ (см. XMLDocument.load).
+    :return: Документ XMLDocument или None, если файл не удалось прочитать (ошибка записывается в лог)
+    """
+    try:
+        return XMLDocument.load(file_path, member, stream_threshold)
+    except Exception:
+        logger.exception(f"Не удалось прочитать файл {os.path.basename(file_path)}")
+        return None
 
 
-def process_contract_file(file_path, file_name, db_id_fetcher, file_deleter, folder_path):
+def process_contract_file(document, db_id_fetcher, folder_path):
     """
     Обрабатывает конкретный файл контракта, извлекая номер контракта и проверяя его в базе данных.
-    :param file_path: Путь к XML файлу
-    :param file_name: Имя XML файла
+    :param document: Документ XMLDocument (читается и разбирается один раз)
     :param db_id_fetcher: Объект для получения данных из базы
-    :param region_code: Код региона из SOAP-запроса
-    :param file_deleter: Объект для удаления файлов
+    :param folder_path: Путь к папке, по которой определяется тип документов
     """
+    file_name = document.file_name
     try:
         # Проверка наличия файла в базе данных перед его открытием
         file_id = db_id_fetcher.get_file_names_xml_id(file_name)
         if file_id:
             logger.info(f"Файл {file_name} уже был записан в БД. Завершаем обработку.")
-            file_deleter.delete_single_file(file_path)
+            document.delete()
             return
 
-        # Если файла нет в базе данных, добавляем имя файла в базу
-        logger.info(f"Файл {file_name} не найден в базе данных, записываем в БД.")
-        db_operations = DatabaseOperations()
-        db_operations.insert_file_name(file_name)
-
-        # Открываем файл и начинаем его обработку
-        with open(file_path, "r", encoding="utf-8") as file:
-            xml_content = file.read()
+        # Имя файла и данные контракта записываются одной транзакцией: при ошибке разбора или записи
+        # имя файла не остаётся в БД, и файл будет обработан повторно
+        db_operations = get_runtime().db_operations()
+        with db_operations.unit_of_work() as unit:
+            record_contract_file(document, db_id_fetcher, db_operations, folder_path)
+        if unit.failed:
+            logger.error(f"Записи файла {file_name} в БД отменены из-за ошибки.")
 
-        xml_content = XMLParser.remove_namespaces(xml_content)
-        root = ET.fromstring(xml_content)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке файла {file_name}: {e}")
+        document.delete()
 
-        contract_number = extract_contract_number(root)
-        if contract_number:
-            logger.debug(f"Найден номер контракта: {contract_number}")
 
-            # Проверка контракта в базе данных
-            contract_id = db_id_fetcher.contract_number_44_fz_id(contract_number)
-            if contract_id:
-                logger.debug(f"Номер контракта {contract_number} найден в базе данных.")
-                process_contract_with_number(file_path, contract_number, folder_path)
-            else:
-                logger.info(f"Номер контракта {contract_number} не найден в базе данных. Удаляем файл.")
-                file_deleter.delete_single_file(file_path)
+def record_contract_file(document, db_id_fetcher, db_operations, folder_path):
+    """
+    Записывает имя файла контракта и обрабатывает контракт, номер которого есть в базе данных.
+    Вызывается внутри единицы работы (см. process_contract_file).
+    """
+    file_name = document.file_name
+    # Если файла нет в базе данных, добавляем имя файла в базу
+    logger.info(f"Файл {file_name} не найден в базе данных, записываем в БД.")
+    db_operations.insert_file_name(file_name)
+
+    contract_number = extract_contract_number(document)
+    if contract_number:
+        logger.debug(f"Найден номер контракта: {contract_number}")
+
+        # Проверка контракта в базе данных
+        contract_id = db_id_fetcher.contract_number_44_fz_id(contract_number)
+        if contract_id:
+            logger.debug(f"Номер контракта {contract_number} найден в базе данных.")
+            process_contract_with_number(document, contract_number, folder_path)
         else:
-            logger.warning(f"Не найден номер контракта в файле {file_name}")
-            file_deleter.delete_single_file(file_path)
-
-    except Exception as e:
-        logger.error(f"Ошибка при обработке файла {file_name}: {e}")
-        file_deleter.delete_single_file(file_path)
+            logger.info(f"Номер контракта {contract_number} не найден в базе данных. Удаляем файл.")
+            document.delete()
+    else:
+        logger.warning(f"Не найден номер контракта в файле {file_name}")
+        document.delete()
 
 
 def extract_contract_number(root):
     """
     Извлекает номер контракта из XML.
-    :param root: Корень XML-дерева
+    :param root: Корень XML-дерева или XMLDocument
     :return: Номер контракта или None, если не найден
     """
 
-    xpath = "order/notificationNumber"  # Путь без namespace
-    tag_without_namespace = xpath.split(":")[-1]  # Если вдруг останется namespac
-    # Ищем все элементы с названием notificationNumber, игнорируя namespace
-    contract_number_element = root.find(f".//{tag_without_namespace}")  # Ищем по пути
+    # Ищем элемент notificationNumber, игнорируя namespace
+    contract_number_element = root.find(CONTRACT_NUMBER_PATH)
 
     return str(contract_number_element.text) if contract_number_element is not None else None
 
 
-def process_contract_with_number(file_path, contract_number, folder_path):
+def sniff_contract_number(source):
+    """
+    Потоково читает документ до первого номера контракта, не загружая документ в память.
+    :param source: Путь к файлу или файловый объект в двоичном режиме
+    :return: Номер контракта (как extract_contract_number) или None, если не найден
+    :raises xml.etree.ElementTree.ParseError: Если документ до номера контракта не является корректным XML
+    """
+    elements = FieldExtractor([CONTRACT_NUMBER_PATH]).iterparse(source)
+    try:
+        for _, elem in elements:
+            return str(elem.text)
+        return None
+    finally:
+        elements.close()
+
+
+def process_contract_with_number(document, contract_number, folder_path):
     """
     Обрабатывает контракт с номером.
-    :param file_path: Путь к файлу
+    :param document: Документ XMLDocument
     :param contract_number: Номер контракта
     """
     xml_parser_recouped = AdvancedXMLParser(config_path="config.ini")
-    xml_parser_recouped.parse_xml_tags_recouped_contract(file_path, contract_number, folder_path)
+    xml_parser_recouped.parse_xml_tags_recouped_contract(document.file_path, contract_number, folder_path, document)
 
 
-def process_okpd_files_normal(folder_path, db_id_fetcher, region_code):
+def process_okpd_files_normal(folder_path, db_id_fetcher, region_code, members=None, work_dir=None, stream_threshold=0,
+                              commit_group=1):
     """
     Обрабатывает обычные XML-файлы с кодами ОКПД.
     :param folder_path: Путь к папке с файлами
     :param db_id_fetcher: Объект для получения данных из базы
     :param region_code: Код региона из SOAP-запроса
+    :param members: Файлы архива (имя, файловый объект) из ArchiveExtractor.iter_xml_members.
+                    Если не переданы, обрабатываются XML-файлы папки
+    :param work_dir: Рабочий каталог одного архива, XML-файлы которого обрабатываются вместо файлов папки
+    :param stream_threshold: Размер документа в байтах, начиная с которого он обрабатывается потоково
+                             (0 — все документы загружаются в память)
+    :param commit_group: Число документов, записи которых фиксируются одним коммитом (см. commit_groups)
     """
-    file_deleter = FileDeleter(folder_path)
     logger.info(f"Начинаем парсинг XML-файлов новых контрактов в папке: {folder_path}")
 
-    for file_name in os.listdir(folder_path):
+    documents = _iter_okpd_documents(folder_path, members, work_dir, stream_threshold)
+    for document in commit_groups(documents, commit_group):
+        _process_in_group(process_okpd_file, document, db_id_fetcher, region_code, folder_path)
+
+
+def _iter_okpd_documents(folder_path, members, work_dir, stream_threshold):
+    """
+    Отдаёт документы извещений из архива или из XML-файлов папки.
+    """
+    if members is not None:
+        for file_name, member in members:
+            logger.info(f"Обрабатываем файл нового контракта из архива: {file_name}")
+            document = _load_document(os.path.join(folder_path, file_name), member, stream_threshold)
+            if document is not None:
+                yield document
+        return
+
+    source_dir = work_dir or folder_path
+    for file_name in os.listdir(source_dir):
         if not file_name.endswith(".xml"):
             continue
 
-        file_path = os.path.join(folder_path, file_name)
         logger.info(f"Обрабатываем файл нового контракта: {file_name}")
-
-        process_okpd_file(file_path, file_name, db_id_fetcher, region_code, file_deleter, folder_path)
+        document = _load_document(os.path.join(source_dir, file_name), None, stream_threshold)
+        if document is not None:
+            yield document
 
 
-def process_okpd_file(file_path, file_name, db_id_fetcher, region_code, file_deleter, folder_path):
+def process_okpd_file(document, db_id_fetcher, region_code, folder_path):
     """
     Обрабатывает файл с кодами ОКПД.
-    :param file_path: Путь к файлу
-    :param file_name: Имя файла
+    :param document: Документ XMLDocument (читается и разбирается один раз)
     :param db_id_fetcher: Объект для получения данных из базы
     :param region_code: Код региона из SOAP-запроса
-    :param file_deleter: Объект для удаления файлов
+    :param folder_path: Путь к папке, по которой определяется тип документов
     """
+    file_name = document.file_name
     try:
         # Проверка наличия файла в базе данных перед его открытием
         file_id = db_id_fetcher.get_file_names_xml_id(file_name)
         if file_id:
             logger.info(f"Файл нового контракта {file_name} уже был записан в БД. Завершаем обработку.")
-            file_deleter.delete_single_file(file_path)
+            document.delete()
             return
 
-        # Если файла нет в базе данных, добавляем имя файла в базу
-        logger.info(f"Файл нового контракта: {file_name} не найден в базе данных, записываем в БД.")
-        db_operations = DatabaseOperations()
-        db_operations.insert_file_name(file_name)
-
-        # Открываем файл и начинаем его обработку
-        with open(file_path, "r", encoding="utf-8") as file:
-            xml_content = file.read()
-
-        xml_content = XMLParser.remove_namespaces(xml_content)
-        root = ET.fromstring(xml_content)
-
-        okpd_code = extract_okpd_code(root)
-        if okpd_code:
-            logger.debug(f"Обработанный код ОКПД для файла {file_name}: {okpd_code}")
-            process_okpd_code(okpd_code, file_path, region_code, folder_path)
-        else:
-            logger.warning(f"Не найден код ОКПД в файле {file_name}")
-            file_deleter.delete_single_file(file_path)
+        # Имя файла, заказчик, площадка, контракт и ссылки записываются одной транзакцией: при ошибке
+        # разбора или записи имя файла не остаётся в БД, и файл будет обработан повторно
+        db_operations = get_runtime().db_operations()
+        with db_operations.unit_of_work() as unit:
+            record_okpd_file(document, db_operations, region_code, folder_path)
+        if unit.failed:
+            logger.error(f"Записи файла нового контракта {file_name} в БД отменены из-за ошибки.")
 
     except Exception as e:
         logger.error(f"Ошибка при обработке файла {file_name}: {e}")
-        file_deleter.delete_single_file(file_path)
+        document.delete()
 
 
-def extract_okpd_code(root):
+def record_okpd_file(document, db_operations, region_code, folder_path):
     """
-    Извлекает код ОКПД из XML.
-    :param root: Корень XML-дерева
-    :return: Код ОКПД или None, если не найден
+    Записывает имя файла и обрабатывает документ, коды ОКПД позиций которого найдены в справочнике.
+    Вызывается внутри единицы работы (см. process_okpd_file).
     """
-    okpd_code_element = root.find(".//OKPDCode")
-    if okpd_code_element is not None:
-        return okpd_code_element.text
+    file_name = document.file_name
+    # Если файла нет в базе данных, добавляем имя файла в базу
+    logger.info(f"Файл нового контракта: {file_name} не найден в базе данных, записываем в БД.")
+    db_operations.insert_file_name(file_name)
+
+    # Потоково ищем коды ОКПД всех позиций и заголовок редакции; полный разбор выполняется только
+    # для документов, прошедших проверку
+    header = document.prefilter()
+    if not header["okpd_codes"]:
+        logger.warning(f"Не найден код ОКПД в файле {file_name}")
+        document.delete()
+        return
 
-    okpd2_code_element = root.find(".//okpd2/code")
-    if okpd2_code_element is not None:
-        return okpd2_code_element.text
+    # Сопоставляем коды всех позиций со справочником в памяти, без запросов к БД
+    okpd_match = get_okpd_matcher().match(header["okpd_codes"])
+    logger.debug(f"Коды ОКПД позиций файла {file_name}: {header['okpd_codes']}, "
+                 f"совпали: {okpd_match['codes']}")
+    if not okpd_match["okpd_ids"]:
+        logger.info(f"Коды ОКПД файла {file_name} не найдены в справочнике, файл будет удален.")
+        document.delete()
+        return
 
-    return None
+    # Устаревшие и повторные редакции извещения пропускаются, более новые обновляют запись
+    version = (header["purchase_number"], header["version"], header["publish_date"])
+    version_index = get_version_index()
+    version_status = version_index.compare(*version)
+    if version_status == "stale":
+        logger.info(f"Редакция {header['version']} ({header['publish_date']}) закупки "
+                    f"{header['purchase_number']} из файла {file_name} не новее обработанной, пропускаем.")
+        document.delete()
+        return
+    # Редакция запоминается только после коммита: если записи документа откатятся, файл будет обработан повторно
+    db_operations.db_manager.after_commit(lambda: version_index.record(*version))
 
+    process_okpd_code(okpd_match, document, region_code, folder_path, update=version_status == "newer")
 
-def process_okpd_code(okpd_code, file_path, region_code, folder_path):
+
+def process_okpd_code(okpd_match, document, region_code, folder_path, update=False):
     """
-    Обрабатывает код ОКПД.
-    :param okpd_code: Код ОКПД
-    :param file_path: Путь к файлу
+    Обрабатывает документ, коды ОКПД позиций которого найдены в справочнике.
+    :param okpd_match: Результат OKPDMatcher.match для кодов позиций документа
+    :param document: Документ XMLDocument
     :param region_code: Код региона из SOAP-запроса
+    :param update: True — документ является новой редакцией уже обработанного извещения
     """
-    # Если код состоит из 2-х частей и заканчивается на '0', убираем последний '0'
-    if len(okpd_code.split('.')) == 2 and okpd_code.endswith('0'):
-        okpd_code = okpd_code[:-1]
-
-    # Проверяем код в базе данных
-    db_id_fetcher = DatabaseIDFetcher()
-    exists_in_db = db_id_fetcher.get_okpd_id(okpd_code)
-    if exists_in_db:
-        logger.debug(f"Код ОКПД {okpd_code} найден в базе данных.")
-        xml_parser = XMLParser(config_path="config.ini")
-        xml_parser.parse_xml_tags(file_path, region_code, okpd_code, folder_path)
-
-        # Удаляем файл после обработки
-        file_deleter = FileDeleter(file_path)
-        file_deleter.delete_single_file(file_path)
-    else:
-        logger.info(f"Код ОКПД {okpd_code} не найден в базе данных, файл будет удален.")
-        file_deleter = FileDeleter(file_path)
-        file_deleter.delete_single_file(file_path)
+    # Запись извещения ссылается на код первой совпавшей позиции
+    okpd_code = okpd_match["codes"][0]
+    logger.debug(f"Коды ОКПД {okpd_match['codes']} найдены в справочнике (id {okpd_match['okpd_ids']}, "
+                 f"пользовательские {okpd_match['user_okpd_ids']}).")
+
+    xml_parser = XMLParser(config_path="config.ini")
+    xml_parser.parse_xml_tags(document.file_path, region_code, okpd_code, folder_path, document, update)
+
+    # Удаляем файл после обработки
+    document.delete()
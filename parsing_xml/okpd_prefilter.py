@@ -0,0 +1,150 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+
+# Пути (по локальным именам тегов, без пространств имён), по которым ищутся код ОКПД и номер закупки.
+# Пути ОКПД проверяются по порядку: OKPDCode (44-ФЗ), затем okpd2/code (223-ФЗ).
+OKPD_PATHS = (("OKPDCode",), ("okpd2", "code"))
+PURCHASE_NUMBER_PATHS = (("purchaseNumber",), ("purchaseNoticeData", "registrationNumber"))
+# Заголовок версии: номер редакции и дата публикации (44-ФЗ, затем 223-ФЗ)
+VERSION_PATHS = (("versionNumber",), ("purchaseNoticeData", "version"))
+PUBLISH_DATE_PATHS = (("commonInfo", "publishDTInEIS"), ("purchaseNoticeData", "publicationDateTime"))
+
+# Коды ОКПД всех позиций (те же пути OKPD_PATHS) ищутся по байтам документа, без разбора: для многолотовых
+# извещений нужен весь документ, а iterparse до конца документа дороже полного разбора.
+# Шаблоны начинаются с текста, поэтому поиск выполняется быстро (без проверки каждой позиции).
+OKPD_CODE_PATTERNS = (re.compile(rb"OKPDCode>([^<]*)<"), re.compile(rb"okpd2>\s*<(?:[\w.-]+:)?code>([^<]*)<"))
+SCAN_CHUNK_SIZE = 1048576
+# Совпадения, начинающиеся в последних SCAN_OVERLAP байтах части, ищутся в следующей части
+SCAN_OVERLAP = 4096
+
+# Поля результата фильтра и пути, по которым они ищутся (берётся первое найденное значение)
+FIELD_PATHS = {
+    "okpd_code": OKPD_PATHS,
+    "purchase_number": PURCHASE_NUMBER_PATHS,
+    "version": VERSION_PATHS,
+    "publish_date": PUBLISH_DATE_PATHS,
+}
+
+
+def local_name(tag):
+    """
+    Возвращает имя тега без пространства имён ("{uri}OKPDCode" -> "OKPDCode").
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def _matches(stack, paths):
+    return any(tuple(stack[-len(path):]) == path for path in paths)
+
+
+def prefilter_okpd(source, all_codes=True):
+    """
+    Потоково читает XML-документ и находит коды ОКПД, номер закупки и заголовок версии, не строя дерево целиком.
+
+    Пространства имён игнорируются (сравниваются локальные имена тегов). Чтение прекращается, как только
+    найдены и первый код ОКПД, и номер закупки, поэтому для отклонённых документов не выполняется полный
+    разбор. Номер редакции и дата публикации в извещениях ЕИС расположены в начале документа
+    (до объектов закупки), поэтому находятся до остановки чтения. Коды ОКПД всех позиций (многолотовые
+    извещения) затем находятся быстрым поиском по байтам документа.
+
+    :param source: Путь к файлу, файловый объект в двоичном режиме (с поддержкой seek) или содержимое
+                   документа (bytes).
+    :param all_codes: True — собрать коды ОКПД всех позиций, False — только первый.
+    :return: Словарь {"okpd_code", "purchase_number", "version", "publish_date", "okpd_codes"}: первый код ОКПД,
+             значения заголовка (ненайденные — None) и коды ОКПД позиций в порядке документа.
+    :raises xml.etree.ElementTree.ParseError: Если документ не является корректным XML
+                                              (до того, как найдены первый код ОКПД и номер закупки).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        result = _prefilter_stream(io.BytesIO(source))
+        if all_codes:
+            result["okpd_codes"] = _find_codes(source)
+        return result
+
+    if not hasattr(source, "read"):
+        with open(source, "rb") as file:
+            return prefilter_okpd(file, all_codes)
+
+    result = _prefilter_stream(source)
+    if all_codes:
+        source.seek(0)
+        result["okpd_codes"] = list(_scan_codes(source))
+    return result
+
+
+def empty_result():
+    """
+    Результат фильтра для документа, в котором ничего не найдено.
+    """
+    return dict(dict.fromkeys(FIELD_PATHS), okpd_codes=[])
+
+
+def _prefilter_stream(stream):
+    result = empty_result()
+    stack = []
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(local_name(elem.tag))
+            continue
+
+        text = elem.text.strip() if elem.text and elem.text.strip() else None
+        if text:
+            for field, paths in FIELD_PATHS.items():
+                if result[field] is None and _matches(stack, paths):
+                    result[field] = text
+                    break
+
+        stack.pop()
+        # Обработанные элементы не нужны, освобождаем их, чтобы не накапливать дерево
+        elem.clear()
+
+        if result["okpd_code"] is not None and result["purchase_number"] is not None:
+            break
+
+    if result["okpd_code"] is not None:
+        result["okpd_codes"].append(result["okpd_code"])
+    return result
+
+
+def _find_codes(data, limit=None):
+    """
+    Находит коды ОКПД позиций в байтах документа.
+
+    :param limit: Учитываются только совпадения, начинающиеся до этой позиции (None — все).
+    :return: Коды в порядке документа.
+    """
+    found = []
+    for pattern in OKPD_CODE_PATTERNS:
+        for match in pattern.finditer(data):
+            position = match.start()
+            if limit is not None and position >= limit:
+                break
+            # Только теги с точным локальным именем: не "KTRU_OKPDCode", не закрывающие теги
+            if position and data[position - 1:position] not in (b"<", b":"):
+                continue
+            code = match.group(1).strip()
+            if code:
+                found.append((position, code.decode("utf-8", "replace")))
+    return [code for _, code in sorted(found)]
+
+
+def _scan_codes(stream):
+    """
+    Находит коды ОКПД позиций в файловом объекте, читая его частями по SCAN_CHUNK_SIZE.
+    Конец каждой части (SCAN_OVERLAP байт) переносится в следующую, чтобы не потерять совпадения на границе.
+    """
+    data = b""
+    while True:
+        chunk = stream.read(SCAN_CHUNK_SIZE)
+        if not chunk:
+            yield from _find_codes(data)
+            return
+        data += chunk
+        limit = len(data) - SCAN_OVERLAP
+        if limit > 0:
+            yield from _find_codes(data, limit)
+            data = data[limit:]
+
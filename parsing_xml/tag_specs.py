@@ -0,0 +1,89 @@
+import json
+import threading
+from loguru import logger
+
+
+def compile_path(path, descendant=True):
+    """
+    Преобразует путь из JSON-файла тегов в выражение ElementPath, не зависящее от пространств имён.
+
+    Каждый шаг пути получает подстановку `{*}` (любое пространство имён), поэтому документ можно
+    разбирать как есть, без удаления пространств имён.
+    Пример: "responsibleOrgInfo/INN" -> ".//{*}responsibleOrgInfo/{*}INN".
+
+    :param path: Путь из файла тегов (может начинаться с ".//" и содержать префиксы вида "ns4:").
+    :param descendant: True — поиск на любом уровне (".//"), False — относительно текущего элемента.
+    :return: Выражение для Element.find/findall.
+    """
+    steps = [step.split(":")[-1] for step in path.removeprefix(".//").split("/") if step]
+    compiled = "/".join(f"{{*}}{step}" for step in steps)
+    return f".//{compiled}" if descendant else compiled
+
+
+def path_steps(path):
+    """
+    Раскладывает скомпилированный путь на локальные имена шагов.
+    Пример: ".//{*}responsibleOrgInfo/{*}INN" -> ("responsibleOrgInfo", "INN").
+
+    :param path: Путь, полученный из compile_path.
+    :return: Кортеж локальных имён.
+    """
+    return tuple(step.removeprefix("{*}") for step in path.removeprefix(".//").split("/") if step)
+
+
+def compile_tag_spec(tags):
+    """
+    Компилирует содержимое JSON-файла тегов.
+
+    Простые секции ({поле: путь}) превращаются в {поле: выражение ElementPath}. Секция `links_documentation`
+    превращается в {имя: {"xpath", "file_name", "default_file_name", "document_links", "first_only"}},
+    где `file_name` и `document_links` — выражения относительно найденного элемента или None.
+    Если `document_links` не задан, ссылкой считается текст самого элемента `xpath`.
+
+    :param tags: Словарь, загруженный из JSON-файла тегов.
+    :return: Скомпилированный словарь той же структуры.
+    """
+    compiled = {}
+    for section, fields in tags.items():
+        if section == "links_documentation":
+            for name, link in fields.items():
+                if not link.get("xpath"):
+                    logger.warning(f"Отсутствует xpath в секции {name}")
+            compiled[section] = {
+                name: {
+                    "xpath": compile_path(link["xpath"]),
+                    "file_name": compile_path(link["file_name"], descendant=False) if link.get("file_name") else None,
+                    "default_file_name": link.get("default_file_name", name),
+                    "document_links": (compile_path(link["document_links"], descendant=False)
+                                       if link.get("document_links") else None),
+                    "first_only": bool(link.get("first_only", False)),
+                }
+                for name, link in fields.items()
+                if link.get("xpath")
+            }
+        else:
+            compiled[section] = {field: compile_path(path) for field, path in fields.items()}
+    return compiled
+
+
+_specs = {}
+_specs_lock = threading.Lock()
+
+
+def get_tag_spec(tags_file):
+    """
+    Возвращает скомпилированные теги для файла тегов (типа документа), загружая и компилируя их один раз
+    за время работы процесса.
+
+    :param tags_file: Путь к JSON-файлу тегов.
+    :return: Скомпилированный словарь тегов или None, если файл не удалось загрузить.
+    """
+    with _specs_lock:
+        if tags_file not in _specs:
+            try:
+                with open(tags_file, "r", encoding="utf-8") as file:
+                    _specs[tags_file] = compile_tag_spec(json.load(file))
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке JSON файла с тегами {tags_file}: {e}")
+                return None
+        return _specs[tags_file]
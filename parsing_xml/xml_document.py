@@ -0,0 +1,238 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from loguru import logger
+
+from parsing_xml.okpd_prefilter import prefilter_okpd
+from parsing_xml.field_extractor import FieldExtractor
+
+
+class XMLDocument:
+    """
+    Один XML-документ ЕИС, который читается и разбирается ровно один раз.
+
+    Хранит исходные байты, результат потокового фильтра ОКПД и дерево документа (строится при первом
+    обращении к `root`). Пространства имён не удаляются: пути поиска компилируются с подстановкой `{*}`
+    (см. tag_specs.compile_path). Методы find/findall повторяют одноимённые методы Element
+    и кэшируют результаты по пути, поэтому документ можно передавать в методы парсеров вместо корня дерева.
+
+    В потоковом режиме (для очень больших документов) документ не хранится в памяти и дерево не строится:
+    каждый поиск заново читает документ через iterparse (см. FieldExtractor.iterparse). find/findall
+    возвращают отсоединённые копии элементов (только текст и атрибуты), причём findall — не все совпадения,
+    а первое, первое непустое и последнее. Повторяющиеся структуры (вложения, ссылки) читаются через iterfind
+    по одной записи за раз.
+
+    Память в потоковом режиме не зависит от размера документа, но документ читается несколько раз:
+    фильтр ОКПД (до заголовка и поиск кодов по байтам), prepare (весь документ) и iterfind для каждой
+    секции ссылок (секция first_only — до первого совпадения). Для документа 100 МБ это около 0,4 с, 4,5 с
+    и 5 с. Проходы не объединяются: чтение ссылок вместе с полями потребовало бы хранить все ссылки документа.
+    """
+
+    def __init__(self, file_path, raw=None, stream=None, streaming=False):
+        """
+        :param file_path: Путь к файлу. Для файла из архива — условный путь (используется только в логах).
+        :param raw: Содержимое документа (bytes). Если не передано, файл читается при первом обращении.
+        :param stream: Файловый объект в двоичном режиме (с поддержкой seek), из которого читается документ
+                       вместо файла file_path, например файл из архива.
+        :param streaming: True — потоковый режим: документ читается по частям при каждом поиске.
+        """
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.streaming = streaming
+        # Документ прочитан из файла file_path (а не из архива или переданных байтов): только такой файл удаляется
+        self.on_disk = raw is None and stream is None
+        self._raw = raw
+        self._stream = stream
+        self._root = None
+        self._prefilter = None
+        self._find_cache = {}
+        self._findall_cache = {}
+
+    @classmethod
+    def load(cls, file_path, member=None, stream_threshold=0):
+        """
+        Создаёт документ для файла на диске или файла из архива, выбирая режим по размеру.
+
+        :param file_path: Путь к файлу (для файла из архива — условный путь).
+        :param member: Файловый объект файла из архива (см. ArchiveExtractor.iter_xml_members) или None.
+        :param stream_threshold: Размер в байтах, начиная с которого документ обрабатывается потоково
+                                 (0 — потоковый режим не используется).
+        :return: Экземпляр XMLDocument.
+        """
+        if member is not None:
+            size = member.seek(0, os.SEEK_END)
+            member.seek(0)
+        else:
+            size = os.path.getsize(file_path)
+
+        if stream_threshold and size > stream_threshold:
+            logger.info(f"Документ {os.path.basename(file_path)} ({size / 1048576:.1f} МБ) обрабатывается потоково")
+            return cls(file_path, stream=member, streaming=True)
+        return cls(file_path, member.read() if member is not None else None)
+
+    @contextmanager
+    def _open(self):
+        """
+        Открывает содержимое документа для чтения с начала.
+        """
+        if self._raw is not None:
+            yield io.BytesIO(self._raw)
+        elif self._stream is not None:
+            # Файлом из архива владеет вызывающий код, поэтому он не закрывается
+            self._stream.seek(0)
+            yield self._stream
+        else:
+            with open(self.file_path, "rb") as file:
+                yield file
+
+    @property
+    def raw(self):
+        """
+        Исходное содержимое документа (bytes).
+        """
+        if self._raw is None:
+            with self._open() as file:
+                self._raw = file.read()
+        return self._raw
+
+    @property
+    def root(self):
+        """
+        Корень дерева документа.
+        """
+        return self.parse()
+
+    def parse(self):
+        """
+        Разбирает документ при первом вызове и возвращает корень дерева.
+
+        :return: Корень дерева (xml.etree.ElementTree.Element).
+        :raises xml.etree.ElementTree.ParseError: Если документ не является корректным XML.
+        """
+        if self._root is None:
+            self._root = ET.fromstring(self.raw)
+        return self._root
+
+    def prefilter(self):
+        """
+        Результат потокового фильтра ОКПД (см. prefilter_okpd).
+
+        :return: Словарь {"okpd_code", "purchase_number", "version", "publish_date", "okpd_codes"}.
+        """
+        if self._prefilter is None:
+            if self.streaming:
+                with self._open() as file:
+                    self._prefilter = prefilter_okpd(file)
+            else:
+                self._prefilter = prefilter_okpd(self.raw)
+        return self._prefilter
+
+    def prepare(self, extractor):
+        """
+        Находит элементы для всех путей сопоставителя за один обход и кэширует их,
+        после чего find/findall по этим путям не обходят документ.
+
+        :param extractor: Сопоставитель FieldExtractor для типа документа.
+        :raises xml.etree.ElementTree.ParseError: Если документ не является корректным XML.
+        """
+        if self.streaming:
+            self._findall_cache.update(self._summarize(extractor))
+        else:
+            self._findall_cache.update(extractor.index(self.root))
+
+    def _summarize(self, extractor):
+        """
+        Потоково находит для каждого пути сопоставителя первое, первое непустое и последнее совпадение.
+
+        :return: Словарь {путь: [отсоединённые копии элементов в порядке документа]}.
+        """
+        found = {path: [None, None, None] for path in extractor.paths}
+        with self._open() as file:
+            for path, elem in extractor.iterparse(file):
+                first, first_text, _ = found[path]
+                copy = _detached(elem)
+                if first is None:
+                    first = copy
+                if first_text is None and elem.text and elem.text.strip():
+                    first_text = copy
+                found[path] = [first, first_text, copy]
+
+        return {
+            path: list(dict.fromkeys(elem for elem in elements if elem is not None))
+            for path, elements in found.items()
+        }
+
+    def find(self, path):
+        """
+        Аналог Element.find с кэшированием результата.
+        """
+        if path in self._findall_cache:
+            elements = self._findall_cache[path]
+            return elements[0] if elements else None
+        if path not in self._find_cache:
+            if self.streaming:
+                elements = self.iterfind(path)
+                elem = next(elements, None)
+                self._find_cache[path] = _detached(elem) if elem is not None else None
+                elements.close()
+            else:
+                self._find_cache[path] = self.root.find(path)
+        return self._find_cache[path]
+
+    def findall(self, path):
+        """
+        Аналог Element.findall с кэшированием результата.
+        В потоковом режиме возвращает только первое, первое непустое и последнее совпадение.
+        """
+        if path not in self._findall_cache:
+            if self.streaming:
+                self._findall_cache.update(self._summarize(FieldExtractor([path])))
+            else:
+                self._findall_cache[path] = self.root.findall(path)
+        return self._findall_cache[path]
+
+    def iterfind(self, path):
+        """
+        Аналог Element.iterfind: отдаёт элементы по одному.
+
+        В потоковом режиме документ читается заново, у каждого элемента сохраняется поддерево,
+        а сам элемент действителен только до следующей итерации. Путь должен начинаться с ".//"
+        (см. tag_specs.compile_path).
+        """
+        if not self.streaming:
+            yield from self.findall(path)
+            return
+
+        with self._open() as file:
+            for _, elem in FieldExtractor([path]).iterparse(file, keep=(path,)):
+                yield elem
+
+    def delete(self):
+        """
+        Удаляет файл документа с диска (если документ прочитан из файла) и освобождает память документа.
+        Для документа из архива условный путь не удаляется: по нему может лежать другой файл с тем же именем.
+        """
+        if self.on_disk and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.release()
+
+    def release(self):
+        """
+        Освобождает исходные байты, дерево и кэш поиска.
+        """
+        self._raw = b""
+        self._stream = None
+        self._root = None
+        self._find_cache.clear()
+        self._findall_cache.clear()
+
+
+def _detached(elem):
+    """
+    Копирует тег, атрибуты и текст элемента без дочерних элементов (элементы потокового чтения очищаются).
+    """
+    copy = ET.Element(elem.tag, elem.attrib)
+    copy.text = elem.text
+    return copy
+
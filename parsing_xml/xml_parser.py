@@ -4,10 +4,12 @@ from loguru import logger
 import re
 from datetime import datetime
 
-from secondary_functions import load_config
-from database_work.database_operations import DatabaseOperations
-from database_work.database_id_fetcher import DatabaseIDFetcher
 from file_delete.file_deleter import FileDeleter
+from parsing_xml.xml_document import XMLDocument
+from parsing_xml.field_extractor import get_field_extractor
+from parsing_xml.tag_specs import get_tag_spec
+from okpd_trie import get_okpd_matcher
+from runtime import get_runtime
 
 class XMLParser:
     """
@@ -19,13 +21,12 @@ class XMLParser:
         Загружает конфигурацию и путь к XML-файлам из config.ini.
         """
 
-        # Инициализируем методы для работы с базой данных внутри XMLParser
-        self.database_operations = DatabaseOperations()
-        self.db_id_fetcher = DatabaseIDFetcher()
+        # Объекты работы с базой данных и конфигурация общие для потока (см. runtime.RuntimeContext)
+        runtime = get_runtime(config_path)
+        self.database_operations = runtime.db_operations()
+        self.db_id_fetcher = runtime.id_fetcher()
 
-        self.config = load_config(config_path)
-        if not self.config:
-            raise ValueError("Ошибка загрузки конфигурации!")
+        self.config = runtime.config
 
         # Пути к папкам с XML и теги для каждой папки из конфигурации
         self.xml_paths = self.config['path']
@@ -61,10 +62,11 @@ class XMLParser:
             return None
 
     def parse_reestr_contract_44_fz(self, root, tags, region_code, okpd_code, customer_id, platform_id, tags_file,
-                                    file_path, xml_folder_path):
+                                    file_path, xml_folder_path, update=False):
         """
         Парсит данные для таблицы реестра контрактов 44-ФЗ и вставляет в БД.
         Если поле 'auction_name' пустое, прекращает обработку и удаляет файл через FileDeleter.
+        При update=True (новая редакция извещения) обновляет уже записанный контракт.
         """
         found_tags = self._parse_common_contract_data(root, tags, region_code, okpd_code, customer_id, platform_id,
                                                       tags_file)
@@ -81,6 +83,12 @@ class XMLParser:
             # Прекращаем дальнейшую обработку
             return None
 
+        # Новая редакция уже записанного извещения обновляет запись
+        if update:
+            contract_id = self._update_contract(found_tags, "reestr_contract_44_fz")
+            if contract_id:
+                return contract_id
+
         # Если значение поля 'auction_name' присутствует, продолжаем вставку данных
         contract_id = self.database_operations.insert_reestr_contract_44_fz(found_tags)
         logger.info(f"Вставленная запись для 44-ФЗ имеет id: {contract_id}")
@@ -88,9 +96,10 @@ class XMLParser:
         return contract_id
 
     def parse_reestr_contract_223_fz(self, root, tags, region_code, okpd_code, customer_id, platform_id, tags_file,
-                                     file_path, xml_folder_path):
+                                     file_path, xml_folder_path, update=False):
         """
         Парсит данные для таблицы реестра контрактов 223-ФЗ и вставляет в БД.
+        При update=True (новая редакция извещения) обновляет уже записанный контракт.
         """
         # Парсим общие данные контракта
         found_tags = self._parse_common_contract_data(root, tags, region_code, okpd_code, customer_id, platform_id,
@@ -108,22 +117,43 @@ class XMLParser:
             # Прекращаем дальнейшую обработку
             return None
 
+        # Новая редакция уже записанного извещения обновляет запись
+        if update:
+            contract_id = self._update_contract(found_tags, "reestr_contract_223_fz")
+            if contract_id:
+                return contract_id
+
         # Вставляем данные в таблицу reestr_contract_223_fz
         contract_id = self.database_operations.insert_reestr_contract_223_fz(found_tags)
         logger.info(f"Вставленная запись для 223-ФЗ имеет id: {contract_id}")
 
         return contract_id
 
+    def _update_contract(self, found_tags, table_name):
+        """
+        Применяет новую редакцию извещения к уже записанному контракту.
+
+        :param found_tags: Данные контракта.
+        :param table_name: Таблица реестра контрактов (reestr_contract_44_fz или reestr_contract_223_fz).
+        :return: id обновлённой записи или None, если контракта с таким номером нет в БД.
+        """
+        existing_id = self.db_id_fetcher.fetch_id(table_name, "contract_number", found_tags.get('contract_number'))
+        if not existing_id:
+            return None
+
+        contract_id = self.database_operations._update_existing_contract(existing_id, found_tags, table_name)
+        logger.info(f"Запись {table_name} с id {existing_id} обновлена новой редакцией извещения")
+        return contract_id
+
     def _parse_common_contract_data(self, root, tags, region_code, okpd_code, customer_id, platform_id, tags_file):
         """
         Общая логика парсинга данных для контрактов, используемая для 44-ФЗ и 223-ФЗ.
         """
         found_tags = {}
 
-        # Парсинг общих данных
+        # Парсинг общих данных (пути уже скомпилированы, см. tag_specs)
         for tag, xpath in tags.items():
-            tag_without_namespace = xpath.split(":")[-1]
-            elements = root.findall(f".//{tag_without_namespace}")
+            elements = root.findall(xpath)
 
             if elements:
                 values = [elem.text.strip() for elem in elements if elem.text and elem.text.strip()]
@@ -143,7 +173,8 @@ class XMLParser:
 
         # Добавляем дополнительные параметры
         found_tags['region_id'] = self.db_id_fetcher.get_region_id(region_code)
-        found_tags['okpd_id'] = self.db_id_fetcher.get_okpd_id(okpd_code)
+        # Самая точная запись справочника, являющаяся началом кода (см. OKPDMatcher)
+        found_tags['okpd_id'] = get_okpd_matcher().okpd_id(okpd_code)
         found_tags['customer_id'] = customer_id
         found_tags['trading_platform_id'] = platform_id
 
@@ -158,7 +189,7 @@ class XMLParser:
 
         # Парсим данные из XML
         for tag, xpath in tags.items():
-            element = root.find(f".//{xpath}")  # Добавляем ".//" для поиска на любом уровне
+            element = root.find(xpath)  # Путь скомпилирован с ".//" для поиска на любом уровне
             found_tags[tag] = element.text.strip() if element is not None and element.text else None
 
         # Получаем имя торговой площадки
@@ -193,55 +224,81 @@ class XMLParser:
 
         return platform_id  # Возвращаем ID, который был найден или создан
 
-    def parse_links_documentation(self, root, links_documentation_tags, contract_id, tags_file):
+    def parse_links_documentation(self, root, links_documentation_tags, contract_id, tags_file, update=False):
         """
         Парсит данные для таблицы links_documentation_44_fz (или 223_fz)
         и вызывает парсинг для таблицы printFormInfo.
-        """
-        found_tags = []
+        Ссылки накапливаются в буфере вставки по мере чтения документа и записываются многострочными
+        запросами (см. DatabaseOperations.buffer_insert).
+        При update=True (новая редакция извещения) ссылки, уже записанные в БД, пропускаются.
 
-        for tag_name, tag_data in links_documentation_tags.items():
-            xpath = tag_data.get("xpath")
-            if not xpath:
-                logger.warning(f"Отсутствует xpath в секции {tag_name}")
+        :return: Количество найденных ссылок.
+        """
+        found_count = 0
+        if tags_file == self.tags_paths['get_tags_44_new']:
+            table_name = 'links_documentation_44_fz'
+        elif tags_file == self.tags_paths['get_tags_223_new']:
+            table_name = 'links_documentation_223_fz'
+        else:
+            logger.error(f"Неизвестный файл тегов: {tags_file}")
+            return found_count
+
+        # Ссылки, ещё не записанные из буфера, не видны проверке _link_exists
+        buffered_links = set()
+        for entry in self._find_links(root, links_documentation_tags, contract_id):
+            found_count += 1
+            if update and (entry["document_links"] in buffered_links or self._link_exists(entry, tags_file)):
                 continue
+            buffered_links.add(entry["document_links"])
+            self.database_operations.buffer_insert(table_name, entry)
 
-            # Ищем элементы по заданному XPath
-            for elem in root.findall(xpath):
-                # Если нет file_name, используем default_file_name, если он есть, или пропускаем
-                file_name_tag = tag_data.get("file_name")
-                if not file_name_tag:
-                    # Если file_name отсутствует, используем default_file_name, если он есть
-                    file_name_tag = tag_data.get("default_file_name", tag_name)
+        # Оставшиеся в буфере ссылки записываются одним запросом
+        inserted_count = self.database_operations.flush_inserts()
+        if inserted_count is None:
+            logger.error(f"Не удалось записать ссылки на документацию в {table_name}")
+
+        # Возвращаем количество найденных ссылок
+        return found_count
+
+    def _link_exists(self, entry, tags_file):
+        """
+        Проверяет, записана ли ссылка на документацию в таблицу links_documentation_44_fz (или 223_fz).
+        """
+        table_name = ("links_documentation_44_fz" if tags_file == self.tags_paths['get_tags_44_new']
+                      else "links_documentation_223_fz")
+        return self.db_id_fetcher.fetch_id(table_name, "document_links", entry["document_links"]) is not None
 
-                file_name_elem = elem.find(file_name_tag)
-                url_elem = elem.find(tag_data.get("document_links"))
+    @staticmethod
+    def _find_links(root, links_documentation_tags, contract_id):
+        """
+        Находит ссылки на документацию по скомпилированной секции `links_documentation` (см. tag_specs).
 
-                file_name = file_name_elem.text.strip() if file_name_elem is not None and file_name_elem.text else file_name_tag
+        Если `file_name` не задан или не найден, используется `default_file_name`. Если не задан
+        `document_links`, ссылкой считается текст самого найденного элемента. При `first_only`
+        из секции берётся только первая найденная ссылка. Элементы перебираются через iterfind,
+        поэтому для документа в потоковом режиме ссылки читаются по одной, без хранения всех вложений.
+
+        :return: Генератор словарей {"file_name", "document_links", "contract_id"}.
+        """
+        for tag_data in links_documentation_tags.values():
+            # Ищем элементы по заданному XPath
+            for elem in root.iterfind(tag_data["xpath"]):
+                file_name_elem = elem.find(tag_data["file_name"]) if tag_data["file_name"] else None
+                url_elem = elem.find(tag_data["document_links"]) if tag_data["document_links"] else elem
+
+                file_name = (file_name_elem.text.strip() if file_name_elem is not None and file_name_elem.text
+                             else tag_data["default_file_name"])
                 url = url_elem.text.strip() if url_elem is not None and url_elem.text else None
 
-                # Если URL найден, добавляем информацию в список
+                # Если URL найден, отдаём информацию о ссылке
                 if url:
-                    found_tags.append({
+                    yield {
                         "file_name": file_name,
                         "document_links": url,
                         "contract_id": contract_id
-                    })
-
-        # Вставляем все собранные данные для соответствующей таблицы в базу
-        for entry in found_tags:
-            if entry:  # Если данные не пустые
-                if tags_file == self.tags_paths['get_tags_44_new']:
-                    inserted_id = self.database_operations.insert_link_documentation_44_fz(entry)
-                elif tags_file == self.tags_paths['get_tags_223_new']:
-                    inserted_id = self.database_operations.insert_link_documentation_223_fz(entry)
-                else:
-                    logger.error(f"Неизвестный файл тегов: {tags_file}")
-                    continue
-                logger.info(f"Вставленная запись в {tags_file} имеет id: {inserted_id}")
-
-        # Возвращаем все найденные данные
-        return found_tags
+                    }
+                    if tag_data["first_only"]:
+                        break
 
     def parse_customer(self, root, tags, tags_file):
         """
@@ -251,7 +308,7 @@ class XMLParser:
         found_tags = {}
 
         for tag, xpath in tags.items():
-            element = root.find(f".//{xpath}")
+            element = root.find(xpath)
 
             if element is None or element.text is None:
                 found_tags[tag] = None
@@ -298,12 +355,17 @@ class XMLParser:
 
         return customer_id
 
-    def parse_xml_tags(self, file_path, region_code, okpd_code, xml_folder_path):
+    def parse_xml_tags(self, file_path, region_code, okpd_code, xml_folder_path, document=None, update=False):
         """
         Функция для извлечения тегов для одной записи XML.
         :param file_path: Путь к конкретному XML файлу для обработки
         :param region_code: Код региона
         :param okpd_code: Код ОКПД для обработки
+        :param document: Документ XMLDocument, уже прочитанный и разобранный при проверке.
+                         Если не передан, файл file_path читается и разбирается здесь
+        :param update: True — документ является новой редакцией уже обработанного извещения (см. VersionIndex),
+                       запись контракта обновляется, а не вставляется
+        :raises xml.etree.ElementTree.ParseError: Если документ не является корректным XML.
         """
         logger.info(f"Обрабатываем файл: {file_path}")
 
@@ -316,32 +378,28 @@ class XMLParser:
             logger.error(f"Неизвестная папка: {xml_folder_path}")
             return None
 
-        # Загружаем теги из соответствующего JSON файла
-        tags = self.load_json_tags(tags_file)  # Определение файла тегов по пути
-
-        if not tags_file:
-            logger.error(f"Не удалось найти файл тегов для файла {file_path}")
-            return None
-
-        tags = self.load_json_tags(tags_file)
+        # Загружаем теги из соответствующего JSON файла (компилируются один раз на тип документа)
+        tags = get_tag_spec(tags_file)
         if not tags:
             logger.error("Не удалось загрузить теги из JSON.")
             return None
 
         # Загружаем и парсим XML
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
+            # Документ читается и разбирается один раз
+            if document is None:
+                document = XMLDocument(file_path)
 
-            # Удаляем пространства имен перед парсингом
-            cleaned_xml_content = self.remove_namespaces(xml_content)
+            # Элементы всех полей типа документа находятся за один обход (для больших документов — потоково)
+            document.prepare(get_field_extractor(tags_file))
 
-            tree = ET.ElementTree(ET.fromstring(cleaned_xml_content))
-            root = tree.getroot()
+            # Методы парсинга получают документ вместо корня: его find/findall кэшируют результаты поиска
+            root = document
 
         except ET.ParseError as e:
             logger.error(f"Ошибка при парсинге XML-файла {file_path}: {e}")
-            return
+            # Исключение откатывает единицу работы документа вместе с уже записанным именем файла
+            raise
 
         # Получаем данные о заказчике
         customer_id = self.parse_customer(
@@ -364,7 +422,8 @@ class XMLParser:
                 platform_id,
                 tags_file,
                 file_path,
-                xml_folder_path
+                xml_folder_path,
+                update
             )
         elif tags_file == self.tags_paths['get_tags_223_new']:
             contract_id = self.parse_reestr_contract_223_fz(
@@ -376,7 +435,8 @@ class XMLParser:
                 platform_id,
                 tags_file,
                 file_path,
-                xml_folder_path
+                xml_folder_path,
+                update
             )
 
         if not contract_id:
@@ -388,7 +448,8 @@ class XMLParser:
             root,
             tags.get('links_documentation', {}),
             contract_id,
-            tags_file
+            tags_file,
+            update
         )
 
         logger.info(f"Успешно обработан файл {file_path}")
@@ -3,11 +3,18 @@ import re
 import xml.etree.ElementTree as ET
 from loguru import logger
 
-from database_work.check_database import DatabaseCheckManager
 from database_work.database_operations import DatabaseOperations
 from database_work.database_id_fetcher import DatabaseIDFetcher
 from parsing_xml.xml_parser import XMLParser  # Импортируем родительский класс
 from file_delete.file_deleter import FileDeleter
+from parsing_xml.xml_document import XMLDocument
+from parsing_xml.field_extractor import get_field_extractor
+from parsing_xml.tag_specs import get_tag_spec, compile_path
+from runtime import get_runtime
+
+
+# Сроки исполнения контракта (берётся последний)
+EXECUTION_END_DATE_PATH = compile_path("executionPeriod/endDate")
 
 
 class AdvancedXMLParser(XMLParser):
@@ -18,7 +25,7 @@ class AdvancedXMLParser(XMLParser):
     def __init__(self, config_path="config.ini"):
 
         super().__init__(config_path)  # Инициализируем родительский класс XMLParser
-        self.database_check_manager = DatabaseCheckManager()  # Менеджер для проверки БД
+        self.database_check_manager = get_runtime(config_path).check_manager()  # Менеджер для проверки БД
 
     def parse_reestr_contract_44_fz_recouped(self, root, tags, id_contract_number, contractor_id, tags_file):
         """
@@ -28,8 +35,7 @@ class AdvancedXMLParser(XMLParser):
 
         # Парсинг общих данных
         for tag, xpath in tags.items():
-            tag_without_namespace = xpath.split(":")[-1]
-            elements = root.findall(f".//{tag_without_namespace}")  # Ищем элементы по пути
+            elements = root.findall(xpath)  # Ищем элементы по скомпилированному пути (см. tag_specs)
 
             if elements:
                 values = [elem.text.strip() for elem in elements if elem.text and elem.text.strip()]
@@ -43,7 +49,7 @@ class AdvancedXMLParser(XMLParser):
         logger.debug(f"Теги для контракта: {found_tags}")
 
         # Поиск всех тегов <endDate> в документе
-        end_dates = root.findall(".//executionPeriod/endDate")
+        end_dates = root.findall(EXECUTION_END_DATE_PATH)
 
         if end_dates:
             last_end_date = end_dates[-1].text.strip() if end_dates[-1].text else None
@@ -70,9 +76,9 @@ class AdvancedXMLParser(XMLParser):
 
         # Проходим по всем тегам
         for tag, xpath in tags.items():
-            element = root.find(f".//{xpath}")
+            element = root.find(xpath)
             if element is None:
-                logger.warning(f"Не найден тег '{tag}' по пути: .//{xpath}")
+                logger.warning(f"Не найден тег '{tag}' по пути: {xpath}")
                 found_tags[tag] = None
                 continue
 
@@ -109,49 +115,34 @@ class AdvancedXMLParser(XMLParser):
     def parse_links_documentation_recouped(self, root, id_contract_number, links_documentation_tags, tags_file):
         """
         Универсальный метод: загружает теги из JSON-файла и парсит XML.
-        """
-        found_tags = []
-
-        for tag_name, tag_data in links_documentation_tags.items():
-            xpath = tag_data.get("xpath")
-            if not xpath:
-                logger.warning(f"Отсутствует xpath в секции {tag_name}")
-                continue
-
-            for elem in root.findall(xpath):
-                file_name_tag = tag_data.get("file_name", tag_data.get("default_file_name", tag_name))
-                file_name_elem = elem.find(file_name_tag)
-                url_elem = elem.find(tag_data.get("document_links"))
-
-                file_name = file_name_elem.text.strip() if file_name_elem is not None and file_name_elem.text else file_name_tag
-                url = url_elem.text.strip() if url_elem is not None and url_elem.text else None
+        Ссылки накапливаются в буфере вставки по мере чтения документа и записываются многострочными
+        запросами (см. DatabaseOperations.buffer_insert).
 
-                if url:
-                    found_tags.append({
-                        "file_name": file_name,
-                        "document_links": url,
-                        "contract_id": id_contract_number
-                    })
-                    logger.info(f"Найдена ссылка для контракта {id_contract_number}: {url} ({file_name})")
-
-        for entry in found_tags:
-            logger.debug(f"Попытка вставки в базу: {entry}")
-            try:
-                inserted_id = self.database_operations.insert_link_documentation_44_fz(entry)
-                if inserted_id:
-                    logger.debug(
-                        f"Успешная вставка: контракт {entry['contract_id']}, файл {entry['file_name']}, ссылка {entry['document_links']}")
-                else:
-                    logger.warning(f"Не удалось вставить запись для контракта {entry['contract_id']}: {entry}")
-            except Exception as e:
-                logger.error(f"Ошибка при вставке в базу (контракт {entry['contract_id']}): {e}")
-                raise
+        :return: Количество найденных ссылок.
+        """
+        found_count = 0
+
+        for entry in self._find_links(root, links_documentation_tags, id_contract_number):
+            found_count += 1
+            logger.info(f"Найдена ссылка для контракта {id_contract_number}: {entry['document_links']} "
+                        f"({entry['file_name']})")
+            self.database_operations.buffer_insert('links_documentation_44_fz', entry)
+
+        # Оставшиеся в буфере ссылки записываются одним запросом
+        inserted_count = self.database_operations.flush_inserts()
+        if inserted_count is None:
+            logger.warning(f"Не удалось вставить ссылки для контракта {id_contract_number}")
+        else:
+            logger.debug(f"Для контракта {id_contract_number} записано ссылок: {inserted_count} из {found_count}")
 
-        return found_tags
+        return found_count
 
-    def parse_xml_tags_recouped_contract(self, file_path, contract_number, xml_folder_path):
+    def parse_xml_tags_recouped_contract(self, file_path, contract_number, xml_folder_path, document=None):
         """
         Функция для извлечения тегов для одной записи XML.
+
+        :param document: Документ XMLDocument, уже прочитанный и разобранный при проверке.
+                         Если не передан, файл file_path читается и разбирается здесь
         """
         logger.info(f"Обрабатываем файл: {file_path}")
 
@@ -164,8 +155,8 @@ class AdvancedXMLParser(XMLParser):
             logger.error(f"Неизвестная папка: {xml_folder_path}")
             raise ValueError(f"Неизвестная папка: {xml_folder_path}")  # Прекращаем выполнение программы
 
-        # Загружаем теги из соответствующего JSON файла
-        tags = self.load_json_tags(tags_file)
+        # Загружаем теги из соответствующего JSON файла (компилируются один раз на тип документа)
+        tags = get_tag_spec(tags_file)
 
         if not tags:
             logger.error("Не удалось загрузить теги из JSON.")
@@ -173,14 +164,15 @@ class AdvancedXMLParser(XMLParser):
 
         # Загружаем и парсим XML
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
+            # Документ читается и разбирается один раз
+            if document is None:
+                document = XMLDocument(file_path)
 
-            # Удаляем пространства имен перед парсингом
-            cleaned_xml_content = self.remove_namespaces(xml_content)
+            # Элементы всех полей типа документа находятся за один обход (для больших документов — потоково)
+            document.prepare(get_field_extractor(tags_file, (EXECUTION_END_DATE_PATH,)))
 
-            tree = ET.ElementTree(ET.fromstring(cleaned_xml_content))
-            root = tree.getroot()
+            # Методы парсинга получают документ вместо корня: его find/findall кэшируют результаты поиска
+            root = document
 
         except ET.ParseError as e:
             logger.error(f"Ошибка при парсинге XML-файла {file_path}: {e}")
@@ -0,0 +1,185 @@
+import os
+import json
+import threading
+from datetime import datetime
+from loguru import logger
+
+from secondary_functions import load_config
+
+
+class RequestPlanner:
+    """
+    Планировщик матрицы запросов к ЕИС (дата, регион, подсистема, тип документа).
+
+    Подсистемы и типы документов берутся из секции `[eis]`: списки `subsystems_44` и `subsystems_223`
+    и для каждой подсистемы ключ `documentType<закон>_<подсистема>` (например, `documentType44_PRIZ`).
+    Повторяющиеся ячейки отбрасываются.
+
+    По истории запросов ячейки, которые `deprioritise_after_empty_days` дней подряд не вернули ни одного
+    `archiveUrl`, переносятся в конец плана, а после `skip_after_empty_days` дней — пропускаются
+    (раз в `recheck_days` дней такая ячейка всё равно запрашивается для проверки). Пропускаются только даты
+    после последней проверенной: более ранние даты (догрузка истории) запрашиваются с пониженным приоритетом.
+    """
+
+    LAWS = ("44", "223")
+
+    def __init__(self, regions, config_path="config.ini"):
+        """
+        :param regions: Список кодов регионов.
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.regions = list(dict.fromkeys(regions))
+        self.history_file = self.config.get("planner", "history_file", fallback="request_history.json")
+        self.deprioritise_after = self.config.getint("planner", "deprioritise_after_empty_days", fallback=3)
+        self.skip_after = self.config.getint("planner", "skip_after_empty_days", fallback=14)
+        self.recheck_days = self.config.getint("planner", "recheck_days", fallback=7)
+
+        self._history_lock = threading.Lock()
+        self.history = self.load_history()
+
+        # Ячейки, пропущенные при последнем построении плана
+        self.skipped = []
+
+    def get_document_types(self):
+        """
+        Читает подсистемы и типы документов из секции `[eis]`.
+
+        :return: Словарь {подсистема: [типы документов]} в порядке конфигурации, без повторов.
+        """
+        document_types = {}
+
+        for law in self.LAWS:
+            subsystems = self.config.get("eis", f"subsystems_{law}", fallback="")
+            for subsystem in (s.strip() for s in subsystems.split(",")):
+                if not subsystem:
+                    continue
+
+                option = f"documentType{law}_{subsystem}"
+                if not self.config.has_option("eis", option):
+                    logger.error(f"В секции [eis] нет типов документов {option} для подсистемы {subsystem}")
+                    continue
+
+                types = [doc.strip() for doc in self.config.get("eis", option).split(",") if doc.strip()]
+                document_types.setdefault(subsystem, [])
+                document_types[subsystem] = list(dict.fromkeys(document_types[subsystem] + types))
+
+        return document_types
+
+    def build_plan(self, dates):
+        """
+        Строит план запросов по всем датам, регионам, подсистемам и типам документов.
+
+        :param dates: Список дат в формате "YYYY-MM-DD".
+        :return: Список кортежей (date, region_code, subsystem, document_type): сначала обычные ячейки,
+                 затем ячейки с пониженным приоритетом. Пропущенные ячейки сохраняются в `self.skipped`.
+        """
+        document_types = self.get_document_types()
+        regular, deprioritised, self.skipped = [], [], []
+        seen = set()
+
+        for date in dict.fromkeys(dates):
+            for region_code in self.regions:
+                for subsystem, types in document_types.items():
+                    for document_type in types:
+                        cell = (date, region_code, subsystem, document_type)
+                        if cell in seen:
+                            continue
+                        seen.add(cell)
+
+                        priority = self._get_priority(date, region_code, subsystem, document_type)
+                        if priority == "skip":
+                            self.skipped.append(cell)
+                        elif priority == "low":
+                            deprioritised.append(cell)
+                        else:
+                            regular.append(cell)
+
+        return regular + deprioritised
+
+    def _get_priority(self, date, region_code, subsystem, document_type):
+        """
+        Определяет приоритет ячейки по истории пустых ответов.
+
+        :return: "normal", "low" или "skip".
+        """
+        with self._history_lock:
+            entry = self.history.get(self._history_key(region_code, subsystem, document_type))
+
+        if not entry:
+            return "normal"
+
+        empty_streak = entry.get("empty_streak", 0)
+        if empty_streak >= self.skip_after:
+            days_since_check = (self._parse_date(date) - self._parse_date(entry["last_date"])).days
+            # Серия пустых ответов говорит только о датах после уже проверенных: даты не позже last_date
+            # (догрузка истории) запрашиваются, иначе record_result их не учтёт и серия не прервётся
+            return "skip" if 0 < days_since_check < self.recheck_days else "low"
+        if empty_streak >= self.deprioritise_after:
+            return "low"
+        return "normal"
+
+    def record_result(self, date, region_code, subsystem, document_type, archives_count):
+        """
+        Учитывает результат запроса в истории ячейки.
+
+        :param date: Дата запроса в формате "YYYY-MM-DD".
+        :param archives_count: Количество полученных `archiveUrl`.
+        """
+        key = self._history_key(region_code, subsystem, document_type)
+        with self._history_lock:
+            entry = self.history.setdefault(key, {"empty_streak": 0, "last_date": date})
+            # Порядок дат при параллельной обработке не гарантирован, учитываем только более поздние
+            if self._parse_date(date) < self._parse_date(entry["last_date"]):
+                return
+            entry["empty_streak"] = 0 if archives_count else entry["empty_streak"] + 1
+            entry["last_date"] = date
+
+    def load_history(self):
+        """
+        Загружает историю пустых ответов из JSON-файла.
+
+        :return: Словарь {"регион|подсистема|тип": {"empty_streak": n, "last_date": "YYYY-MM-DD"}}.
+        """
+        if not os.path.exists(self.history_file):
+            return {}
+        try:
+            with open(self.history_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить историю запросов {self.history_file}: {e}")
+            return {}
+
+    def save_history(self):
+        """
+        Сохраняет историю пустых ответов в JSON-файл.
+        """
+        with self._history_lock:
+            with open(self.history_file, "w", encoding="utf-8") as file:
+                json.dump(self.history, file, indent=4, ensure_ascii=False)
+
+    def log_plan(self, plan):
+        """
+        Выводит план запросов: общее количество, разбивку по подсистемам и типам документов и пропуски.
+
+        :param plan: Список ячеек, построенный build_plan.
+        """
+        counts = {}
+        for _, _, subsystem, document_type in plan:
+            counts[(subsystem, document_type)] = counts.get((subsystem, document_type), 0) + 1
+
+        for (subsystem, document_type), count in counts.items():
+            logger.info(f"  {subsystem} / {document_type}: {count}")
+        logger.info(f"Запланировано запросов: {len(plan)}, пропущено по истории пустых ответов: {len(self.skipped)}")
+
+    @staticmethod
+    def _history_key(region_code, subsystem, document_type):
+        return f"{region_code}|{subsystem}|{document_type}"
+
+    @staticmethod
+    def _parse_date(value):
+        return datetime.strptime(value, "%Y-%m-%d")
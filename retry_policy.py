@@ -0,0 +1,279 @@
+import random
+import re
+import threading
+import time
+import requests
+from loguru import logger
+
+from secondary_functions import load_config
+
+
+# Классы ошибок, по которым принимается решение о повторе
+RESET = "reset"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+SOAP_FAULT = "soap_fault"
+CLIENT_ERROR = "client_error"
+AUTH_ERROR = "auth_error"
+OTHER = "other"
+
+# HTTP-коды и текст SOAP Fault, по которым ошибка считается ошибкой авторизации (проблема токена)
+AUTH_STATUS_CODES = {401, 403}
+AUTH_FAULT_PATTERN = re.compile(r"token|токен|авториз|authori[sz]|authenticat|access denied|доступ запрещ|forbidden",
+                                re.IGNORECASE)
+
+
+class SoapFaultError(requests.exceptions.RequestException):
+    """
+    Ответ сервера содержит SOAP Fault.
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    Вызов отклонён, потому что автомат (circuit breaker) для ключа разомкнут.
+    """
+
+    def __init__(self, key, remaining):
+        super().__init__(f"Автомат для {key} разомкнут, повтор через {remaining:.0f} с")
+        self.key = key
+        self.remaining = remaining
+
+
+def raise_for_soap_fault(response):
+    """
+    Выбрасывает SoapFaultError, если тело ответа содержит SOAP Fault.
+
+    :param response: Объект requests.Response.
+    :raises SoapFaultError: Если в ответе найден элемент Fault.
+    """
+    if ":Fault>" in response.text or "<Fault>" in response.text:
+        raise SoapFaultError(f"SOAP Fault (HTTP {response.status_code})", response=response)
+
+
+def classify_error(error):
+    """
+    Определяет класс ошибки для политики повторов.
+
+    :param error: Исключение, возникшее при вызове.
+    :return: Один из классов: reset, timeout, server_error, soap_fault, client_error, auth_error, other.
+             auth_error — 401/403 или SOAP Fault об ошибке токена; остальные 4xx (например, 404/410 для
+             устаревшей ссылки на архив) — client_error.
+    """
+    if isinstance(error, SoapFaultError):
+        response = error.response
+        if response is not None and (response.status_code in AUTH_STATUS_CODES
+                                     or AUTH_FAULT_PATTERN.search(response.text)):
+            return AUTH_ERROR
+        return SOAP_FAULT
+    if isinstance(error, requests.exceptions.Timeout):
+        return TIMEOUT
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # "Connection aborted", ConnectionResetError, отказ в подключении к stunnel
+        return RESET
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status_code = error.response.status_code
+        if status_code in AUTH_STATUS_CODES:
+            return AUTH_ERROR
+        return SERVER_ERROR if status_code >= 500 else CLIENT_ERROR
+    if isinstance(error, (ConnectionResetError, ConnectionAbortedError)):
+        return RESET
+    return OTHER
+
+
+class CircuitBreaker:
+    """
+    Автомат, временно отключающий отдельный ключ (эндпоинт или регион) после серии ошибок.
+
+    После `failure_threshold` ошибок подряд ключ размыкается на `reset_timeout` секунд:
+    вызовы для него сразу отклоняются, а остальные ключи продолжают работать.
+    По истечении паузы пропускается один пробный вызов; при успехе ключ замыкается снова.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=120):
+        """
+        :param failure_threshold: Количество ошибок подряд, после которого ключ размыкается.
+        :param reset_timeout: Пауза в секундах перед пробным вызовом.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+        self.trips = 0
+
+    def remaining(self, key):
+        """
+        Возвращает, сколько секунд ключ ещё будет разомкнут (0, если замкнут).
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - opened_at))
+
+    def allow(self, key):
+        """
+        Проверяет, можно ли выполнить вызов для ключа.
+
+        :return: True, если ключ замкнут или пауза истекла (пробный вызов).
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # Полуоткрытое состояние: пропускаем пробный вызов и снова ждём его результата
+                self._opened_at[key] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+            if self._opened_at.pop(key, None) is not None:
+                logger.info(f"Автомат для {key} снова замкнут.")
+
+    def record_failure(self, key):
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+            if self._failures[key] >= self.failure_threshold and key not in self._opened_at:
+                self._opened_at[key] = time.monotonic()
+                self.trips += 1
+                logger.warning(f"Автомат для {key} разомкнут на {self.reset_timeout} с после "
+                               f"{self._failures[key]} ошибок подряд.")
+
+
+class RetryPolicy:
+    """
+    Политика повторов с экспоненциальной задержкой со случайным разбросом (full jitter) и автоматом по ключам.
+
+    Задержки измеряются в секундах, ожидание блокирует только вызывающий поток,
+    поэтому остальные запросы в пуле продолжают выполняться.
+    """
+
+    def __init__(self, name, config_path="config.ini"):
+        """
+        Загружает параметры политики из секции `[retry]` конфигурации.
+
+        :param name: Имя политики для логов и статистики (например, "soap" или "download").
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.name = name
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.max_attempts = max(1, self.config.getint("retry", "max_attempts", fallback=5))
+        self.base_delay = self.config.getfloat("retry", "base_delay", fallback=2)
+        self.max_delay = self.config.getfloat("retry", "max_delay", fallback=60)
+        self.retry_on = {
+            kind.strip()
+            for kind in self.config.get("retry", "retry_on", fallback="reset,timeout,server_error").split(",")
+        }
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.config.getint("retry", "breaker_failures", fallback=5),
+            reset_timeout=self.config.getfloat("retry", "breaker_reset", fallback=120),
+        )
+
+        self._stats_lock = threading.Lock()
+        self.retries = {}
+        self.failures = {}
+        self.backoff_seconds = 0.0
+        self.rejected = 0
+
+    def backoff(self, attempt):
+        """
+        Вычисляет задержку перед повтором.
+
+        :param attempt: Номер неудавшейся попытки, начиная с 1.
+        :return: Задержка в секундах в диапазоне [0, min(max_delay, base_delay * 2^(attempt-1))].
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, func, key="default", description=""):
+        """
+        Выполняет вызов с повторами для ошибок из `retry_on`.
+
+        :param func: Функция без аргументов, выполняющая запрос.
+        :param key: Ключ автомата (эндпоинт или регион).
+        :param description: Описание вызова для логов.
+        :return: Результат func().
+        :raises CircuitOpenError: Если автомат для ключа разомкнут.
+        :raises Exception: Последняя ошибка, если она не подлежит повтору или попытки исчерпаны.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow(key):
+                with self._stats_lock:
+                    self.rejected += 1
+                raise CircuitOpenError(key, self.breaker.remaining(key))
+
+            try:
+                result = func()
+                self.breaker.record_success(key)
+                return result
+
+            except Exception as e:
+                kind = classify_error(e)
+                with self._stats_lock:
+                    self.failures[kind] = self.failures.get(kind, 0) + 1
+
+                if kind not in self.retry_on:
+                    logger.error(f"{description}: ошибка ({kind}) не подлежит повтору: {e}")
+                    raise
+
+                self.breaker.record_failure(key)
+                if attempt == self.max_attempts:
+                    logger.error(f"{description}: попытки исчерпаны ({self.max_attempts}), последняя ошибка ({kind}): {e}")
+                    raise
+
+                delay = self.backoff(attempt)
+                with self._stats_lock:
+                    self.retries[kind] = self.retries.get(kind, 0) + 1
+                    self.backoff_seconds += delay
+
+                logger.warning(f"{description}: ошибка ({kind}), попытка {attempt}/{self.max_attempts}, "
+                               f"повтор через {delay:.1f} с: {e}")
+                time.sleep(delay)
+
+    def get_stats(self):
+        """
+        :return: Словарь со статистикой: повторы и ошибки по классам, время ожидания, срабатывания автомата.
+        """
+        with self._stats_lock:
+            return {
+                "retries": dict(self.retries),
+                "failures": dict(self.failures),
+                "backoff_seconds": round(self.backoff_seconds, 1),
+                "breaker_trips": self.breaker.trips,
+                "rejected": self.rejected,
+            }
+
+    def log_stats(self):
+        """
+        Логирует статистику повторов политики.
+        """
+        stats = self.get_stats()
+        logger.info(
+            f"Повторы ({self.name}): {sum(stats['retries'].values())} {stats['retries']}, "
+            f"ожидание {stats['backoff_seconds']} с, ошибок {stats['failures']}, "
+            f"срабатываний автомата {stats['breaker_trips']}, отклонено вызовов {stats['rejected']}")
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_retry_policy(name, config_path="config.ini"):
+    """
+    Возвращает общую для процесса политику повторов с указанным именем, создавая её при первом обращении.
+
+    :param name: Имя политики (например, "soap" или "download").
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр RetryPolicy.
+    """
+    with _policies_lock:
+        if name not in _policies:
+            _policies[name] = RetryPolicy(name, config_path)
+        return _policies[name]
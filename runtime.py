@@ -0,0 +1,174 @@
+import threading
+from contextlib import contextmanager
+from loguru import logger
+
+from secondary_functions import load_config
+from database_work.connection_pool import get_connection_pool, close_connection_pool
+from database_work.database_connection import DatabaseManager
+from database_work.database_id_fetcher import DatabaseIDFetcher
+from database_work.database_operations import DatabaseOperations
+from database_work.check_database import DatabaseCheckManager
+from database_work.reference_cache import get_reference_cache
+from parsing_xml.tag_specs import get_tag_spec
+from parsing_xml.field_extractor import get_field_extractor
+
+
+class RuntimeContext:
+    """
+    Общие для компонентов объекты процесса: конфигурация, пул соединений с БД, кэш справочников
+    и скомпилированные теги.
+
+    Объекты работы с БД (DatabaseIDFetcher, DatabaseOperations, DatabaseCheckManager) доступны внутри сеанса
+    (см. session): соединение берётся из пула на время обработки архива или документа и возвращается в пул
+    при выходе из сеанса, поэтому потоков может быть больше, чем соединений в пуле. Внутри сеанса объекты
+    создаются один раз и используют общий DatabaseManager сеанса — одно соединение вместо нового соединения
+    на каждый файл и объект. Соединение не передаётся между потоками, поэтому транзакции разных потоков
+    не смешиваются. Соединение, простоявшее дольше `[db] health_check_seconds`, перед использованием
+    проверяется запросом `SELECT 1`; если оно разорвано, соединение и объекты сеанса создаются заново.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.pool = get_connection_pool(config_path)
+        self.reference_cache = get_reference_cache(config_path)
+        self._local = threading.local()
+
+    def tag_spec(self, tags_file):
+        """
+        Скомпилированные теги для файла тегов (см. tag_specs.get_tag_spec).
+        """
+        return get_tag_spec(tags_file)
+
+    def field_extractor(self, tags_file, extra_paths=()):
+        """
+        Сопоставитель путей для файла тегов (см. field_extractor.get_field_extractor).
+        """
+        return get_field_extractor(tags_file, extra_paths)
+
+    @contextmanager
+    def session(self):
+        """
+        Сеанс работы с БД текущего потока (обработка архива или документа):
+
+            with runtime.session():
+                process_okpd_file(document, runtime.id_fetcher(), region_code, folder_path)
+
+        Соединение берётся из пула при входе во внешний сеанс и возвращается в пул при выходе из него,
+        вложенные сеансы используют то же соединение.
+
+        :return: DatabaseManager сеанса.
+        :raises database_work.connection_pool.PoolTimeoutError: Если свободное соединение не появилось
+                                                                 за `[db] acquire_timeout` секунд.
+        """
+        depth = getattr(self._local, "depth", 0)
+        if not depth:
+            self._local.db_manager = DatabaseManager()
+        self._local.depth = depth + 1
+        try:
+            yield self._local.db_manager
+        finally:
+            self._local.depth = depth
+            if not depth:
+                db_manager = getattr(self._local, "db_manager", None)
+                # Объекты сеанса привязаны к возвращаемому соединению
+                self._local.__dict__.clear()
+                if db_manager is not None:
+                    db_manager.close()
+
+    def db_manager(self):
+        """
+        :return: DatabaseManager текущего сеанса (соединение из пула).
+        :raises RuntimeError: Если вызван вне сеанса (см. session).
+        """
+        if not getattr(self._local, "depth", 0):
+            raise RuntimeError("Соединение с БД доступно только внутри сеанса runtime.session()")
+        db_manager = self._local.db_manager
+        if not db_manager.is_alive(self.pool.health_check_seconds):
+            logger.warning(f"Соединение с БД потока {threading.current_thread().name} разорвано, "
+                           f"получаем новое.")
+            db_manager.close()
+            # Объекты сеанса привязаны к прежнему соединению, создаём их заново
+            depth = self._local.depth
+            self._local.__dict__.clear()
+            self._local.depth = depth
+            db_manager = self._local.db_manager = DatabaseManager()
+        return db_manager
+
+    def _thread_object(self, name, factory):
+        """
+        Возвращает объект работы с БД текущего сеанса, создавая его при первом обращении.
+        """
+        db_manager = self.db_manager()
+        instance = getattr(self._local, name, None)
+        if instance is None:
+            instance = factory(db_manager)
+            setattr(self._local, name, instance)
+        return instance
+
+    def id_fetcher(self):
+        """
+        :return: DatabaseIDFetcher текущего сеанса.
+        """
+        return self._thread_object("id_fetcher", DatabaseIDFetcher)
+
+    def db_operations(self):
+        """
+        :return: DatabaseOperations текущего сеанса.
+        """
+        return self._thread_object(
+            "db_operations", lambda db_manager: DatabaseOperations(self.config_path, db_manager))
+
+    def check_manager(self):
+        """
+        :return: DatabaseCheckManager текущего сеанса.
+        """
+        return self._thread_object("check_manager", DatabaseCheckManager)
+
+    def warm_up(self):
+        """
+        Загружает небольшие справочники в кэш до начала обработки (см. ReferenceCache.preload).
+        """
+        self.reference_cache.preload()
+
+    def close(self):
+        """
+        Закрывает пул соединений.
+        """
+        close_connection_pool()
+
+
+_shared_runtime = None
+_shared_runtime_lock = threading.Lock()
+
+
+def get_runtime(config_path="config.ini"):
+    """
+    Возвращает общий для процесса контекст, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр RuntimeContext.
+    """
+    global _shared_runtime
+    with _shared_runtime_lock:
+        if _shared_runtime is None:
+            _shared_runtime = RuntimeContext(config_path)
+        return _shared_runtime
+
+
+def close_runtime():
+    """
+    Закрывает общий контекст (пул соединений), если он был создан.
+    """
+    global _shared_runtime
+    with _shared_runtime_lock:
+        runtime, _shared_runtime = _shared_runtime, None
+    if runtime is not None:
+        runtime.close()
@@ -115,6 +115,40 @@ def load_token(config):
     return token
 
 
+def load_tokens(config):
+    """
+    Загружает список токенов из .env файла, путь к которому хранится в config.ini.
+
+    Токены перечисляются через запятую в переменной TOKENS. К токену можно привязать локальный порт
+    stunnel в виде `токен@порт`. Если TOKENS не задана, используется единственный TOKEN.
+
+    :param config: Объект конфигурации, в котором хранится путь к .env файлу.
+    :return: Список кортежей (токен, порт или None). Пустой список, если токены не найдены.
+    """
+    env_path = config.get("path", "env_file", fallback=None)
+    if not env_path or not check_file_exists(os.path.normpath(env_path), ".env"):
+        logger.error("Файл .env с токенами не найден.")
+        return []
+
+    load_dotenv(os.path.normpath(env_path))
+    tokens_value = os.getenv("TOKENS")
+
+    if not tokens_value:
+        token = os.getenv("TOKEN")
+        return [(token, None)] if token else []
+
+    tokens = []
+    for item in tokens_value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        value, _, port = item.partition("@")
+        tokens.append((value, int(port) if port else None))
+
+    logger.info(f"Загружено токенов: {len(tokens)}")
+    return tokens
+
+
 # --- Основной блок кода ---
 if __name__ == "__main__":
     config = load_config()
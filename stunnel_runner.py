@@ -1,4 +1,6 @@
 import subprocess
+import shlex
+import shutil
 from loguru import logger
 import os
 
@@ -6,13 +8,20 @@ from secondary_functions import load_config
 
 
 class StunnelRunner:
-    def __init__(self, config_path="config.ini"):
+    def __init__(self, config_path="config.ini", config_file=None, port=None):
         """
         Инициализирует объект StunnelRunner, загружает настройки из конфигурации и проверяет существование необходимых файлов.
 
+        Исполняемый файл задаётся параметром `stunnel_exe` секции [stunnel] (по умолчанию stunnel_msspi.exe):
+        он ищется в `stunnel_dir`, затем в PATH (например, `stunnel` в Linux). Вместо stunnel можно указать
+        произвольную команду в параметре `command` (например, TCP-форвардер для тестов); в ней доступны
+        подстановки {port} и {config_file}.
+
         :param config_path: Путь к файлу конфигурации (по умолчанию "config.ini").
+        :param config_file: Файл конфигурации stunnel для этого экземпляра (по умолчанию из config.ini).
+        :param port: Локальный порт экземпляра (используется в подстановке {port} параметра `command`).
         :raises ValueError: Если не удается загрузить конфигурацию.
-        :raises FileNotFoundError: Если не найден файл stunnel_msspi.exe по указанному пути.
+        :raises FileNotFoundError: Если не найден исполняемый файл stunnel.
         """
         
         # Загружаем настройки из конфигурации
@@ -22,12 +31,31 @@ class StunnelRunner:
 
         # Получаем настройки из конфигурационного файла
         self.stunnel_dir = self.config.get('stunnel', 'stunnel_dir', fallback=".")  # Путь к директории с stunnel
-        self.config_file = self.config.get('stunnel', 'config_file', fallback="stunnel.conf")  # Путь к файлу конфигурации
+        self.config_file = config_file or self.config.get('stunnel', 'config_file', fallback="stunnel.conf")  # Путь к файлу конфигурации
+        self.port = port
+        self.command_template = self.config.get('stunnel', 'command', fallback=None)  # Команда вместо stunnel
+
+        self.stunnel_exe = None
+        if not self.command_template:
+            # Формируем путь к исполняемому файлу stunnel (stunnel_msspi.exe или stunnel из PATH)
+            exe_name = self.config.get('stunnel', 'stunnel_exe', fallback="stunnel_msspi.exe")
+            self.stunnel_exe = os.path.join(self.stunnel_dir, exe_name)
+            if not os.path.exists(self.stunnel_exe):
+                self.stunnel_exe = shutil.which(exe_name)
+            if not self.stunnel_exe:
+                raise FileNotFoundError(f"Файл {exe_name} не найден ни в {self.stunnel_dir}, ни в PATH! Проверьте путь в конфигурации.")  # Ошибка, если файл не найден
+
+        self.process = None
+
+    def build_command(self):
+        """
+        Формирует команду запуска stunnel или заданной в конфигурации замены.
 
-        # Формируем путь к исполняемому файлу stunnel_msspi.exe
-        self.stunnel_exe = os.path.join(self.stunnel_dir, "stunnel_msspi.exe")
-        if not os.path.exists(self.stunnel_exe):
-            raise FileNotFoundError(f"Файл {self.stunnel_exe} не найден! Проверьте путь в конфигурации.")  # Ошибка, если файл не найден
+        :return: Список аргументов команды.
+        """
+        if self.command_template:
+            return shlex.split(self.command_template.format(port=self.port, config_file=self.config_file), posix=os.name != "nt")
+        return [self.stunnel_exe, self.config_file]
 
     def run_stunnel(self):
         """
@@ -37,14 +65,17 @@ class StunnelRunner:
         :raises Exception: При возникновении ошибки во время запуска stunnel.
         """
         # Формируем команду для запуска stunnel с указанием исполняемого файла и конфигурации
-        command = [self.stunnel_exe, self.config_file]
+        command = self.build_command()
+
+        # Для нескольких экземпляров логи пишутся в отдельные файлы
+        log_name = f"stunnel_{self.port}.log" if self.port else "stunnel.log"
 
         try:
             # Логируем команду перед запуском
             logger.info(f"Запускаю stunnel: {' '.join(command)} в {self.stunnel_dir}")
 
             # Открываем файл для записи логов stunnel
-            with open(os.path.join(self.stunnel_dir, "stunnel.log"), "w") as log_file:
+            with open(os.path.join(self.stunnel_dir, log_name), "w") as log_file:
                 # Запускаем процесс stunnel, перенаправляем stdout и stderr в log_file
                 proc = subprocess.Popen(command, cwd=self.stunnel_dir, stdout=log_file, stderr=subprocess.STDOUT)
 
@@ -52,9 +83,33 @@ class StunnelRunner:
             logger.info("stunnel успешно запущен (процесс выполняется в фоне).")
 
             # Возвращаем объект процесса, если нужно контролировать выполнение
+            self.process = proc
             return proc
 
         except Exception as e:
             # Логируем ошибку, если не удалось запустить stunnel
             logger.error(f"Ошибка при запуске stunnel: {e}")
             return None  # Возвращаем None в случае ошибки
+
+    def is_running(self):
+        """
+        Проверяет, что процесс stunnel запущен и не завершился.
+
+        :return: True, если процесс работает.
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=5):
+        """
+        Останавливает процесс stunnel.
+
+        :param timeout: Время ожидания завершения процесса в секундах, после которого процесс принудительно убивается.
+        """
+        if not self.is_running():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
@@ -0,0 +1,189 @@
+import itertools
+import socket
+import threading
+import time
+from loguru import logger
+
+from secondary_functions import load_config
+from stunnel_runner import StunnelRunner
+
+
+class StunnelSupervisor:
+    """
+    Супервизор экземпляров stunnel.
+
+    Запускает по одному экземпляру StunnelRunner на каждый локальный порт из параметра `ports`
+    секции [stunnel], дожидается, пока порт начнёт принимать соединения, и в фоновом потоке
+    периодически проверяет процессы и порты. Упавший экземпляр перезапускается.
+    Запросы к ЕИС распределяются по исправным экземплярам по кругу (next_port).
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию или количество файлов конфигурации
+                            stunnel не совпадает с количеством портов.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.host = self.config.get("stunnel", "host", fallback="127.0.0.1")
+        self.ready_timeout = self.config.getfloat("stunnel", "ready_timeout", fallback=15)
+        self.health_interval = self.config.getfloat("stunnel", "health_interval", fallback=5)
+
+        ports = [int(port) for port in self.config.get("stunnel", "ports", fallback="8080").split(",")]
+        config_files = [
+            name.strip()
+            for name in self.config.get("stunnel", "config_files",
+                                        fallback=self.config.get("stunnel", "config_file", fallback="stunnel.conf")).split(",")
+        ]
+        if len(config_files) == 1:
+            config_files = config_files * len(ports)
+        if len(config_files) != len(ports):
+            raise ValueError("Количество файлов config_files должно совпадать с количеством портов ports!")
+
+        # Каждому порту свой экземпляр stunnel со своим файлом конфигурации
+        self.instances = [
+            {"port": port, "runner": StunnelRunner(config_path, config_file, port), "healthy": False, "restarts": 0}
+            for port, config_file in zip(ports, config_files)
+        ]
+
+        self._lock = threading.Lock()
+        self._round_robin = itertools.cycle(self.instances)
+        self._stop_event = threading.Event()
+        self._health_thread = None
+
+    def start(self):
+        """
+        Запускает все экземпляры, ждёт их готовности и запускает фоновую проверку здоровья.
+
+        :return: True, если готов хотя бы один экземпляр.
+        """
+        for instance in self.instances:
+            self._launch(instance)
+
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="stunnel-health", daemon=True)
+        self._health_thread.start()
+
+        ready = sum(instance["healthy"] for instance in self.instances)
+        logger.info(f"Готово экземпляров stunnel: {ready} из {len(self.instances)}")
+
+        global _active_supervisor
+        _active_supervisor = self
+        return ready > 0
+
+    def stop(self):
+        """
+        Останавливает фоновую проверку и все экземпляры stunnel.
+        """
+        global _active_supervisor
+        if _active_supervisor is self:
+            _active_supervisor = None
+
+        self._stop_event.set()
+        if self._health_thread:
+            self._health_thread.join(timeout=self.health_interval + 1)
+
+        for instance in self.instances:
+            instance["runner"].stop()
+            instance["healthy"] = False
+        logger.info("Экземпляры stunnel остановлены.")
+
+    def _launch(self, instance):
+        """
+        Запускает экземпляр и ожидает готовности его порта.
+        """
+        instance["runner"].run_stunnel()
+        instance["healthy"] = self.wait_ready(instance)
+        if instance["healthy"]:
+            logger.info(f"stunnel на порту {instance['port']} принимает соединения.")
+        else:
+            logger.error(f"stunnel на порту {instance['port']} не стал доступен за {self.ready_timeout} с.")
+
+    def probe(self, port, timeout=1.0):
+        """
+        Проверяет, что локальный порт принимает TCP-соединения.
+
+        :param port: Локальный порт.
+        :param timeout: Таймаут подключения в секундах.
+        :return: True, если подключение установлено.
+        """
+        try:
+            with socket.create_connection((self.host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    def wait_ready(self, instance):
+        """
+        Ждёт, пока порт экземпляра начнёт принимать соединения.
+
+        :return: True, если порт готов до истечения `ready_timeout`, False — если время вышло или процесс завершился.
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if not instance["runner"].is_running():
+                return False
+            if self.probe(instance["port"]):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def restart(self, instance):
+        """
+        Перезапускает экземпляр stunnel.
+        """
+        logger.warning(f"Перезапуск stunnel на порту {instance['port']}...")
+        instance["healthy"] = False
+        instance["runner"].stop()
+        self._launch(instance)
+        instance["restarts"] += 1
+
+    def _health_loop(self):
+        """
+        Периодически проверяет процессы и порты экземпляров и перезапускает упавшие.
+        """
+        while not self._stop_event.wait(self.health_interval):
+            for instance in self.instances:
+                if self._stop_event.is_set():
+                    return
+                if instance["runner"].is_running() and self.probe(instance["port"]):
+                    instance["healthy"] = True
+                    continue
+
+                logger.error(f"stunnel на порту {instance['port']} не отвечает.")
+                self.restart(instance)
+
+    def next_port(self):
+        """
+        Возвращает порт следующего исправного экземпляра (по кругу).
+
+        :return: Номер порта; если исправных нет — порт первого экземпляра.
+        """
+        with self._lock:
+            for _ in range(len(self.instances)):
+                instance = next(self._round_robin)
+                if instance["healthy"]:
+                    return instance["port"]
+        return self.instances[0]["port"]
+
+    def get_stats(self):
+        """
+        :return: Список состояний экземпляров: порт, исправность, количество перезапусков.
+        """
+        return [
+            {"port": instance["port"], "healthy": instance["healthy"], "restarts": instance["restarts"]}
+            for instance in self.instances
+        ]
+
+
+_active_supervisor = None
+
+
+def get_supervisor():
+    """
+    Возвращает запущенный супервизор stunnel или None, если он не запущен.
+    """
+    return _active_supervisor
@@ -0,0 +1,91 @@
+"""
+Синтетические документы ЕИС для тестов и замеров (benchmarks/).
+"""
+import os
+
+NAMESPACES = ('xmlns:ns7="http://zakupki.gov.ru/oos/export/1" '
+              'xmlns:ns4="http://zakupki.gov.ru/oos/common/1"')
+
+
+def positions_xml(count, okpd_code=None):
+    """
+    Позиции закупки: коды ОКПД2 вида "26.20.NN" или один и тот же okpd_code.
+    """
+    return "".join(
+        f"<ns4:purchaseObject><ns4:OKPDInfo><ns4:OKPDCode>{okpd_code or f'26.20.{i % 90:02d}'}</ns4:OKPDCode>"
+        f"</ns4:OKPDInfo><ns4:KTRU_OKPDCode>00.00</ns4:KTRU_OKPDCode><ns4:name>Позиция {i}</ns4:name>"
+        f"<ns4:price>{i}.00</ns4:price><ns4:quantity>1</ns4:quantity></ns4:purchaseObject>"
+        for i in range(count)
+    )
+
+
+def attachments_xml(count):
+    """
+    Вложения извещения (ссылки на документацию).
+    """
+    return "".join(
+        f"<ns4:attachmentInfo><ns4:publishedContentId>{i}</ns4:publishedContentId>"
+        f"<ns4:fileName>Документ {i}.docx</ns4:fileName><ns4:fileSize>123456</ns4:fileSize>"
+        f"<ns4:url>https://zakupki.gov.ru/44fz/filestore/public/1.0/download/priz/file.html?uid={i:032X}</ns4:url>"
+        f"</ns4:attachmentInfo>"
+        for i in range(count)
+    )
+
+
+def notice_xml(positions=300, attachments=50, okpd_code=None):
+    """
+    Извещение 44-ФЗ с заказчиком, площадкой, сроками, позициями и вложениями.
+
+    :return: Документ (str).
+    """
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><ns7:export {NAMESPACES}>'
+        '<ns7:epNotificationEF2020><ns4:commonInfo><ns4:purchaseNumber>0373200000000000001</ns4:purchaseNumber>'
+        '<ns4:href>https://zakupki.gov.ru/epz/order/notice/ea20/view/common-info.html</ns4:href>'
+        '<ns4:purchaseObjectInfo>Поставка компьютерной техники</ns4:purchaseObjectInfo>'
+        '<ns4:ETP><ns4:name>РТС-тендер</ns4:name><ns4:url>http://www.rts-tender.ru</ns4:url></ns4:ETP></ns4:commonInfo>'
+        '<ns4:purchaseResponsibleInfo><ns4:responsibleOrgInfo><ns4:fullName>Заказчик</ns4:fullName>'
+        '<ns4:INN>7700000000</ns4:INN><ns4:KPP>770001001</ns4:KPP></ns4:responsibleOrgInfo>'
+        '<ns4:responsibleInfo><ns4:contactPhone>+7-495-000-00-00</ns4:contactPhone></ns4:responsibleInfo>'
+        '</ns4:purchaseResponsibleInfo>'
+        '<ns4:notificationInfo><ns4:procedureInfo><ns4:collectingInfo><ns4:startDT>2025-01-01</ns4:startDT>'
+        '<ns4:endDT>2025-01-10</ns4:endDT></ns4:collectingInfo></ns4:procedureInfo>'
+        '<ns4:contractConditionsInfo><ns4:maxPriceInfo><ns4:maxPrice>1000000</ns4:maxPrice></ns4:maxPriceInfo>'
+        f'</ns4:contractConditionsInfo><ns4:purchaseObjectsInfo>{positions_xml(positions, okpd_code)}'
+        '</ns4:purchaseObjectsInfo></ns4:notificationInfo>'
+        '<ns4:printFormInfo><ns4:url>https://zakupki.gov.ru/printForm</ns4:url></ns4:printFormInfo>'
+        f'<ns4:attachmentsInfo>{attachments_xml(attachments)}</ns4:attachmentsInfo>'
+        '</ns7:epNotificationEF2020></ns7:export>'
+    )
+
+
+def tags_file(name):
+    """
+    Путь к файлу тегов из required_tags (например, "required_tags_44_fz.json").
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "required_tags", name)
+
+
+def write_large_notice(path, size_mb):
+    """
+    Записывает извещение 44-ФЗ не меньше size_mb мегабайт (позиции и вложения по тысяче), не держа его в памяти.
+
+    :return: Число записанных вложений.
+    """
+    attachments = 0
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(
+            f'<ns7:export {NAMESPACES}><ns7:epNotificationEF2020><ns4:commonInfo>'
+            '<ns4:purchaseNumber>0373200000000000001</ns4:purchaseNumber>'
+            '<ns4:purchaseObjectInfo>Поставка</ns4:purchaseObjectInfo>'
+            '<ns4:ETP><ns4:name>РТС-тендер</ns4:name><ns4:url>http://www.rts-tender.ru</ns4:url></ns4:ETP>'
+            '</ns4:commonInfo><ns4:responsibleOrgInfo><ns4:INN>7700000000</ns4:INN></ns4:responsibleOrgInfo>'
+            '<ns4:printFormInfo><ns4:url>https://zakupki.gov.ru/printForm</ns4:url></ns4:printFormInfo>'
+            '<ns4:purchaseObjectsInfo>'
+        )
+        while file.tell() < size_mb * 1048576:
+            file.write(positions_xml(1000) + attachments_xml(1000))
+            attachments += 1000
+        file.write('</ns4:purchaseObjectsInfo><ns4:collectingInfo><ns4:endDT>2025-01-10</ns4:endDT>'
+                   '</ns4:collectingInfo></ns7:epNotificationEF2020></ns7:export>')
+    return attachments
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+import runtime
+from database_work import database_connection
+from parsing_xml import okpd_parser
+
+
+class FakeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.autocommit = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+
+class FakePool:
+    def __init__(self):
+        self.connection = FakeConnection()
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection):
+        pass
+
+
+class Document:
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+
+@pytest.fixture
+def context(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(database_connection, "get_connection_pool", lambda: pool)
+    context = runtime.RuntimeContext("config.ini")
+    monkeypatch.setattr(runtime, "_shared_runtime", context)
+    with context.session():
+        yield pool.connection
+
+
+def test_failed_document_rolls_back_only_its_savepoint(context):
+    processed = []
+
+    def process(document):
+        processed.append(document.file_name)
+        if document.file_name == "broken.xml":
+            raise ValueError("Ошибка разбора")
+
+    documents = [Document(name) for name in ("first.xml", "broken.xml", "last.xml")]
+    for document in okpd_parser.commit_groups(documents, 3):
+        okpd_parser._process_in_group(process, document)
+
+    assert processed == ["first.xml", "broken.xml", "last.xml"]
+    assert context.statements == [
+        "SAVEPOINT unit_1", "RELEASE SAVEPOINT unit_1",
+        "SAVEPOINT unit_1", "ROLLBACK TO SAVEPOINT unit_1",
+        "SAVEPOINT unit_1", "RELEASE SAVEPOINT unit_1",
+        "COMMIT",
+    ]
+
+
+class BrokenMember:
+    def seek(self, *args):
+        raise OSError("Ошибка чтения файла из архива")
+
+
+def test_unreadable_document_is_skipped(tmp_path):
+    members = [("broken.xml", BrokenMember()), ("notice.xml", io.BytesIO(b"<export/>"))]
+
+    documents = okpd_parser._iter_okpd_documents(str(tmp_path), members, None, 0)
+
+    # Файл, который не удалось прочитать, пропускается, остальные документы читаются
+    assert [document.file_name for document in documents] == ["notice.xml"]
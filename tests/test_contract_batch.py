@@ -0,0 +1,52 @@
+import io
+import zipfile
+
+import pytest
+import xml.etree.ElementTree as ET
+
+from parsing_xml.okpd_parser import process_contract_files, sniff_contract_number
+
+CONTRACT = (b'<export xmlns="http://zakupki.gov.ru/oos/export/1">'
+            b'<contract><order><notificationNumber>0373200000000000001</notificationNumber></order>'
+            b'<execution>' + b'<stage>1</stage>' * 1000 + b'</execution></contract></export>')
+
+
+class FakeFetcher:
+    def __init__(self, known_files=()):
+        self.known_files = set(known_files)
+        self.prefetched = []
+
+    def prefetch(self, table_name, column_name, values):
+        values = list(values)
+        self.prefetched.append((table_name, values))
+        return {value: 1 for value in values if value in self.known_files}
+
+
+def test_sniff_stops_at_contract_number():
+    # Документ обрезан после номера: читается только его начало
+    truncated = CONTRACT[:CONTRACT.index(b"<execution>") + 20]
+
+    assert sniff_contract_number(io.BytesIO(truncated)) == "0373200000000000001"
+    assert sniff_contract_number(io.BytesIO(b"<export><contract/></export>")) is None
+    with pytest.raises(ET.ParseError):
+        sniff_contract_number(io.BytesIO(b"<export><order>"))
+
+
+def test_contract_batches_keep_names_and_numbers(tmp_path, monkeypatch):
+    archive_path = tmp_path / "contracts.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for number in range(5):
+            archive.writestr(f"contract_{number}.xml", CONTRACT)
+
+    processed = []
+    monkeypatch.setattr("parsing_xml.okpd_parser.process_contract_file",
+                        lambda document, db_id_fetcher, folder_path: processed.append(document.file_name))
+    fetcher = FakeFetcher(known_files={"contract_1.xml"})
+
+    process_contract_files(str(tmp_path), fetcher, str(archive_path), resolve_batch=2)
+
+    assert processed == [f"contract_{number}.xml" for number in range(5)]
+    assert fetcher.prefetched[:2] == [("file_names_xml", ["contract_0.xml", "contract_1.xml"]),
+                                      ("reestr_contract_44_fz", ["0373200000000000001"])]
+    assert [values for table_name, values in fetcher.prefetched if table_name == "file_names_xml"] == [
+        ["contract_0.xml", "contract_1.xml"], ["contract_2.xml", "contract_3.xml"], ["contract_4.xml"]]
@@ -0,0 +1,47 @@
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from parsing_xml.field_extractor import FieldExtractor
+from parsing_xml.tag_specs import compile_tag_spec
+from tests.samples import notice_xml, tags_file
+
+TAGS_FILES = ("required_tags_44_fz.json", "required_tags_44_fz_recouped.json",
+              "required_tags_223_fz.json", "required_tags_223_fz_recouped.json")
+
+
+def load_extractor(name):
+    with open(tags_file(name), "r", encoding="utf-8") as file:
+        return FieldExtractor.for_spec(compile_tag_spec(json.load(file)))
+
+
+@pytest.mark.parametrize("name", TAGS_FILES)
+def test_single_pass_matches_per_field_search(name):
+    extractor = load_extractor(name)
+    root = ET.fromstring(notice_xml())
+
+    # Один обход находит те же элементы в том же порядке, что и отдельный findall на каждое поле
+    assert extractor.index(root) == {path: root.findall(path) for path in extractor.paths}
+
+
+def test_single_pass_finds_notice_fields():
+    extractor = load_extractor("required_tags_44_fz.json")
+    found = extractor.index(ET.fromstring(notice_xml(positions=5, attachments=3)))
+
+    assert any(elements for elements in found.values())
+
+
+@pytest.mark.parametrize("name", TAGS_FILES)
+def test_iterparse_matches_index(name):
+    extractor = load_extractor(name)
+    document = notice_xml(positions=20, attachments=10).encode("utf-8")
+    expected = {path: [elem.text for elem in elements]
+                for path, elements in extractor.index(ET.fromstring(document)).items()}
+
+    streamed = {path: [] for path in extractor.paths}
+    for path, elem in extractor.iterparse(io.BytesIO(document)):
+        streamed[path].append(elem.text)
+
+    assert streamed == expected
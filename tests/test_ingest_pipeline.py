@@ -0,0 +1,45 @@
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+import ingest_pipeline
+from parsing_xml.document_snapshot import DocumentSnapshot, SnapshotError
+from tests.samples import notice_xml, tags_file
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "notices.zip"
+    with zipfile.ZipFile(path, "w") as zip_ref:
+        for number in range(7):
+            zip_ref.writestr(f"notice_{number}.xml", notice_xml(positions=3, attachments=2))
+        zip_ref.writestr("broken.xml", "<export>")
+    return str(path)
+
+
+def test_parse_archive_by_chunks(archive, tmp_path):
+    ingest_pipeline._init_worker("config.ini")
+    tags = tags_file("required_tags_44_fz.json")
+
+    snapshots, start = [], 0
+    while True:
+        chunk, _ = ingest_pipeline.parse_archive(archive, str(tmp_path), "notice", tags, start=start, count=3)
+        assert len(chunk) <= 3
+        snapshots.extend(chunk)
+        start += len(chunk)
+        if len(chunk) < 3:
+            break
+
+    assert [snapshot.file_name for snapshot in snapshots] == [f"notice_{n}.xml" for n in range(7)] + ["broken.xml"]
+    # Ошибка одного документа сохраняется в его снимке и не прерывает разбор архива
+    assert all(snapshot.error is None for snapshot in snapshots[:-1])
+    with pytest.raises(ET.ParseError):
+        snapshots[-1].prefilter()
+
+
+def test_failed_snapshot_raises_original_error():
+    snapshot = DocumentSnapshot.failed("notice.xml", OSError("No space left on device"))
+
+    with pytest.raises(SnapshotError, match="OSError"):
+        snapshot.prepare(None)
@@ -0,0 +1,36 @@
+import io
+import xml.etree.ElementTree as ET
+
+from parsing_xml.okpd_prefilter import prefilter_okpd, _find_codes, _scan_codes, SCAN_CHUNK_SIZE
+from parsing_xml.tag_specs import compile_path
+from tests.samples import notice_xml, positions_xml
+
+
+def test_prefilter_finds_code_of_full_parse():
+    document = notice_xml(positions=1, attachments=400, okpd_code="99.99.99.999").encode("utf-8")
+    expected = ET.fromstring(document).find(compile_path("OKPDCode")).text
+
+    assert prefilter_okpd(document, all_codes=False)["okpd_code"] == expected == "99.99.99.999"
+    assert prefilter_okpd(document)["okpd_codes"] == [expected]
+
+
+def test_prefilter_header():
+    result = prefilter_okpd(notice_xml(positions=3).encode("utf-8"))
+
+    assert result["purchase_number"] == "0373200000000000001"
+    assert result["okpd_codes"] == ["26.20.00", "26.20.01", "26.20.02"]
+
+
+def test_find_codes_skips_similar_tags():
+    codes = _find_codes(positions_xml(5000).encode("utf-8"))
+
+    # KTRU_OKPDCode не является кодом позиции
+    assert len(codes) == 5000
+    assert codes[1] == "26.20.01"
+
+
+def test_scan_by_chunks_matches_whole_document():
+    positions = positions_xml(30000).encode("utf-8")
+    assert len(positions) > 2 * SCAN_CHUNK_SIZE
+
+    assert list(_scan_codes(io.BytesIO(positions))) == _find_codes(positions)
@@ -0,0 +1,42 @@
+import pytest
+
+import okpd_trie
+from okpd_trie import OKPDMatcher, OKPDReferenceError, OKPDTrie
+
+
+def test_trie_matches_code_prefixes():
+    trie = OKPDTrie()
+    for okpd_id, code in enumerate(("26", "26.2", "26.20", "26.3", "27.1")):
+        trie.add(code, okpd_id)
+
+    # От самой общей записи к самой точной; точки в кодах не учитываются
+    assert trie.match("26.20.15.000") == [0, 1, 2]
+    assert trie.match("27.20") == []
+
+
+@pytest.fixture
+def matcher(monkeypatch):
+    codes = []
+    monkeypatch.setattr(okpd_trie, "get_okpd_codes", lambda: list(codes))
+    monkeypatch.setattr(okpd_trie, "get_user_okpd_codes", lambda: [])
+    return OKPDMatcher("config.ini"), codes
+
+
+def test_match_collects_ids_of_all_positions(matcher):
+    okpd_matcher, codes = matcher
+    codes.extend([(1, "26.2"), (2, "26.20.1"), (3, "27")])
+
+    result = okpd_matcher.match(["26.20.15", "99.99", "26.20.15", "27.11"])
+
+    assert result == {"codes": ["26.20.15", "27.11"], "okpd_ids": [2, 1, 3], "user_okpd_ids": []}
+
+
+def test_empty_first_load_is_not_installed(matcher):
+    okpd_matcher, codes = matcher
+
+    # Пустой справочник не устанавливается: документ не отклоняется, а его обработка завершается ошибкой
+    with pytest.raises(OKPDReferenceError):
+        okpd_matcher.match(["26.20.15"])
+
+    codes.append((1, "26.2"))
+    assert okpd_matcher.match(["26.20.15"])["okpd_ids"] == [1]
@@ -0,0 +1,37 @@
+import pytest
+
+from database_work.reference_cache import MISSING, ReferenceCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.ini"
+    config_path.write_text("[reference_cache]\nrefresh_minutes = 0\n", encoding="utf-8")
+    cache = ReferenceCache(str(config_path))
+    # Справочник загружается без БД
+    monkeypatch.setattr(cache, "_load_table", lambda table_name, column_name: {"Площадка": 1})
+    return cache
+
+
+def test_preloaded_missing_value_is_negative_hit(cache):
+    assert cache.get("trading_platform", "trading_platform_name", "Площадка") == 1
+    assert cache.get("trading_platform", "trading_platform_name", "Другая площадка") is None
+
+
+def test_invalidated_preloaded_value_is_rechecked(cache):
+    cache.get("trading_platform", "trading_platform_name", "Площадка")
+
+    # Запись уже добавлена другим процессом: значение ищется в БД, пока БД не ответит
+    cache.invalidate("trading_platform", {"trading_platform_name": "Другая площадка"})
+    assert cache.get("trading_platform", "trading_platform_name", "Другая площадка") is MISSING
+    assert cache.get("trading_platform", "trading_platform_name", "Другая площадка") is MISSING
+
+    cache.store("trading_platform", "trading_platform_name", "Другая площадка", 2)
+    assert cache.get("trading_platform", "trading_platform_name", "Другая площадка") == 2
+
+
+def test_invalidate_drops_cached_preloaded_id(cache):
+    cache.get("trading_platform", "trading_platform_name", "Площадка")
+
+    cache.invalidate("trading_platform", {"trading_platform_name": "Площадка"})
+    assert cache.get("trading_platform", "trading_platform_name", "Площадка") is MISSING
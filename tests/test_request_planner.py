@@ -0,0 +1,33 @@
+import pytest
+
+from request_planner import RequestPlanner
+
+
+@pytest.fixture
+def planner(tmp_path):
+    config_path = tmp_path / "config.ini"
+    config_path.write_text(
+        "[eis]\nsubsystems_44 = PRIZ\ndocumentType44_PRIZ = epNotificationEF2020\n"
+        f"[planner]\nhistory_file = {tmp_path / 'history.json'}\n"
+        "deprioritise_after_empty_days = 3\nskip_after_empty_days = 5\nrecheck_days = 7\n",
+        encoding="utf-8")
+    planner = RequestPlanner(["77"], str(config_path))
+    for day in range(1, 6):
+        planner.record_result(f"2024-03-{day:02d}", "77", "PRIZ", "epNotificationEF2020", 0)
+    return planner
+
+
+def test_empty_cell_is_skipped_until_recheck(planner):
+    planner.build_plan(["2024-03-06", "2024-03-12"])
+
+    assert planner.skipped == [("2024-03-06", "77", "PRIZ", "epNotificationEF2020")]
+
+
+def test_backfill_requests_earlier_dates(planner):
+    dates = ["2024-02-01", "2024-03-05"]
+
+    plan = planner.build_plan(dates)
+
+    # Серия пустых ответов относится к более поздним датам: история догружается с пониженным приоритетом
+    assert planner.skipped == []
+    assert plan == [(date, "77", "PRIZ", "epNotificationEF2020") for date in dates]
@@ -0,0 +1,59 @@
+import pytest
+
+import runtime
+from runtime import RuntimeContext
+
+
+class FakeManager:
+    opened = []
+
+    def __init__(self):
+        self.closed = False
+        FakeManager.opened.append(self)
+
+    def is_alive(self, max_idle):
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def context(monkeypatch):
+    FakeManager.opened = []
+    monkeypatch.setattr(runtime, "DatabaseManager", FakeManager)
+    return RuntimeContext("config.ini")
+
+
+def test_session_returns_connection(context):
+    with context.session() as db_manager:
+        with context.session() as nested:
+            # Вложенный сеанс использует соединение внешнего
+            assert nested is db_manager
+            assert context.db_manager() is db_manager
+        assert not db_manager.closed
+    assert db_manager.closed
+
+    with context.session() as db_manager:
+        assert db_manager is not FakeManager.opened[0]
+    assert len(FakeManager.opened) == 2
+
+
+def test_db_manager_outside_session(context):
+    with pytest.raises(RuntimeError):
+        context.db_manager()
+
+
+def test_failed_connection_is_raised(context, monkeypatch):
+    def unavailable():
+        raise TimeoutError("Нет свободных соединений")
+
+    monkeypatch.setattr(runtime, "DatabaseManager", unavailable)
+    with pytest.raises(TimeoutError):
+        with context.session():
+            pass
+
+    # Неудачный сеанс не оставляет состояния потока
+    monkeypatch.setattr(runtime, "DatabaseManager", FakeManager)
+    with context.session() as db_manager:
+        assert db_manager is FakeManager.opened[-1]
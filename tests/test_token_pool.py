@@ -0,0 +1,55 @@
+import pytest
+import requests
+
+import token_pool
+from retry_policy import AUTH_ERROR, CLIENT_ERROR, SOAP_FAULT, SoapFaultError, classify_error
+from token_pool import TokenPool
+
+
+def response(status_code, text=""):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = text.encode("utf-8")
+    return result
+
+
+def http_error(status_code):
+    return requests.exceptions.HTTPError(f"HTTP {status_code}", response=response(status_code))
+
+
+@pytest.mark.parametrize("error, kind", [
+    (http_error(401), AUTH_ERROR),
+    (http_error(403), AUTH_ERROR),
+    (http_error(404), CLIENT_ERROR),
+    (http_error(410), CLIENT_ERROR),
+    (SoapFaultError("SOAP Fault", response=response(500, "<soap:Fault>Неверный токен</soap:Fault>")), AUTH_ERROR),
+    (SoapFaultError("SOAP Fault", response=response(500, "<soap:Fault>Internal error</soap:Fault>")), SOAP_FAULT),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.ini"
+    config_path.write_text("[tokens]\nmax_failures = 2\n", encoding="utf-8")
+    monkeypatch.setattr(token_pool, "load_tokens", lambda config: [("token", None)])
+    return TokenPool(str(config_path))
+
+
+def test_dead_archive_links_keep_token(pool):
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.HTTPError):
+            with pool.use():
+                raise http_error(404)
+
+    assert pool.entries[0]["active"]
+
+
+def test_auth_failures_disable_token(pool):
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            with pool.use():
+                raise http_error(401)
+
+    assert not pool.entries[0]["active"]
@@ -0,0 +1,43 @@
+import pytest
+
+from version_index import VersionIndex
+
+
+@pytest.fixture
+def make_index(tmp_path):
+    def make(max_entries=100):
+        config_path = tmp_path / "config.ini"
+        config_path.write_text(f"[versions]\nfile = {tmp_path / 'versions.json'}\nmax_entries = {max_entries}\n",
+                               encoding="utf-8")
+        return VersionIndex(str(config_path))
+    return make
+
+
+def test_compare_does_not_record(make_index):
+    index = make_index()
+
+    assert index.compare("0373200000000000001", "1", None) == "new"
+    # Записи документа не зафиксированы (record не вызван): повторная обработка не считается устаревшей
+    assert index.compare("0373200000000000001", "1", None) == "new"
+
+    index.record("0373200000000000001", "1", None)
+    assert index.compare("0373200000000000001", "1", None) == "stale"
+    assert index.compare("0373200000000000001", "2", None) == "newer"
+
+
+def test_record_keeps_newest_version(make_index):
+    index = make_index()
+    index.record("0373200000000000001", "3", None)
+    index.record("0373200000000000001", "2", None)
+
+    assert index.compare("0373200000000000001", "3", None) == "stale"
+
+
+def test_index_is_bounded_and_saved(make_index):
+    index = make_index(max_entries=2)
+    for purchase_number in ("1", "2", "3"):
+        index.record(purchase_number, "1", None)
+    index.save()
+
+    assert list(make_index(max_entries=2).index) == ["2", "3"]
+    assert index.get_stats()["evicted"] == 1
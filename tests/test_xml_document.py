@@ -0,0 +1,96 @@
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from parsing_xml.field_extractor import FieldExtractor
+from parsing_xml.tag_specs import get_tag_spec
+from parsing_xml.xml_document import XMLDocument
+from parsing_xml.xml_parser import XMLParser
+from tests.samples import tags_file, write_large_notice
+
+SPEC = get_tag_spec(tags_file("required_tags_44_fz.json"))
+EXTRACTOR = FieldExtractor.for_spec(SPEC)
+STREAM_THRESHOLD = 8 * 1048576
+
+
+def extract_fields(document):
+    """
+    Извлекает поля так же, как XMLParser.parse_xml_tags.
+    """
+    document.prepare(EXTRACTOR)
+    fields = {
+        tag: ([elem.text for elem in document.findall(xpath)][:1], document.find(xpath) is not None)
+        for section, tags in SPEC.items() if section != "links_documentation"
+        for tag, xpath in tags.items()
+    }
+    return fields
+
+
+def find_links(document):
+    return XMLParser._find_links(document, SPEC["links_documentation"], 1)
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    path = str(tmp_path / "notice.xml")
+    attachments = write_large_notice(path, 2)
+
+    in_memory, streamed = XMLDocument(path), XMLDocument(path, streaming=True)
+
+    assert extract_fields(streamed) == extract_fields(in_memory)
+    links = list(find_links(streamed))
+    assert links == list(find_links(in_memory))
+    # Печатная форма и все вложения
+    assert len(links) == attachments + 1
+
+
+def test_load_selects_mode_by_size(tmp_path):
+    path = str(tmp_path / "notice.xml")
+    write_large_notice(path, 1)
+
+    assert not XMLDocument.load(path, stream_threshold=STREAM_THRESHOLD).streaming
+    assert XMLDocument.load(path, stream_threshold=1048576 // 2).streaming
+
+
+def test_delete_keeps_files_of_archive_documents(tmp_path):
+    path = tmp_path / "notice.xml"
+    path.write_bytes(b"<export/>")
+
+    # Документ из архива с тем же условным путём не удаляет файл на диске
+    XMLDocument(str(path), raw=b"<export/>").delete()
+    assert path.exists()
+
+    XMLDocument(str(path)).delete()
+    assert not path.exists()
+
+
+@pytest.mark.slow
+def test_streaming_memory_does_not_grow_with_document_size(tmp_path):
+    """
+    Документ 100 МБ: потоковый режим держит в памяти не больше нескольких мегабайт.
+    Документ читается целиком при подготовке полей и ещё раз при чтении вложений (см. XMLDocument).
+    """
+    path = str(tmp_path / "notice_100.xml")
+    attachments = write_large_notice(path, 100)
+    document = XMLDocument.load(path, stream_threshold=STREAM_THRESHOLD)
+    assert document.streaming
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        fields = extract_fields(document)
+        # Ссылки обрабатываются по одной (в БД они записываются пачками), поэтому не накапливаются
+        links, last_link = 0, None
+        for last_link in find_links(document):
+            links += 1
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+
+    print(f"Документ {os.path.getsize(path) / 1048576:.0f} МБ: пик памяти {peak / 1048576:.2f} МБ, {elapsed:.1f} с")
+    assert peak < 16 * 1048576
+    assert links == attachments + 1
+    assert last_link["document_links"].endswith(f"uid={999:032X}")
+    assert fields["contract_number"] == (["0373200000000000001"], True)
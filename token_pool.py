@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from loguru import logger
+
+from secondary_functions import load_config, load_tokens
+from retry_policy import classify_error, AUTH_ERROR
+
+
+# Классы ошибок, которые указывают на проблему с самим токеном, а не с сетью, сервером или запрошенным
+# ресурсом (404/410 для устаревшей ссылки на архив и прочие 4xx токен не выводят из ротации)
+TOKEN_ERRORS = {AUTH_ERROR}
+
+
+class TokenPool:
+    """
+    Пул токенов доступа к ЕИС.
+
+    Токены загружаются из переменной TOKENS файла .env (см. load_tokens), к каждому токену можно привязать
+    собственный локальный порт stunnel. Каждый вызов получает наименее загруженный активный токен;
+    число запросов на токен за последнюю минуту ограничено параметром `max_rpm` секции [tokens]
+    (0 — без ограничения). Токен, получивший `max_failures` ошибок авторизации подряд (401/403, SOAP Fault
+    об ошибке токена), выводится из ротации и возвращается в неё через `readmit_after` секунд. Прочие 4xx
+    (например, 404/410 для устаревшей ссылки на архив) токену не засчитываются.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию или не найден ни один токен.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.max_rpm = self.config.getint("tokens", "max_rpm", fallback=0)
+        self.max_failures = max(1, self.config.getint("tokens", "max_failures", fallback=3))
+        self.readmit_after = self.config.getfloat("tokens", "readmit_after", fallback=600)
+
+        tokens = load_tokens(self.config)
+        if not tokens:
+            raise ValueError("Токен не найден! Проверьте .env файл.")
+
+        self.entries = [
+            {
+                "name": f"token{index}",  # Имя для логов, сам токен в лог не выводится
+                "token": token,
+                "port": port,
+                "requests": 0,
+                "errors": 0,
+                "consecutive_failures": 0,
+                "active": True,
+                "disabled_at": None,
+                "in_flight": 0,
+                "recent": deque(),  # Время запросов за последнюю минуту
+            }
+            for index, (token, port) in enumerate(tokens, start=1)
+        ]
+
+        self._cond = threading.Condition()
+        self.waits = 0
+
+    def acquire(self):
+        """
+        Выбирает токен для очередного запроса и учитывает запрос в его счётчиках.
+
+        Если у всех активных токенов исчерпан лимит запросов в минуту, ожидает освобождения лимита.
+        Если активных токенов нет, используется токен, выведенный из ротации раньше других.
+
+        :return: Словарь-запись токена (ключи `token`, `port`, `name`).
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._readmit(now)
+
+                candidates = [entry for entry in self.entries if entry["active"]]
+                if not candidates:
+                    candidates = [min(self.entries, key=lambda entry: entry["disabled_at"])]
+
+                for entry in candidates:
+                    while entry["recent"] and now - entry["recent"][0] >= 60:
+                        entry["recent"].popleft()
+
+                available = [
+                    entry for entry in candidates
+                    if not self.max_rpm or len(entry["recent"]) < self.max_rpm
+                ]
+                if available:
+                    entry = min(available, key=lambda item: (item["in_flight"], len(item["recent"]), item["requests"]))
+                    entry["recent"].append(now)
+                    entry["requests"] += 1
+                    entry["in_flight"] += 1
+                    return entry
+
+                # Ждём, пока у какого-либо токена освободится лимит
+                self.waits += 1
+                wait_time = min(60 - (now - entry["recent"][0]) for entry in candidates)
+                self._cond.wait(max(0.05, wait_time))
+
+    def _readmit(self, now):
+        for entry in self.entries:
+            if not entry["active"] and now - entry["disabled_at"] >= self.readmit_after:
+                entry["active"] = True
+                entry["consecutive_failures"] = 0
+                logger.info(f"Токен {entry['name']} возвращён в ротацию.")
+
+    def release(self, entry, error_kind=None):
+        """
+        Освобождает токен и учитывает результат запроса.
+
+        :param entry: Запись токена, полученная из acquire.
+        :param error_kind: Класс ошибки (см. retry_policy) или None при успехе.
+        """
+        with self._cond:
+            entry["in_flight"] -= 1
+
+            if error_kind is None:
+                entry["consecutive_failures"] = 0
+            elif error_kind in TOKEN_ERRORS:
+                entry["errors"] += 1
+                entry["consecutive_failures"] += 1
+                if entry["active"] and entry["consecutive_failures"] >= self.max_failures:
+                    entry["active"] = False
+                    entry["disabled_at"] = time.monotonic()
+                    logger.warning(f"Токен {entry['name']} выведен из ротации после "
+                                   f"{entry['consecutive_failures']} ошибок подряд ({error_kind}).")
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def use(self):
+        """
+        Контекстный менеджер: выдаёт запись токена на время вызова и учитывает его результат.
+        """
+        entry = self.acquire()
+        try:
+            yield entry
+        except Exception as e:
+            self.release(entry, classify_error(e))
+            raise
+        self.release(entry)
+
+    def get_stats(self):
+        """
+        :return: Список состояний токенов: имя, порт, активность, запросы, ошибки и запросы за последнюю минуту.
+        """
+        with self._cond:
+            now = time.monotonic()
+            return [
+                {
+                    "name": entry["name"],
+                    "port": entry["port"],
+                    "active": entry["active"],
+                    "requests": entry["requests"],
+                    "errors": entry["errors"],
+                    "last_minute": sum(1 for moment in entry["recent"] if now - moment < 60),
+                }
+                for entry in self.entries
+            ]
+
+    def log_stats(self):
+        """
+        Логирует распределение запросов по токенам.
+        """
+        for stats in self.get_stats():
+            logger.info(
+                f"Токен {stats['name']} (порт {stats['port'] or 'общий'}): "
+                f"{'активен' if stats['active'] else 'выведен из ротации'}, запросов {stats['requests']}, "
+                f"ошибок {stats['errors']}, за последнюю минуту {stats['last_minute']}")
+        if self.waits:
+            logger.info(f"Ожиданий лимита токенов: {self.waits}")
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_token_pool(config_path="config.ini"):
+    """
+    Возвращает общий для процесса пул токенов, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр TokenPool.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = TokenPool(config_path)
+        return _shared_pool
@@ -0,0 +1,190 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from loguru import logger
+
+from secondary_functions import load_config
+
+
+class VersionIndex:
+    """
+    Индекс последних обработанных редакций извещений.
+
+    ЕИС публикует изменения извещения новой редакцией, поэтому один номер закупки встречается в нескольких
+    архивах и днях. Для каждого номера закупки индекс хранит номер редакции и дату публикации последней
+    обработанной редакции (их находит потоковый фильтр, см. prefilter_okpd), что позволяет пропускать
+    устаревшие и повторные редакции до полного разбора, а более новые — применять как обновление.
+
+    Проверка (compare) не изменяет индекс: редакция запоминается методом record после коммита записей документа,
+    поэтому документ, записи которого откачены, при повторной обработке не считается устаревшим.
+    Индекс хранит не больше `max_entries` закупок: при переполнении удаляются закупки, редакции которых
+    дольше всего не обновлялись. Файл перезаписывается только при изменении индекса.
+
+    Параметры читаются из секции `[versions]`.
+    """
+
+    def __init__(self, config_path="config.ini"):
+        """
+        :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+        :raises ValueError: Если не удалось загрузить конфигурацию.
+        """
+        self.config = load_config(config_path)
+        if not self.config:
+            raise ValueError("Ошибка загрузки конфигурации!")
+
+        self.enabled = self.config.getboolean("versions", "enabled", fallback=True)
+        self.index_file = self.config.get("versions", "file", fallback="notice_versions.json")
+        self.max_entries = max(1, self.config.getint("versions", "max_entries", fallback=200000))
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.stats = {"new": 0, "newer": 0, "stale": 0, "evicted": 0}
+        self.index = self.load_index() if self.enabled else OrderedDict()
+        self._evict()
+
+    def load_index(self):
+        """
+        Загружает индекс редакций из JSON-файла.
+
+        :return: Словарь {номер закупки: [номер редакции или None, дата публикации или None]}
+                 от давно обновлённых закупок к недавним.
+        """
+        if not os.path.exists(self.index_file):
+            return OrderedDict()
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as file:
+                return json.load(file, object_pairs_hook=OrderedDict)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить индекс редакций {self.index_file}: {e}")
+            return OrderedDict()
+
+    def save(self):
+        """
+        Сохраняет индекс редакций в JSON-файл, если он изменился после загрузки или прошлого сохранения.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_file = f"{self.index_file}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as file:
+                json.dump(self.index, file, separators=(",", ":"))
+            os.replace(temp_file, self.index_file)
+            self._dirty = False
+
+    def _evict(self):
+        """
+        Удаляет закупки, редакции которых дольше всего не обновлялись, сверх max_entries.
+        """
+        while len(self.index) > self.max_entries:
+            self.index.popitem(last=False)
+            self.stats["evicted"] += 1
+            self._dirty = True
+
+    @staticmethod
+    def _parse_version(version):
+        try:
+            return int(version)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _is_newer(candidate, seen):
+        """
+        Сравнивает редакции [номер, дата публикации]: сначала по номеру редакции, затем по дате публикации.
+        Редакция, которую не удаётся отличить от уже обработанной, новой не считается.
+        """
+        (version, publish_date), (seen_version, seen_publish_date) = candidate, seen
+        if version is not None and seen_version is not None and version != seen_version:
+            return version > seen_version
+        if publish_date and seen_publish_date and publish_date != seen_publish_date:
+            return publish_date > seen_publish_date
+        return False
+
+    def compare(self, purchase_number, version, publish_date):
+        """
+        Сравнивает редакцию документа с последней обработанной, не изменяя индекс (см. record).
+
+        :param purchase_number: Номер закупки.
+        :param version: Номер редакции (строка из документа) или None.
+        :param publish_date: Дата публикации (строка ISO 8601 из документа) или None.
+        :return: "new" — закупка ещё не встречалась (или у документа нет номера закупки и версии),
+                 "newer" — более новая редакция уже обработанной закупки,
+                 "stale" — та же или более старая редакция.
+        """
+        candidate = [self._parse_version(version), publish_date]
+        if not self.enabled or not purchase_number or candidate == [None, None]:
+            return "new"
+
+        with self._lock:
+            seen = self.index.get(purchase_number)
+            if seen is None:
+                status = "new"
+            elif self._is_newer(candidate, seen):
+                status = "newer"
+            else:
+                status = "stale"
+            self.stats[status] += 1
+        return status
+
+    def record(self, purchase_number, version, publish_date):
+        """
+        Запоминает редакцию записанного документа, если она новее запомненной.
+        Вызывается после коммита записей документа (см. DatabaseManager.after_commit).
+
+        :param purchase_number: Номер закупки.
+        :param version: Номер редакции (строка из документа) или None.
+        :param publish_date: Дата публикации (строка ISO 8601 из документа) или None.
+        """
+        candidate = [self._parse_version(version), publish_date]
+        if not self.enabled or not purchase_number or candidate == [None, None]:
+            return
+
+        with self._lock:
+            seen = self.index.get(purchase_number)
+            if seen is not None and not self._is_newer(candidate, seen):
+                return
+            self.index[purchase_number] = candidate
+            self.index.move_to_end(purchase_number)
+            self._dirty = True
+            self._evict()
+
+    def get_stats(self):
+        """
+        :return: Словарь со статистикой: новые закупки, новые редакции, пропущенные редакции,
+                 удалено при переполнении, размер индекса.
+        """
+        with self._lock:
+            return dict(self.stats, size=len(self.index))
+
+    def log_stats(self):
+        """
+        Логирует статистику индекса редакций.
+        """
+        if not self.enabled:
+            return
+        stats = self.get_stats()
+        logger.info(
+            f"Редакции извещений: новых закупок {stats['new']}, новых редакций {stats['newer']}, "
+            f"пропущено устаревших и повторных {stats['stale']}, закупок в индексе {stats['size']}, "
+            f"удалено при переполнении {stats['evicted']}")
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_version_index(config_path="config.ini"):
+    """
+    Возвращает общий для процесса индекс редакций, создавая его при первом обращении.
+
+    :param config_path: Путь к конфигурационному файлу (по умолчанию "config.ini").
+    :return: Экземпляр VersionIndex.
+    """
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = VersionIndex(config_path)
+        return _shared_index